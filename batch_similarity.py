@@ -0,0 +1,274 @@
+import csv
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from common_class import SearchMode
+from local_vector_store import LocalVectorStore, as_float
+from property_indexer import price_bounds
+from property_searcher import PropertySearcher
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+# Dynamic filters of search_and_create_dynamic_filters.py: list price ±11%, bedrooms ±2
+PRICE_VARIATION = 0.11
+BEDROOM_VARIATION = 2
+# The constant of the weighted RRF formula used by PropertySearcher
+RRF_K = 60
+
+
+class CandidateTable:
+    """
+    Filter columns of every property in a LocalVectorStore, for evaluating the
+    per-seed search filters as broadcast masks over blocks of candidates.
+    """
+
+    def __init__(self, store: LocalVectorStore):
+        """
+        Args:
+            store (LocalVectorStore): The store whose payloads are read.
+        """
+        def numeric(key: str) -> np.ndarray:
+            return np.array([as_float(value) for value in store.payload_column(key)], dtype=float)
+
+        def present(key: str) -> np.ndarray:
+            return np.array([value is not None and value != [] for value in store.payload_column(key)], dtype=bool)
+
+        def codes(key: str, keep_empty: bool) -> np.ndarray:
+            # Missing and non-string values get -1; a seed with -1 does not filter on the field
+            vocabulary = {}
+            return np.array([vocabulary.setdefault(value, len(vocabulary))
+                             if isinstance(value, str) and (value or keep_empty) else -1
+                             for value in store.payload_column(key)], dtype=np.int32)
+
+        # Points indexed before price_min/price_max existed get the bounds apply_filters derives
+        bounds = [price_bounds(payload) if payload.get("price_min") is None else payload
+                  for payload in store.payloads]
+        self.price_min = np.array([as_float(bound.get("price_min")) for bound in bounds], dtype=float)
+        self.price_max = np.array([as_float(bound.get("price_max")) for bound in bounds], dtype=float)
+        self.price_is_range = np.array([bool(payload.get("price_range")) for payload in store.payloads], dtype=bool)
+        self.bedrooms = numeric("bedrooms_total")
+        # apply_filters drops candidates without an id, price, bedroom or bathroom information
+        self.valid = (present("id") & ~np.isnan(self.price_min) & present("bedrooms_total")
+                      & present("lp_calculated_bath"))
+        self.type_codes = codes("lp_property_type", keep_empty=True)
+        self.sale_lease_codes = codes("lp_sale_lease", keep_empty=False)
+        self.list_price = numeric("list_price")
+
+
+def batch_similar_properties(
+        store: LocalVectorStore,
+        modes: Sequence[SearchMode] = tuple(SearchMode),
+        facets: Optional[Sequence[str]] = None,
+        search_modes: Optional[Dict[str, Dict[str, float]]] = None,
+        top_k: int = 5,
+        dynamic_filters: bool = True,
+        property_ids: Optional[List[int]] = None,
+        block_rows: int = 512,
+        block_columns: int = 32768
+) -> Dict[str, Dict[int, List[int]]]:
+    """
+    Compute the similar properties of many seeds at once from the store's matrices.
+
+    For every block of seeds and every facet, similarities to all properties are computed
+    with blocked matrix multiplies and the 2*top_k best candidates are kept, as PropertySearcher
+    does per facet. Each mode's weighted RRF merge is then vectorized over the block, so the
+    facet searches are shared by all modes. As in PropertySearcher, the seed's filters are
+    applied after the merge, to its top_k*5 merged candidates without the seed itself.
+
+    Args:
+        store (LocalVectorStore): The store with the facet matrices and payloads.
+        modes (Sequence[SearchMode]): The search modes to compute.
+        facets (Optional[Sequence[str]]): The facets searched. Defaults to those of PropertySearcher.
+        search_modes (Optional[Dict[str, Dict[str, float]]]): Facet weights per mode value.
+            Defaults to the weights of PropertySearcher.
+        top_k (int): The number of similar properties per seed.
+        dynamic_filters (bool): Restrict candidates to the seed's list price ±11%, bedrooms ±2 and
+            property type. The seed's sale/lease type is always matched.
+        property_ids (Optional[List[int]]): The seeds. Defaults to every property in the store.
+        block_rows (int): Seeds per block.
+        block_columns (int): Candidates per block; bounds the similarity matrix at block_rows x block_columns.
+
+    Returns:
+        Dict[str, Dict[int, List[int]]]: Per mode value, the similar property IDs of each seed, best first.
+    """
+    searcher = PropertySearcher(store)
+    facets = list(facets or searcher.facets)
+    search_modes = search_modes or searcher.search_modes
+    columns = CandidateTable(store)
+    if not np.any(columns.valid & ~store.removed):
+        logging.error("No property has the id, price, bedroom and bathroom information the filters require, "
+                      "so every result will be empty")
+    if property_ids is None:
+        seed_rows = np.flatnonzero(~store.removed)
+    else:
+        seed_rows = np.array([store.row_of[property_id] for property_id in property_ids if property_id in store.row_of],
+                             dtype=np.int64)
+    per_facet = 2 * top_k
+    point_ids = np.asarray(store.ids).tolist()
+    results = {mode.value: {} for mode in modes}
+    started = time.monotonic()
+
+    for start in range(0, len(seed_rows), block_rows):
+        rows = seed_rows[start:start + block_rows]
+        candidates = _block_top_k(store, facets, rows, per_facet, block_columns)
+        for mode in modes:
+            weights = np.array([search_modes[mode.value].get(facet, 0) for facet in facets], dtype=float)
+            merged = _weighted_rrf_merge(candidates, facets, weights, top_k * 5)
+            keep = (merged >= 0) & (merged != rows[:, None]) & _filter_mask(columns, rows, merged, dynamic_filters)
+            for row, neighbors, kept in zip(rows, merged, keep):
+                results[mode.value][point_ids[row]] = [point_ids[neighbor] for neighbor in neighbors[kept][:top_k]]
+        logging.info(f"Computed similar properties for {min(start + block_rows, len(seed_rows))} of "
+                     f"{len(seed_rows)} properties in {time.monotonic() - started:.0f}s")
+    return results
+
+
+def write_similar_properties_csv(
+        store: LocalVectorStore,
+        results: Dict[str, Dict[int, List[int]]],
+        output_csv: str = "similar_properties_dynamic_filter_{mode}.csv"
+) -> List[str]:
+    """
+    Write one CSV per mode in the layout of the per-listing scripts: the seed's
+    lp_listing_id and the list of lp_listing_ids of its similar properties.
+
+    Args:
+        store (LocalVectorStore): The store the results were computed from.
+        results (Dict[str, Dict[int, List[int]]]): The output of ``batch_similar_properties``.
+        output_csv (str): The file name pattern; ``{mode}`` is replaced by the SearchMode.
+
+    Returns:
+        List[str]: The written files.
+    """
+    listing_ids = store.payload_column("lp_listing_id")
+    paths = []
+    for mode_value, similar in results.items():
+        path = output_csv.format(mode=SearchMode(mode_value))
+        with open(path, mode="w", newline="") as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(["property_id", "similar_property_ids"])
+            for property_id, neighbors in similar.items():
+                csv_writer.writerow([listing_ids[store.row_of[property_id]],
+                                     [listing_ids[store.row_of[neighbor]] for neighbor in neighbors]])
+        logging.info(f"Similar properties saved to {path}")
+        paths.append(path)
+    return paths
+
+
+def _block_top_k(
+        store: LocalVectorStore,
+        facets: Sequence[str],
+        rows: np.ndarray,
+        limit: int,
+        block_columns: int
+) -> Dict[str, np.ndarray]:
+    """
+    The best ``limit`` candidate rows of every facet for a block of seeds, -1 padded.
+    """
+    queries = {facet: np.asarray(store.vectors[facet][rows], dtype=np.float32) for facet in facets}
+    best_scores = {facet: np.full((len(rows), 0), -np.inf, dtype=np.float32) for facet in facets}
+    best_rows = {facet: np.full((len(rows), 0), -1, dtype=np.int64) for facet in facets}
+
+    for column_start in range(0, len(store.ids), block_columns):
+        column_rows = np.arange(column_start, min(column_start + block_columns, len(store.ids)))
+        removed = store.removed[column_rows]
+        for facet in facets:
+            matrix = store.vectors[facet][column_start:column_start + len(column_rows)]
+            scores = queries[facet] @ np.asarray(matrix, dtype=np.float32).T
+            scores[:, removed] = -np.inf
+
+            if limit < scores.shape[1]:
+                top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            # Candidates from earlier blocks come first, so ties keep the lower row like a stable sort
+            all_scores = np.concatenate([best_scores[facet], np.take_along_axis(scores, top, axis=1)], axis=1)
+            all_rows = np.concatenate([best_rows[facet], column_rows[top]], axis=1)
+            order = np.lexsort((all_rows, -all_scores), axis=1)[:, :limit]
+            best_scores[facet] = np.take_along_axis(all_scores, order, axis=1)
+            best_rows[facet] = np.take_along_axis(all_rows, order, axis=1)
+
+    for facet in facets:
+        best_rows[facet][~np.isfinite(best_scores[facet])] = -1
+    return best_rows
+
+
+def _filter_mask(
+        columns: CandidateTable,
+        rows: np.ndarray,
+        candidates: np.ndarray,
+        dynamic_filters: bool
+) -> np.ndarray:
+    """
+    The filters of every seed in ``rows`` over its merged ``candidates`` (a -1 padded matrix),
+    matching PropertySearcher.apply_filters for the seed's filters.
+    """
+    mask = columns.valid[candidates]
+    # The seed's sale/lease type is matched when it has one
+    seed_sale_lease = columns.sale_lease_codes[rows][:, None]
+    mask &= (seed_sale_lease < 0) | (columns.sale_lease_codes[candidates] == seed_sale_lease)
+
+    if dynamic_filters:
+        list_price = np.nan_to_num(columns.list_price[rows], nan=0.0)
+        min_price = np.maximum(0, list_price - PRICE_VARIATION * list_price)[:, None]
+        max_price = (list_price + PRICE_VARIATION * list_price)[:, None]
+        bedrooms = np.nan_to_num(columns.bedrooms[rows], nan=0.0)
+        min_bedrooms = np.maximum(0, bedrooms - BEDROOM_VARIATION)[:, None]
+        max_bedrooms = (bedrooms + BEDROOM_VARIATION)[:, None]
+        price_min = columns.price_min[candidates]
+        price_max = columns.price_max[candidates]
+        is_range = columns.price_is_range[candidates]
+        # A price_range must overlap the bounds; a list price is only compared with non-zero bounds
+        mask &= ~(is_range & ((price_max < min_price) | (price_min > max_price)))
+        mask &= ~(~is_range & (min_price != 0) & (min_price > price_min))
+        mask &= ~(~is_range & (max_price != 0) & (max_price < price_max))
+        with np.errstate(invalid="ignore"):
+            candidate_bedrooms = columns.bedrooms[candidates]
+            mask &= (candidate_bedrooms >= min_bedrooms) & (candidate_bedrooms <= max_bedrooms)
+        seed_type = columns.type_codes[rows][:, None]
+        mask &= (seed_type < 0) | (columns.type_codes[candidates] == seed_type)
+    return mask
+
+
+def _weighted_rrf_merge(
+        candidates: Dict[str, np.ndarray],
+        facets: Sequence[str],
+        weights: np.ndarray,
+        limit: int
+) -> np.ndarray:
+    """
+    Vectorized PropertySearcher._weighted_rrf_merge for a block of seeds.
+
+    Ties are broken by first appearance in facet order, as the dict-based merge does.
+
+    Returns:
+        np.ndarray: The best ``limit`` merged candidate rows per seed, -1 padded.
+    """
+    ranked = np.concatenate([candidates[facet] for facet in facets], axis=1)
+    block, width = ranked.shape
+    per_facet = width // len(facets)
+    # Same float operations as the dict-based merge, so equal scores tie the same way
+    contributions = np.concatenate([weight * (1 / (RRF_K + np.arange(per_facet) + 1)) for weight in weights])
+    seeds = np.repeat(np.arange(block), width)
+    flat = ranked.ravel()
+    present = flat >= 0
+    merged = np.full((block, limit), -1, dtype=np.int64)
+    if not present.any():
+        return merged
+    positions = np.flatnonzero(present)
+    keys, first, inverse = np.unique(seeds[present] * (flat.max() + 1) + flat[present],
+                                     return_index=True, return_inverse=True)
+    scores = np.bincount(inverse, weights=np.tile(contributions, block)[present], minlength=len(keys))
+    key_seeds = seeds[positions[first]]
+    key_rows = flat[positions[first]]
+    order = np.lexsort((positions[first], -scores, key_seeds))
+
+    # Keep the first ``limit`` keys of every seed
+    sorted_seeds = key_seeds[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_seeds, sorted_seeds, side="left")
+    kept = rank < limit
+    merged[sorted_seeds[kept], rank[kept]] = key_rows[order][kept]
+    return merged
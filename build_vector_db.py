@@ -1,42 +1,134 @@
 import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+
 from qdrant_client import QdrantClient, models
 
 from common_class import PropertyFilters, SearchMode
+from embedding_cache import EmbeddingCache
+from property_data import PropertyData
 from property_indexer import PropertyIndexer
-from property_loader import query_property_records_from_datalake
+from property_loader import iter_property_records_from_datalake
 from property_searcher import PropertySearcher
+from search_cache import SearchResultCache
+from snapshot_cache import SnapshotCache
+from sync_watermarks import FailedRecordStore, WatermarkStore
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
 
 
+def stream_records(
+        batches: Iterable[List[Dict]],
+        watermarks: Optional[WatermarkStore] = None,
+        limit: Optional[int] = None,
+        samples: Optional[List[Dict]] = None
+) -> Iterator[Dict]:
+    """
+    Flatten loaded record batches for the indexer, so only the batches in flight are held in memory.
+
+    The watermarks only observe the batches; they are advanced once the whole pull has been
+    read, because the chunks of a CTAS read do not arrive in timestamp order.
+
+    Args:
+        batches (Iterable[List[Dict]]): The record batches, in load order.
+        watermarks (Optional[WatermarkStore]): Marks advanced after the last batch; saving them is left to the caller.
+        limit (Optional[int]): The row limit of the load query, used to detect a truncated incremental pull.
+        samples (Optional[List[Dict]]): Receives the first three records.
+
+    Returns:
+        Iterator[Dict]: The records.
+    """
+    count = 0
+    for batch in batches:
+        if samples is not None and len(samples) < 3:
+            samples.extend(batch[:3 - len(samples)])
+        if watermarks is not None:
+            watermarks.observe(batch)
+        count += len(batch)
+        yield from batch
+    if watermarks is not None:
+        watermarks.advance(truncated=limit is not None and count >= limit)
+
+
 # Example usage
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index property records into Qdrant")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only apply the records modified since the last sync, deleting inactive listings")
+    parser.add_argument("--provider", default="trestle-rebny", help="lp_provider_id to sync")
+    parser.add_argument("--watermarks", default="sync_watermarks.json", help="File holding the sync watermarks")
+    parser.add_argument("--failed-records", default="sync_failed_records.json",
+                        help="File listing the listings an incremental sync could not index for good")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of records loaded, the full feed by default")
+    parser.add_argument("--chunksize", type=int, default=10000, help="Records read from Athena per batch")
+    parser.add_argument("--snapshot-dir", default=None,
+                        help="Serve repeated Athena queries from local Parquet snapshots in this directory; "
+                             "incremental pulls after a watermark always query Athena")
+    parser.add_argument("--snapshot-ttl-hours", type=float, default=24.0)
+    parser.add_argument("--snapshot-max-gb", type=float, default=10.0)
+    args = parser.parse_args()
+
     # Initialize Qdrant client
     client = QdrantClient(url="https://1ae0f535-9ed2-47a3-9955-72bc7a9e8e0f.us-east4-0.gcp.cloud.qdrant.io:6333",
                           api_key="WFjB56G9fZwpga0eVBS_U6joSUqSRm5xHixbjiM0pC1Apj9VODse2Q")
     # client = QdrantClient(url="http://localhost:6333")
 
-    # load property records from datalake
-    property_list = query_property_records_from_datalake()
+    watermarks = WatermarkStore(args.watermarks)
+    overrides = {'provider_id': args.provider, 'limit': args.limit}
+    if args.snapshot_dir:
+        overrides['snapshot_cache'] = SnapshotCache(args.snapshot_dir, ttl_seconds=args.snapshot_ttl_hours * 3600,
+                                                    max_bytes=int(args.snapshot_max_gb * 1024 ** 3))
+    if args.incremental and watermarks.get(args.provider):
+        # The watermark replaces the fixed date window; inactive records are loaded to delete their points
+        overrides.update({'start_date': None, 'end_date': None, 'include_inactive': True,
+                          'modified_after': watermarks.get(args.provider)})
+    elif args.incremental:
+        logging.info(f"No watermark for {args.provider} yet, running a full load")
+    if args.incremental:
+        # A limited pull must read the oldest changes first, or the watermark skips the rows cut off
+        overrides['order_by_timestamp'] = True
+    # Stream property records from datalake, one Athena chunk at a time
+    samples = []
+    property_records = stream_records(iter_property_records_from_datalake(overrides, chunksize=args.chunksize),
+                                      watermarks if args.incremental else None, args.limit, samples)
 
     # Initialize components
-    indexer = PropertyIndexer(client)
-    searcher = PropertySearcher(client)
+    # Reuse embeddings of listings whose text and photos are unchanged since the last run
+    embedding_cache = EmbeddingCache("embedding_cache.sqlite")
+    # Cached search results are dropped whenever the indexer rewrites one of the properties involved
+    result_cache = SearchResultCache(max_entries=10000, ttl_seconds=300)
+    indexer = PropertyIndexer(client, PropertyData(cache=embedding_cache), result_cache=result_cache)
+    searcher = PropertySearcher(client, result_cache=result_cache)
 
     # Initialize collections
     indexer.initialize_collections(client)
-    # Index property records
-    success = False
-    count_num = 0
-    for property_record in property_list:
-        logging.info(f"indexing property {count_num} ----------------------------------------------------------->>>")
-        count_num += 1
-        if indexer.index_property(property_record):
-            success = True
+    if args.incremental:
+        # Re-embed only listings whose text or photos changed, update the payload of the others
+        report = indexer.sync_properties(property_records, batch_size=256, parallelism=2)
+        succeeded = report.reindexed + report.payload_updated
+    else:
+        # Index property records in batches
+        report = indexer.index_properties(property_records, batch_size=256, parallelism=2)
+        succeeded = report.succeeded
+    for property_id, reason in report.failed.items():
+        logging.error(f"Failed to index property {property_id}: {reason}")
+    success = bool(succeeded)
+    if args.incremental:
+        permanent = set(report.permanent_failures)
+        failed_records = FailedRecordStore(args.failed_records)
+        failed_records.update({property_id: reason for property_id, reason in report.failed.items()
+                               if property_id in permanent}, resolved=[*succeeded, *report.deleted])
+        failed_records.save()
+        # Retryable failures (e.g. Qdrant errors, photo hosts timing out) keep the watermark in place, so the
+        # next sync retries them; records that can never be indexed as they are must not pin it
+        if all(property_id in permanent for property_id in report.failed):
+            watermarks.save()
+    logging.info(f"Embedding cache stats: {embedding_cache.stats()}")
 
     if success:
-        logging.info(f"property list samples: {property_list[:3]}")
+        logging.info(f"property list samples: {samples}")
         # Define search filters
         filters = PropertyFilters(
             min_price=8000.0,
@@ -48,7 +140,7 @@ if __name__ == "__main__":
 
         # Find similar properties
         similar_properties = searcher.search_similar_properties(
-            property_id=property_list[0]["id"],
+            property_id=succeeded[0],
             mode=SearchMode.BALANCED,
             filters=filters,
             top_k=5
@@ -1,7 +1,7 @@
 import logging
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 # Set up logging configuration
@@ -20,6 +20,24 @@ class SearchMode(Enum):
     DESCRIPTION_FOCUS = "description_focus"
     BALANCED_WITHOUT_VISUAL = "balanced_without_visual"
 
+
+# Qdrant collection holding the vectors of each embedded property attribute
+FACET_COLLECTIONS = {
+    "location": "location_vectors",
+    "features": "features_vectors",
+    "description": "description_vectors",
+    "visual": "visual_vectors",
+}
+# Dimension of the embedding stored for each property attribute
+FACET_DIMENSIONS = {
+    "location": 384,
+    "features": 384,
+    "description": 384,
+    "visual": 512,
+}
+# Single collection storing every attribute as a named vector on one point with one payload
+MULTI_VECTOR_COLLECTION = "property_vectors"
+
 @dataclass
 class PropertyFilters:
     """
@@ -33,4 +51,24 @@ class PropertyFilters:
     max_bathrooms: Optional[int] = None
     property_type: Optional[str] = None
     must_have_amenities: List[str] = field(default_factory=list)
-    sale_lease: str = ''
\ No newline at end of file
+    sale_lease: str = ''
+
+@dataclass
+class IndexingReport:
+    """
+    Dataclass representing the per-listing outcome of a bulk indexing run.
+    """
+    succeeded: List = field(default_factory=list)
+    failed: Dict = field(default_factory=dict)  # property id -> failure reason
+    permanent_failures: List = field(default_factory=list)  # ids in failed that retrying cannot fix
+
+@dataclass
+class SyncReport:
+    """
+    Dataclass representing the outcome of an incremental sync run.
+    """
+    reindexed: List = field(default_factory=list)  # ids whose embedding inputs changed or that are new
+    payload_updated: List = field(default_factory=list)  # ids whose payload changed but not their embeddings
+    deleted: List = field(default_factory=list)  # ids of listings that are no longer active
+    failed: Dict = field(default_factory=dict)  # property id -> failure reason
+    permanent_failures: List = field(default_factory=list)  # ids in failed that retrying cannot fix
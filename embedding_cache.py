@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+# Keep IN (...) lists below SQLite's bound parameter limit
+_SQLITE_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by a local SQLite file.
+
+    Entries are keyed by a hash of the model name and the model input, so an
+    embedding is reused for as long as the text (or photo URL) that produced it
+    is unchanged. The cache is bounded to ``max_entries`` and evicts the least
+    recently used entries first.
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_entries: int = 1_000_000):
+        """
+        Args:
+            path (str): The SQLite file to store embeddings in.
+            max_entries (int): The maximum number of embeddings to keep.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def text_key(model_name: str, text: str) -> str:
+        """
+        Build the cache key of a text embedding.
+
+        Args:
+            model_name (str): The name of the model producing the embedding.
+            text (str): The preprocessed text that is embedded.
+
+        Returns:
+            str: The cache key.
+        """
+        return hashlib.sha256(f"text\0{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def image_key(model_name: str, url: str) -> str:
+        """
+        Build the cache key of an image embedding.
+
+        Args:
+            model_name (str): The name of the model producing the embedding.
+            url (str): The photo URL that is embedded.
+
+        Returns:
+            str: The cache key.
+        """
+        return hashlib.sha256(f"image\0{model_name}\0{url}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up embeddings and mark the found entries as recently used.
+
+        Args:
+            keys (Iterable[str]): The cache keys to look up.
+
+        Returns:
+            Dict[str, np.ndarray]: The cached embeddings of the keys that were found.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH_SIZE):
+                chunk = keys[start:start + _SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now, *(key for key, _ in rows)]
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]):
+        """
+        Store embeddings, evicting the least recently used entries when over capacity.
+
+        Args:
+            embeddings (Dict[str, np.ndarray]): The embeddings to store by cache key.
+        """
+        if not embeddings:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in embeddings.items()]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._size += self._conn.total_changes - before
+            self._conn.executemany(
+                "UPDATE embeddings SET vector = ?, last_access = ? WHERE key = ?",
+                [(blob, last_access, key) for key, blob, last_access in rows]
+            )
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+                self.evictions += overflow
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up a single embedding.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[np.ndarray]: The cached embedding, or None on a miss.
+        """
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, embedding: np.ndarray):
+        """
+        Store a single embedding.
+
+        Args:
+            key (str): The cache key.
+            embedding (np.ndarray): The embedding to store.
+        """
+        self.put_many({key: embedding})
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report cache size and hit/miss counters.
+
+        Returns:
+            Dict[str, float]: Entry count, hits, misses, evictions and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """
+        Close the underlying SQLite connection.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,245 @@
+import logging
+from numbers import Real
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from common_class import PropertyFilters
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+# Kinds of price information a candidate can carry
+PRICE_MISSING = 0
+PRICE_RANGE = 1
+PRICE_LIST = 2
+# Column values of a payload that cannot be read at all
+_INVALID_ROW = (False, PRICE_MISSING, np.nan, np.nan, False, False, False, np.nan, False, False, np.nan, -1, -1,
+                False, ())
+
+
+class CandidateColumns:
+    """
+    Columnar view of candidate property payloads for compiled filters.
+
+    Every payload is read once; filters are then evaluated as NumPy array
+    operations over the columns, so the same candidates can be filtered many
+    times at array speed.
+    """
+
+    def __init__(self, properties: Sequence[Dict], amenities: Iterable[str] = ()):
+        """
+        Args:
+            properties (Sequence[Dict]): The candidate property payloads.
+            amenities (Iterable[str]): Amenities to precompute the description bitmask for.
+        """
+        self.properties = properties
+        self.amenities = list(dict.fromkeys(amenities))
+        self.amenity_bits = {amenity: bit for bit, amenity in enumerate(self.amenities)}
+        words = max(1, -(-len(self.amenities) // 64))
+        self.type_vocab: Dict = {}
+        self.sale_lease_vocab: Dict = {}
+
+        rows = []
+        for prop in properties:
+            try:
+                rows.append(self._read_row(prop, words))
+            except Exception as e:
+                logging.warning(f"Error reading filter columns of property {_property_id(prop)}: {e}")
+                rows.append(_INVALID_ROW[:-1] + ((0,) * words,))
+
+        columns = list(zip(*rows)) if rows else [()] * len(_INVALID_ROW)
+        # Rows that fail regardless of the filter values (e.g. no id, unparsable price_range)
+        self.valid = np.array(columns[0], dtype=bool)
+        self.price_kind = np.array(columns[1], dtype=np.int8)
+        self.price_min = np.array(columns[2], dtype=float)
+        self.price_max = np.array(columns[3], dtype=float)
+        # Whether list_price can be compared with numbers
+        self.price_numeric = np.array(columns[4], dtype=bool)
+        self.has_bedrooms = np.array(columns[5], dtype=bool)
+        self.bedrooms_numeric = np.array(columns[6], dtype=bool)
+        self.bedrooms = np.array(columns[7], dtype=float)
+        self.has_bathrooms = np.array(columns[8], dtype=bool)
+        self.bathrooms_numeric = np.array(columns[9], dtype=bool)
+        self.bathrooms = np.array(columns[10], dtype=float)
+        self.type_codes = np.array(columns[11], dtype=np.int32)
+        self.sale_lease_codes = np.array(columns[12], dtype=np.int32)
+        # Rows whose description cannot be searched for amenities
+        self.amenity_error = np.array(columns[13], dtype=bool)
+        self.amenity_mask = np.array(columns[14], dtype=np.uint64).reshape(len(rows), words)
+
+    def _read_row(self, prop: Dict, words: int) -> tuple:
+        valid = 'id' in prop
+        price_kind, price_min, price_max, price_numeric = PRICE_MISSING, np.nan, np.nan, False
+        if 'price_range' in prop and prop.get('price_range'):
+            price_kind = PRICE_RANGE
+            try:
+                price_min, price_max = map(float, prop['price_range'].split('-'))
+            except Exception:
+                valid = False
+        elif 'list_price' in prop and prop.get('list_price'):
+            price_kind = PRICE_LIST
+            list_price = prop.get('list_price')
+            if _is_number(list_price):
+                price_numeric = True
+                price_min = price_max = list_price
+
+        amenity_error = False
+        amenity_mask = [0] * words
+        if self.amenities:
+            description = prop.get('lp_listing_description', "")
+            try:
+                for amenity, bit in self.amenity_bits.items():
+                    if amenity in description:
+                        amenity_mask[bit // 64] |= 1 << (bit % 64)
+            except TypeError:
+                amenity_error = True
+
+        return (
+            valid, price_kind, price_min, price_max, price_numeric,
+            *_numeric_column_value(prop.get('bedrooms_total', None)),
+            *_numeric_column_value(prop.get('lp_calculated_bath', None)),
+            _vocabulary_code(self.type_vocab, prop.get('lp_property_type')),
+            _vocabulary_code(self.sale_lease_vocab, prop.get('lp_sale_lease')),
+            amenity_error, tuple(amenity_mask),
+        )
+
+
+class CompiledPropertyFilter:
+    """
+    PropertyFilters compiled into a vectorized predicate over CandidateColumns.
+
+    Inclusion semantics are identical to the original per-property checks, including
+    the exclusion of candidates without price, bedroom or bathroom information.
+    """
+
+    def __init__(self, filters: PropertyFilters):
+        """
+        Args:
+            filters (PropertyFilters): The filters to compile.
+        """
+        self.filters = filters
+        self.amenities = list(dict.fromkeys(filters.must_have_amenities))
+
+    def columns(self, properties: Sequence[Dict]) -> CandidateColumns:
+        """
+        Build the columns this filter needs for a list of candidates.
+
+        Args:
+            properties (Sequence[Dict]): The candidate property payloads.
+
+        Returns:
+            CandidateColumns: The columnar view of the candidates.
+        """
+        return CandidateColumns(properties, self.amenities)
+
+    def mask(self, columns: CandidateColumns) -> np.ndarray:
+        """
+        Evaluate the filter over columnar candidates.
+
+        Args:
+            columns (CandidateColumns): The candidates, built with at least this filter's amenities.
+
+        Returns:
+            np.ndarray: A boolean array, True for candidates that pass.
+        """
+        filters = self.filters
+        keep = columns.valid & (columns.price_kind != PRICE_MISSING)
+
+        # Price filtering: overlap with price_range, or list_price within bounds
+        is_range = columns.price_kind == PRICE_RANGE
+        if filters.min_price is not None:
+            keep &= ~(is_range & (columns.price_max < filters.min_price))
+        if filters.max_price is not None:
+            keep &= ~(is_range & (columns.price_min > filters.max_price))
+        is_list = columns.price_kind == PRICE_LIST
+        if filters.min_price or filters.max_price:
+            keep &= ~(is_list & ~columns.price_numeric)
+        if filters.min_price:
+            keep &= ~(is_list & (filters.min_price > columns.price_min))
+        if filters.max_price:
+            keep &= ~(is_list & (filters.max_price < columns.price_max))
+
+        # Bedroom and bathroom filtering
+        keep &= _range_mask(columns.has_bedrooms, columns.bedrooms_numeric, columns.bedrooms,
+                            filters.min_bedrooms, filters.max_bedrooms)
+        keep &= _range_mask(columns.has_bathrooms, columns.bathrooms_numeric, columns.bathrooms,
+                            filters.min_bathrooms, filters.max_bathrooms)
+
+        # Property type filtering
+        if filters.property_type is not None:
+            keep &= columns.type_codes == columns.type_vocab.get(filters.property_type, -2)
+
+        # Amenities filtering
+        if self.amenities:
+            required = np.zeros(columns.amenity_mask.shape[1], dtype=np.uint64)
+            for amenity in self.amenities:
+                if amenity not in columns.amenity_bits:
+                    raise ValueError(f"Columns were built without amenity '{amenity}'")
+                bit = columns.amenity_bits[amenity]
+                required[bit // 64] |= np.uint64(1 << (bit % 64))
+            keep &= ~columns.amenity_error
+            keep &= np.all((columns.amenity_mask & required) == required, axis=1)
+
+        # Sale or lease filtering
+        if filters.sale_lease:
+            keep &= columns.sale_lease_codes == columns.sale_lease_vocab.get(filters.sale_lease, -2)
+
+        return keep
+
+    def apply(self, properties: List[Dict]) -> List[Dict]:
+        """
+        Filter a list of candidates, keeping their order.
+
+        Args:
+            properties (List[Dict]): The candidate property payloads.
+
+        Returns:
+            List[Dict]: The candidates that pass the filter.
+        """
+        keep = self.mask(self.columns(properties))
+        return [properties[row] for row in np.flatnonzero(keep)]
+
+
+def _numeric_column_value(value):
+    """
+    Split a payload value into (present, comparable with numbers, numeric value).
+    """
+    if value is None:
+        return False, False, np.nan
+    if _is_number(value):
+        return True, True, value
+    return True, False, np.nan
+
+
+def _is_number(value) -> bool:
+    # Exact type check first, the Real ABC check is comparatively slow
+    return type(value) in (int, float) or isinstance(value, Real)
+
+
+def _vocabulary_code(vocabulary: Dict, value) -> int:
+    """
+    Encode a value as an integer code; unhashable values never equal a filter value.
+    """
+    try:
+        return vocabulary.setdefault(value, len(vocabulary))
+    except TypeError:
+        return -1
+
+
+def _range_mask(present: np.ndarray, numeric: np.ndarray, values: np.ndarray, low, high) -> np.ndarray:
+    keep = present.copy()
+    if low is not None or high is not None:
+        keep &= numeric
+    if low is not None:
+        keep &= ~(values < low)
+    if high is not None:
+        keep &= ~(values > high)
+    return keep
+
+
+def _property_id(prop):
+    try:
+        return prop.get('id')
+    except Exception:
+        return None
@@ -0,0 +1,377 @@
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+PARAMS_FILE = "params.json"
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph for approximate cosine nearest neighbour search.
+
+    Vectors are stored normalized, so similarity is a dot product, as in the cosine
+    collections created by PropertyIndexer. The graph is kept in NumPy adjacency
+    arrays: layer 0 is a (capacity, 2*M) array, and each upper layer holds rows only
+    for the nodes that reach it. Unused neighbour slots are -1. Deleted labels stay
+    in the graph as tombstones so that it remains navigable, but are never returned.
+    Searches may run concurrently from several threads; inserts and deletes must not
+    overlap with them.
+    """
+
+    def __init__(
+            self,
+            dim: int,
+            M: int = 16,
+            ef_construction: int = 200,
+            ef_search: int = 64,
+            capacity: int = 1024,
+            seed: int = 42
+    ):
+        """
+        Args:
+            dim (int): The vector dimension.
+            M (int): The number of neighbours per node on the upper layers (2*M on layer 0).
+            ef_construction (int): The size of the candidate list while inserting.
+            ef_search (int): The default size of the candidate list while searching.
+            capacity (int): The initial number of node slots; grown as needed.
+            seed (int): Seed for drawing node levels.
+        """
+        self.dim = dim
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(M)
+        self.rng = np.random.default_rng(seed)
+
+        self.count = 0
+        self.entry_point = -1
+        self.max_level = -1
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.labels = np.full(capacity, -1, dtype=np.int64)
+        self.levels = np.zeros(capacity, dtype=np.int8)
+        self.deleted = np.zeros(capacity, dtype=bool)
+        self.layer0 = np.full((capacity, self.M0), -1, dtype=np.int32)
+        # Upper layers: node -> row of that layer's adjacency array
+        self.upper_rows: List[dict] = []
+        self.upper_neighbors: List[np.ndarray] = []
+        self.node_of: dict = {}
+        # Visited marks of _search_layer, kept per thread so that concurrent searches do not share them
+        self._scratch = threading.local()
+
+    def __len__(self) -> int:
+        return len(self.node_of)
+
+    def add(self, label: int, vector: np.ndarray):
+        """
+        Insert a vector; re-adding a label replaces its previous vector.
+
+        Args:
+            label (int): The external id of the vector (e.g. the property id).
+            vector (np.ndarray): The vector to insert.
+        """
+        if label in self.node_of:
+            self.delete(label)
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        node = self.count
+        self._ensure_capacity(node + 1)
+        self.count += 1
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        self.vectors[node] = vector
+        self.labels[node] = label
+        self.levels[node] = level
+        self.node_of[label] = node
+        for layer in range(1, level + 1):
+            if layer > len(self.upper_rows):
+                self.upper_rows.append({})
+                self.upper_neighbors.append(np.full((16, self.M), -1, dtype=np.int32))
+            self._add_upper_row(layer, node)
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry = self.entry_point
+        for layer in range(self.max_level, level, -1):
+            entry = self._search_layer(vector, [entry], 1, layer)[0][1]
+
+        entries = [entry]
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(vector, entries, self.ef_construction, layer)
+            max_neighbors = self.M0 if layer == 0 else self.M
+            neighbors = self._select_neighbors(candidates, max_neighbors)
+            self._set_neighbors(node, layer, neighbors)
+            for neighbor in neighbors:
+                self._connect(neighbor, node, layer, max_neighbors)
+            entries = [candidate for _, candidate in candidates]
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def add_items(self, labels: List[int], vectors: np.ndarray):
+        """
+        Insert many vectors.
+
+        Args:
+            labels (List[int]): The external ids of the vectors.
+            vectors (np.ndarray): A (len(labels), dim) matrix.
+        """
+        self._ensure_capacity(self.count + len(labels))
+        for position, (label, vector) in enumerate(zip(labels, vectors)):
+            self.add(int(label), vector)
+            if (position + 1) % 10000 == 0:
+                logging.info(f"Inserted {position + 1} of {len(labels)} vectors into HNSW index")
+
+    def delete(self, label: int) -> bool:
+        """
+        Remove a label from search results.
+
+        Args:
+            label (int): The external id to delete (e.g. a delisted property).
+
+        Returns:
+            bool: True if the label was present.
+        """
+        node = self.node_of.pop(label, None)
+        if node is None:
+            return False
+        self.deleted[node] = True
+        return True
+
+    def search(
+            self,
+            query: np.ndarray,
+            k: int,
+            ef: Optional[int] = None,
+            allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate k most similar vectors.
+
+        Args:
+            query (np.ndarray): The query vector.
+            k (int): The number of results.
+            ef (Optional[int]): The candidate list size. Defaults to ef_search.
+            allowed (Optional[np.ndarray]): Boolean mask over nodes; only allowed nodes are returned.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The labels and cosine similarities, best first.
+        """
+        if self.entry_point < 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        entry = self.entry_point
+        for layer in range(self.max_level, 0, -1):
+            entry = self._search_layer(query, [entry], 1, layer)[0][1]
+
+        returnable = ~self.deleted[:self.count]
+        if allowed is not None:
+            returnable &= allowed[:self.count]
+        results = self._search_layer(query, [entry], max(ef or self.ef_search, k), 0, returnable)[:k]
+        nodes = np.array([node for _, node in results], dtype=np.int64)
+        scores = np.array([1.0 - distance for distance, _ in results], dtype=np.float32)
+        return self.labels[nodes] if len(nodes) else nodes, scores
+
+    def save(self, directory: str):
+        """
+        Write the index to a directory of .npy files.
+
+        Args:
+            directory (str): The directory to write to.
+        """
+        os.makedirs(directory, exist_ok=True)
+        n = self.count
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors[:n])
+        np.save(os.path.join(directory, "labels.npy"), self.labels[:n])
+        np.save(os.path.join(directory, "levels.npy"), self.levels[:n])
+        np.save(os.path.join(directory, "deleted.npy"), self.deleted[:n])
+        np.save(os.path.join(directory, "layer0.npy"), self.layer0[:n])
+        for layer, (rows, neighbors) in enumerate(zip(self.upper_rows, self.upper_neighbors), start=1):
+            nodes = np.array(sorted(rows, key=rows.get), dtype=np.int32)
+            np.save(os.path.join(directory, f"layer{layer}_nodes.npy"), nodes)
+            np.save(os.path.join(directory, f"layer{layer}.npy"), neighbors[:len(nodes)])
+        with open(os.path.join(directory, PARAMS_FILE), "w") as params_file:
+            json.dump({
+                "dim": self.dim, "M": self.M, "ef_construction": self.ef_construction,
+                "ef_search": self.ef_search, "count": n, "entry_point": self.entry_point,
+                "max_level": self.max_level, "layers": len(self.upper_rows),
+            }, params_file)
+
+    @classmethod
+    def load(cls, directory: str) -> "HNSWIndex":
+        """
+        Read an index written by ``save``.
+
+        Args:
+            directory (str): The directory to read from.
+
+        Returns:
+            HNSWIndex: The loaded index, ready for searches and further inserts.
+        """
+        with open(os.path.join(directory, PARAMS_FILE)) as params_file:
+            params = json.load(params_file)
+        index = cls(params["dim"], M=params["M"], ef_construction=params["ef_construction"],
+                    ef_search=params["ef_search"], capacity=max(params["count"], 1))
+        n = params["count"]
+        index.count = n
+        index.entry_point = params["entry_point"]
+        index.max_level = params["max_level"]
+        index.vectors[:n] = np.load(os.path.join(directory, "vectors.npy"))
+        index.labels[:n] = np.load(os.path.join(directory, "labels.npy"))
+        index.levels[:n] = np.load(os.path.join(directory, "levels.npy"))
+        index.deleted[:n] = np.load(os.path.join(directory, "deleted.npy"))
+        index.layer0[:n] = np.load(os.path.join(directory, "layer0.npy"))
+        for layer in range(1, params["layers"] + 1):
+            nodes = np.load(os.path.join(directory, f"layer{layer}_nodes.npy"))
+            index.upper_rows.append({int(node): row for row, node in enumerate(nodes)})
+            index.upper_neighbors.append(np.load(os.path.join(directory, f"layer{layer}.npy")))
+        index.node_of = {int(index.labels[node]): node for node in range(n) if not index.deleted[node]}
+        return index
+
+    def _ensure_capacity(self, size: int):
+        capacity = len(self.labels)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2)
+        grow = new_capacity - capacity
+        self.vectors = np.concatenate([self.vectors, np.zeros((grow, self.dim), dtype=np.float32)])
+        self.labels = np.concatenate([self.labels, np.full(grow, -1, dtype=np.int64)])
+        self.levels = np.concatenate([self.levels, np.zeros(grow, dtype=np.int8)])
+        self.deleted = np.concatenate([self.deleted, np.zeros(grow, dtype=bool)])
+        self.layer0 = np.concatenate([self.layer0, np.full((grow, self.M0), -1, dtype=np.int32)])
+
+    def _add_upper_row(self, layer: int, node: int):
+        rows = self.upper_rows[layer - 1]
+        neighbors = self.upper_neighbors[layer - 1]
+        if len(rows) == len(neighbors):
+            self.upper_neighbors[layer - 1] = np.concatenate(
+                [neighbors, np.full((len(neighbors), self.M), -1, dtype=np.int32)]
+            )
+        rows[node] = len(rows)
+
+    def _neighbors(self, node: int, layer: int) -> np.ndarray:
+        if layer == 0:
+            row = self.layer0[node]
+        else:
+            row = self.upper_neighbors[layer - 1][self.upper_rows[layer - 1][node]]
+        return row[row >= 0]
+
+    def _set_neighbors(self, node: int, layer: int, neighbors: List[int]):
+        if layer == 0:
+            row = self.layer0[node]
+        else:
+            row = self.upper_neighbors[layer - 1][self.upper_rows[layer - 1][node]]
+        row[:] = -1
+        row[:len(neighbors)] = neighbors
+
+    def _connect(self, node: int, new_neighbor: int, layer: int, max_neighbors: int):
+        """
+        Add a reverse link, pruning the neighbour list with the selection heuristic when full.
+        """
+        neighbors = self._neighbors(node, layer)
+        if len(neighbors) < max_neighbors:
+            self._set_neighbors(node, layer, [*neighbors.tolist(), new_neighbor])
+            return
+        candidates = np.append(neighbors, new_neighbor)
+        distances = 1.0 - self.vectors[candidates] @ self.vectors[node]
+        order = np.argsort(distances)
+        pruned = self._select_neighbors(list(zip(distances[order].tolist(), candidates[order].tolist())),
+                                        max_neighbors)
+        self._set_neighbors(node, layer, pruned)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], max_neighbors: int) -> List[int]:
+        """
+        Keep candidates closer to the base node than to any already selected neighbour,
+        which spreads links across directions (Malkov & Yashunin, algorithm 4).
+
+        Args:
+            candidates (List[Tuple[float, int]]): (distance to base node, node) pairs sorted by distance.
+        """
+        if len(candidates) <= 1:
+            return [candidate for _, candidate in candidates]
+        nodes = np.array([candidate for _, candidate in candidates], dtype=np.int64)
+        distances = [distance for distance, _ in candidates]
+        pairwise = 1.0 - self.vectors[nodes] @ self.vectors[nodes].T
+        # Distance of every candidate to its closest selected neighbour so far
+        closest = np.full(len(nodes), np.inf, dtype=np.float32)
+        selected: List[int] = []
+        for position, distance in enumerate(distances):
+            if len(selected) >= max_neighbors:
+                break
+            if closest[position] < distance:
+                continue
+            selected.append(position)
+            np.minimum(closest, pairwise[position], out=closest)
+        return nodes[selected].tolist()
+
+    def _next_visited(self) -> Tuple[np.ndarray, int]:
+        """
+        The calling thread's visited array, sized to the graph, and a fresh stamp marking this search.
+        """
+        scratch = self._scratch
+        visited = getattr(scratch, "visited", None)
+        if visited is None or len(visited) < len(self.labels):
+            scratch.visited = visited = np.zeros(len(self.labels), dtype=np.int32)
+            scratch.stamp = 0
+        scratch.stamp += 1
+        return visited, scratch.stamp
+
+    def _search_layer(
+            self,
+            query: np.ndarray,
+            entries: List[int],
+            ef: int,
+            layer: int,
+            returnable: Optional[np.ndarray] = None
+    ) -> List[Tuple[float, int]]:
+        """
+        Best-first search of one layer.
+
+        Every node is traversed, but only returnable nodes enter the result list.
+
+        Returns:
+            List[Tuple[float, int]]: Up to ef (cosine distance, node) pairs, closest first.
+        """
+        visited, stamp = self._next_visited()
+        candidates: List[Tuple[float, int]] = []
+        results: List[Tuple[float, int]] = []  # max-heap on distance via negation
+
+        entry_nodes = np.array(entries, dtype=np.int64)
+        visited[entry_nodes] = stamp
+        for distance, node in zip((1.0 - self.vectors[entry_nodes] @ query).tolist(), entries):
+            heapq.heappush(candidates, (distance, node))
+            if returnable is None or returnable[node]:
+                heapq.heappush(results, (-distance, node))
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if len(results) >= ef and distance > -results[0][0]:
+                break
+            neighbors = self._neighbors(node, layer)
+            neighbors = neighbors[visited[neighbors] != stamp]
+            if not len(neighbors):
+                continue
+            visited[neighbors] = stamp
+            distances = 1.0 - self.vectors[neighbors] @ query
+            for neighbor_distance, neighbor in zip(distances.tolist(), neighbors.tolist()):
+                if len(results) < ef or neighbor_distance < -results[0][0]:
+                    heapq.heappush(candidates, (neighbor_distance, neighbor))
+                    if returnable is None or returnable[neighbor]:
+                        heapq.heappush(results, (-neighbor_distance, neighbor))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+
+        return sorted((-negative_distance, node) for negative_distance, node in results)
@@ -0,0 +1,172 @@
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from hnsw_index import HNSWIndex
+from local_vector_store import LocalVectorStore, top_positions
+from vector_quantizer import ProductQuantizer
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+
+def synthetic_embeddings(count: int, dim: int, clusters: int = 100, seed: int = 42) -> np.ndarray:
+    """
+    Generate clustered, normalized vectors resembling sentence embeddings.
+
+    Args:
+        count (int): The number of vectors.
+        dim (int): The vector dimension.
+        clusters (int): The number of cluster centres.
+        seed (int): The random seed.
+
+    Returns:
+        np.ndarray: A (count, dim) float32 matrix of unit vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(clusters, size=count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """
+    Exact cosine top-k rows, the ground truth for recall.
+    """
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def benchmark(
+        vectors: np.ndarray,
+        k: int = 10,
+        num_queries: int = 200,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef_search_values: List[int] = (16, 32, 64, 128, 256),
+        pq_subspaces: List[int] = (),
+        rerank_factors: List[int] = (0, 4),
+        seed: int = 0
+) -> List[Dict[str, float]]:
+    """
+    Measure HNSW and product-quantized recall@k, latency and memory against exact search
+    on the same embeddings.
+
+    Args:
+        vectors (np.ndarray): The normalized embeddings to index.
+        k (int): The number of neighbours per query.
+        num_queries (int): The number of stored vectors used as queries.
+        M (int): The HNSW M parameter.
+        ef_construction (int): The HNSW ef_construction parameter.
+        ef_search_values (List[int]): The ef_search values to report. Empty skips HNSW.
+        pq_subspaces (List[int]): Product quantizer sizes (bytes per vector) to report.
+        rerank_factors (List[int]): Exact rerank factors reported per quantizer; 0 is no rerank.
+        seed (int): Seed for picking the query vectors.
+
+    Returns:
+        List[Dict[str, float]]: One row per search method with recall and latency figures.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = vectors[np.random.default_rng(seed).choice(len(vectors), size=num_queries, replace=False)]
+    float_bytes = vectors.shape[1] * vectors.itemsize
+
+    start = time.perf_counter()
+    truth = [exact_top_k(vectors, query, k) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / num_queries
+    rows = [{"method": "exact", "setting": "-", "recall": 1.0, "latency_ms": exact_ms, "bytes_per_vector": float_bytes}]
+
+    if ef_search_values:
+        start = time.perf_counter()
+        index = HNSWIndex(vectors.shape[1], M=M, ef_construction=ef_construction, capacity=len(vectors))
+        index.add_items(list(range(len(vectors))), vectors)
+        logging.info(f"Built HNSW index over {len(vectors)} vectors in {time.perf_counter() - start:.1f}s")
+        # Layer 0 adjacency dominates the graph's memory
+        hnsw_bytes = float_bytes + index.layer0.shape[1] * index.layer0.itemsize
+        for ef_search in ef_search_values:
+            rows.append(_measure("hnsw", f"ef_search={ef_search}", hnsw_bytes, queries, truth, k,
+                                 lambda query: index.search(query, k, ef=ef_search)[0]))
+
+    for num_subspaces in pq_subspaces:
+        start = time.perf_counter()
+        quantizer = ProductQuantizer(vectors.shape[1], num_subspaces=num_subspaces)
+        quantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+        logging.info(f"Trained and encoded {num_subspaces}-byte product quantizer in {time.perf_counter() - start:.1f}s")
+        for rerank_factor in rerank_factors:
+            rows.append(_measure("pq", f"m={num_subspaces} rerank={rerank_factor}", quantizer.bytes_per_vector,
+                                 queries, truth, k,
+                                 lambda query: _pq_search(quantizer, codes, vectors, query, k, rerank_factor)))
+    return rows
+
+
+def _pq_search(quantizer: ProductQuantizer, codes: np.ndarray, vectors: np.ndarray, query: np.ndarray, k: int,
+               rerank_factor: int) -> np.ndarray:
+    scores = quantizer.scores(codes, query)
+    if not rerank_factor:
+        return top_positions(scores, k)
+    shortlist = top_positions(scores, k * rerank_factor)
+    return shortlist[top_positions(vectors[shortlist] @ query, k)]
+
+
+def _measure(method: str, setting: str, bytes_per_vector: float, queries: np.ndarray, truth: List[np.ndarray],
+             k: int, search) -> Dict[str, float]:
+    latencies = []
+    recalls = []
+    for query, relevant in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(found.tolist()) & set(relevant.tolist())) / k)
+    return {
+        "method": method,
+        "setting": setting,
+        "recall": float(np.mean(recalls)),
+        "latency_ms": float(np.mean(latencies)),
+        "p95_latency_ms": float(np.percentile(latencies, 95)),
+        "bytes_per_vector": bytes_per_vector,
+    }
+
+
+def format_report(rows: List[Dict[str, float]], k: int) -> str:
+    """
+    Render benchmark rows as a markdown table.
+    """
+    float_bytes = rows[0]["bytes_per_vector"]
+    lines = [f"| method | setting | recall@{k} | mean latency (ms) | p95 latency (ms) | bytes/vector | compression |",
+             "|---|---|---|---|---|---|---|"]
+    for row in rows:
+        p95 = f"{row['p95_latency_ms']:.2f}" if "p95_latency_ms" in row else "-"
+        lines.append(f"| {row['method']} | {row['setting']} | {row['recall']:.3f} | {row['latency_ms']:.2f} | {p95} "
+                     f"| {row['bytes_per_vector']:.0f} | {float_bytes / row['bytes_per_vector']:.1f}x |")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HNSW and product quantization recall vs latency against exact search")
+    parser.add_argument("--store", help="LocalVectorStore directory; synthetic embeddings are used if omitted")
+    parser.add_argument("--facet", default="features", help="The facet matrix to benchmark")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--pq-subspaces", type=int, nargs="*", default=[],
+                        help="Product quantizer sizes in bytes per vector, e.g. 96 (16x) and 192 (8x) for 384-d")
+    parser.add_argument("--rerank", type=int, nargs="*", default=[0, 4], help="Exact rerank factors for PQ")
+    args = parser.parse_args()
+
+    if args.store:
+        embeddings = np.asarray(LocalVectorStore(args.store).vectors[args.facet], dtype=np.float32)
+    else:
+        embeddings = synthetic_embeddings(args.synthetic, args.dim)
+
+    report = benchmark(embeddings, k=args.k, num_queries=args.queries, M=args.M,
+                       ef_construction=args.ef_construction, ef_search_values=args.ef_search,
+                       pq_subspaces=args.pq_subspaces, rerank_factors=args.rerank)
+    print(format_report(report, args.k))
@@ -0,0 +1,623 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from common_class import FACET_COLLECTIONS, FACET_DIMENSIONS, MULTI_VECTOR_COLLECTION
+from hnsw_index import HNSWIndex
+from vector_quantizer import ProductQuantizer
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+MANIFEST_FILE = "manifest.json"
+IDS_FILE = "ids.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+HNSW_DIRECTORY = "hnsw"
+PQ_DIRECTORY = "pq"
+# Rows scored per block when the stored matrix has to be upcast (e.g. float16)
+SCORE_BLOCK_ROWS = 65536
+# Filters selecting at most this many rows are scored exactly even when an HNSW index is loaded
+EXACT_FILTER_ROWS = 20000
+
+
+class LocalVectorStore:
+    """
+    In-process exact search over facet embeddings exported from Qdrant.
+
+    Each facet is a row-normalized ``.npy`` matrix opened memory-mapped, so worker
+    processes on one host share the same pages. The store implements the subset of
+    the QdrantClient API used by PropertySearcher (``retrieve``, ``search``,
+    ``search_batch`` and ``scroll``) for both the per-attribute collections and the
+    multi-vector collection, and can be passed to PropertySearcher in place of a client.
+    Cosine scores are dot products of normalized vectors, as in the collections
+    created by PropertyIndexer, so results are ranked identically.
+
+    Search is exact by default. Facets with an HNSW index (see ``build_hnsw_indexes``)
+    are searched approximately, except under filters selective enough that exact
+    scoring of the remaining rows is cheaper. Facets with product-quantized codes
+    (see ``build_product_quantizers``) are scored from the codes, and only the best
+    ``rerank_factor * limit`` candidates are rescored against the memory-mapped
+    float matrices, so only the codes need to stay resident in RAM.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            mmap: bool = True,
+            use_hnsw: bool = False,
+            use_pq: bool = False,
+            rerank_factor: int = 4
+    ):
+        """
+        Args:
+            directory (str): The directory written by ``export``.
+            mmap (bool): Memory-map the matrices instead of reading them into memory.
+            use_hnsw (bool): Load the HNSW indexes saved by ``build_hnsw_indexes``.
+            use_pq (bool): Load the product quantizers and codes saved by ``build_product_quantizers``.
+            rerank_factor (int): Candidates per requested result rescored exactly after a
+                product-quantized search. 0 returns the approximate ranking.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        count = self.manifest["count"]
+        mmap_mode = "r" if mmap else None
+
+        self.ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode=mmap_mode)[:count]
+        self.vectors = {
+            facet: np.load(os.path.join(directory, f"{facet}.npy"), mmap_mode=mmap_mode)[:count]
+            for facet in self.manifest["facets"]
+        }
+        with open(os.path.join(directory, PAYLOADS_FILE)) as payloads_file:
+            self.payloads = [json.loads(line) for line in payloads_file]
+        self.row_of = {int(point_id): row for row, point_id in enumerate(self.ids)}
+        self.removed = np.zeros(count, dtype=bool)
+        self.indexes: Dict[str, HNSWIndex] = {}
+        if use_hnsw:
+            for facet in self.manifest["facets"]:
+                index_directory = os.path.join(directory, HNSW_DIRECTORY, facet)
+                if os.path.isdir(index_directory):
+                    self.indexes[facet] = HNSWIndex.load(index_directory)
+        self.rerank_factor = rerank_factor
+        self.quantizers: Dict[str, ProductQuantizer] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        if use_pq:
+            for facet in self.manifest["facets"]:
+                quantizer_path = os.path.join(directory, PQ_DIRECTORY, f"{facet}.npz")
+                if os.path.exists(quantizer_path):
+                    self.quantizers[facet] = ProductQuantizer.load(quantizer_path)
+                    self.codes[facet] = np.load(os.path.join(directory, PQ_DIRECTORY, f"{facet}_codes.npy"),
+                                                mmap_mode=mmap_mode)[:count]
+        self._payload_columns: Dict[str, np.ndarray] = {}
+        self._index_rows: Dict[str, np.ndarray] = {}
+        # In-memory arrays with spare rows behind ids, removed, vectors and codes once points are added
+        self._buffers: Dict[str, np.ndarray] = {}
+        logging.info(f"Loaded local vector store with {count} points from {directory}")
+
+    @staticmethod
+    def export(
+            client: QdrantClient,
+            directory: str,
+            dtype: Union[str, np.dtype] = np.float32,
+            multi_vector: bool = False,
+            batch_size: int = 1000
+    ) -> "LocalVectorStore":
+        """
+        Export the facet collections from Qdrant into a local vector store directory.
+
+        Args:
+            client (QdrantClient): The Qdrant client instance.
+            directory (str): The directory to write the store to.
+            dtype (Union[str, np.dtype]): The storage dtype of the matrices (float32 or float16).
+            multi_vector (bool): Read the single multi-vector collection instead of one collection per attribute.
+            batch_size (int): The number of points read per request.
+
+        Returns:
+            LocalVectorStore: The exported store, opened memory-mapped.
+        """
+        os.makedirs(directory, exist_ok=True)
+        source = MULTI_VECTOR_COLLECTION if multi_vector else FACET_COLLECTIONS["location"]
+        capacity = client.count(collection_name=source, exact=True).count
+        dtype = np.dtype(dtype)
+
+        ids = np.lib.format.open_memmap(os.path.join(directory, IDS_FILE), mode="w+", dtype=np.int64,
+                                        shape=(capacity,))
+        matrices = {
+            facet: np.lib.format.open_memmap(os.path.join(directory, f"{facet}.npy"), mode="w+", dtype=dtype,
+                                             shape=(capacity, dim))
+            for facet, dim in FACET_DIMENSIONS.items()
+        }
+
+        count = 0
+        offset = None
+        with open(os.path.join(directory, PAYLOADS_FILE), "w") as payloads_file:
+            while count < capacity:
+                records, offset = client.scroll(
+                    collection_name=source,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                vectors = _record_vectors(client, records, multi_vector)
+                for record in records:
+                    if count >= capacity:
+                        break
+                    missing = [facet for facet in FACET_DIMENSIONS if facet not in vectors[record.id]]
+                    if missing:
+                        logging.warning(f"Skipping point {record.id} without {missing} vectors")
+                        continue
+                    ids[count] = record.id
+                    for facet, matrix in matrices.items():
+                        vector = np.asarray(vectors[record.id][facet], dtype=np.float32)
+                        matrix[count] = vector / (np.linalg.norm(vector) or 1.0)
+                    payloads_file.write(json.dumps(record.payload or {}) + "\n")
+                    count += 1
+                if offset is None:
+                    break
+
+        ids.flush()
+        for matrix in matrices.values():
+            matrix.flush()
+        del ids, matrices
+        with open(os.path.join(directory, MANIFEST_FILE), "w") as manifest_file:
+            json.dump({
+                "count": count,
+                "dtype": dtype.name,
+                "facets": {facet: {"dim": dim} for facet, dim in FACET_DIMENSIONS.items()},
+            }, manifest_file)
+        logging.info(f"Exported {count} points from '{source}' to {directory}")
+        return LocalVectorStore(directory)
+
+    def build_hnsw_indexes(
+            self,
+            M: int = 16,
+            ef_construction: int = 200,
+            ef_search: int = 64,
+            facets: Optional[List[str]] = None,
+            save: bool = True
+    ) -> Dict[str, HNSWIndex]:
+        """
+        Build an HNSW index over the stored rows of each facet and use it for searches.
+
+        Args:
+            M (int): The number of neighbours per node on the upper layers.
+            ef_construction (int): The size of the candidate list while inserting.
+            ef_search (int): The size of the candidate list while searching.
+            facets (Optional[List[str]]): The facets to index. Defaults to all facets.
+            save (bool): Save the indexes next to the matrices so ``use_hnsw`` can load them.
+
+        Returns:
+            Dict[str, HNSWIndex]: The indexes by facet.
+        """
+        live = np.flatnonzero(~self.removed)
+        for facet in facets or list(self.vectors):
+            index = HNSWIndex(self.vectors[facet].shape[1], M=M, ef_construction=ef_construction,
+                              ef_search=ef_search, capacity=max(len(live), 1))
+            index.add_items(self.ids[live].tolist(), self.vectors[facet][live])
+            if save:
+                index.save(os.path.join(self.directory, HNSW_DIRECTORY, facet))
+            self.indexes[facet] = index
+            self._index_rows.pop(facet, None)
+            logging.info(f"Built HNSW index over {len(index)} '{facet}' vectors")
+        return self.indexes
+
+    def build_product_quantizers(
+            self,
+            num_subspaces: Optional[int] = None,
+            facets: Optional[List[str]] = None,
+            sample_size: int = 100000,
+            save: bool = True
+    ) -> Dict[str, ProductQuantizer]:
+        """
+        Train a product quantizer per facet on the stored vectors, encode them and use the codes for searches.
+
+        Args:
+            num_subspaces (Optional[int]): Bytes per encoded vector. Defaults to half the dimension (8x).
+            facets (Optional[List[str]]): The facets to quantize. Defaults to all facets.
+            sample_size (int): The maximum number of vectors used to train each quantizer.
+            save (bool): Save the codebooks and codes next to the matrices so ``use_pq`` can load them.
+
+        Returns:
+            Dict[str, ProductQuantizer]: The quantizers by facet.
+        """
+        if save:
+            os.makedirs(os.path.join(self.directory, PQ_DIRECTORY), exist_ok=True)
+        for facet in facets or list(self.vectors):
+            matrix = self.vectors[facet]
+            quantizer = ProductQuantizer(matrix.shape[1], num_subspaces=num_subspaces,
+                                         num_centroids=min(256, len(matrix)))
+            quantizer.train(matrix, sample_size=sample_size)
+            codes = quantizer.encode(matrix)
+            if save:
+                quantizer.save(os.path.join(self.directory, PQ_DIRECTORY, f"{facet}.npz"))
+                np.save(os.path.join(self.directory, PQ_DIRECTORY, f"{facet}_codes.npy"), codes)
+            self.quantizers[facet] = quantizer
+            self.codes[facet] = codes
+            logging.info(f"Quantized '{facet}' vectors from {matrix.shape[1] * matrix.itemsize} "
+                         f"to {quantizer.bytes_per_vector} bytes")
+        return self.quantizers
+
+    def add_points(self, ids: List[int], vectors: Dict[str, np.ndarray], payloads: List[Dict]):
+        """
+        Add or replace points in memory, e.g. new listings arriving between exports.
+
+        The arrays are copied into memory with room for twice their rows whenever they are
+        full, the first call included, so adding points costs amortized O(len(ids)).
+        HNSW indexes are updated incrementally; call ``build_hnsw_indexes`` to persist them.
+
+        Args:
+            ids (List[int]): The point ids.
+            vectors (Dict[str, np.ndarray]): A (len(ids), dim) matrix per facet.
+            payloads (List[Dict]): The payload of each point.
+        """
+        self.delete_points(ids)
+        ids = [int(point_id) for point_id in ids]
+        start = len(self.ids)
+        self.ids = self._append_rows("ids", self.ids, np.array(ids, dtype=np.int64))
+        for facet in self.vectors:
+            matrix = np.asarray(vectors[facet], dtype=np.float32)
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self.vectors[facet] = self._append_rows(f"vectors/{facet}", self.vectors[facet], matrix)
+            if facet in self.indexes:
+                self.indexes[facet].add_items(ids, matrix)
+            if facet in self.quantizers:
+                self.codes[facet] = self._append_rows(f"codes/{facet}", self.codes[facet],
+                                                      self.quantizers[facet].encode(matrix))
+        self.payloads.extend(payloads)
+        self.removed = self._append_rows("removed", self.removed, np.zeros(len(ids), dtype=bool))
+        self.row_of.update({point_id: start + offset for offset, point_id in enumerate(ids)})
+        self._payload_columns.clear()
+        self._index_rows.clear()
+
+    def _append_rows(self, name: str, array: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        Append rows to one of the store's arrays, returning the array as a view of the first rows of its buffer.
+
+        The buffer doubles in capacity when full, as the neighbor table does, and is replaced
+        when the array is no longer a view of it (e.g. codes rebuilt by ``build_product_quantizers``).
+        """
+        count = len(array)
+        buffer = self._buffers.get(name)
+        if buffer is None or array.base is not buffer or count + len(rows) > len(buffer):
+            buffer = np.empty((max(2 * count, count + len(rows), 1),) + array.shape[1:], dtype=array.dtype)
+            buffer[:count] = array
+            self._buffers[name] = buffer
+        buffer[count:count + len(rows)] = rows
+        return buffer[:count + len(rows)]
+
+    def delete_points(self, ids: List[int]) -> int:
+        """
+        Remove points from search and retrieve results, e.g. delisted properties.
+
+        Args:
+            ids (List[int]): The point ids.
+
+        Returns:
+            int: The number of points that were removed.
+        """
+        removed = 0
+        for point_id in ids:
+            row = self.row_of.pop(int(point_id), None)
+            if row is None:
+                continue
+            self.removed[row] = True
+            for index in self.indexes.values():
+                index.delete(int(point_id))
+            removed += 1
+        return removed
+
+    def retrieve(
+            self,
+            collection_name: str,
+            ids: List[int],
+            with_payload: Union[bool, List[str]] = True,
+            with_vectors: Union[bool, List[str]] = False,
+            **kwargs
+    ) -> List[models.Record]:
+        """
+        Retrieve points by id, mirroring ``QdrantClient.retrieve``.
+        """
+        facets = self._collection_facets(collection_name)
+        records = []
+        for point_id in ids:
+            row = self.row_of.get(point_id)
+            if row is None:
+                continue
+            records.append(models.Record(
+                id=point_id,
+                payload=self._payload(row, with_payload),
+                vector=self._vector(row, collection_name, facets, with_vectors)
+            ))
+        return records
+
+    def search(
+            self,
+            collection_name: str,
+            query_vector,
+            query_filter: Optional[models.Filter] = None,
+            limit: int = 10,
+            with_payload: Union[bool, List[str]] = True,
+            with_vectors: Union[bool, List[str]] = False,
+            **kwargs
+    ) -> List[models.ScoredPoint]:
+        """
+        Exact cosine top-k search, mirroring ``QdrantClient.search``.
+        """
+        facet, vector = self._query_facet(collection_name, query_vector)
+        mask = self._filter_mask(query_filter) if query_filter is not None else None
+        rows, scores = self._top_k(facet, np.asarray(vector, dtype=np.float32), limit, mask)
+        facets = self._collection_facets(collection_name)
+        return [
+            models.ScoredPoint(
+                id=int(self.ids[row]),
+                version=0,
+                score=float(score),
+                payload=self._payload(row, with_payload),
+                vector=self._vector(row, collection_name, facets, with_vectors)
+            )
+            for row, score in zip(rows, scores)
+        ]
+
+    def search_batch(
+            self,
+            collection_name: str,
+            requests: List[models.SearchRequest],
+            **kwargs
+    ) -> List[List[models.ScoredPoint]]:
+        """
+        Run several searches, mirroring ``QdrantClient.search_batch``.
+        """
+        return [
+            self.search(
+                collection_name=collection_name,
+                query_vector=request.vector,
+                query_filter=request.filter,
+                limit=request.limit,
+                with_payload=request.with_payload if request.with_payload is not None else False,
+                with_vectors=request.with_vector if request.with_vector is not None else False
+            )
+            for request in requests
+        ]
+
+    def scroll(
+            self,
+            collection_name: str,
+            limit: int = 10,
+            offset: Optional[int] = None,
+            with_payload: Union[bool, List[str]] = True,
+            with_vectors: Union[bool, List[str]] = False,
+            **kwargs
+    ) -> Tuple[List[models.Record], Optional[int]]:
+        """
+        Page through all points, mirroring ``QdrantClient.scroll``.
+        """
+        start = self.row_of[offset] if offset is not None else 0
+        rows = np.flatnonzero(~self.removed[start:])[:limit + 1] + start
+        records = self.retrieve(collection_name, [int(point_id) for point_id in self.ids[rows[:limit]]],
+                                with_payload=with_payload, with_vectors=with_vectors)
+        next_offset = int(self.ids[rows[limit]]) if len(rows) > limit else None
+        return records, next_offset
+
+    def _top_k(
+            self,
+            facet: str,
+            query: np.ndarray,
+            limit: int,
+            mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Select the best ``limit`` rows of a facet for the query.
+        """
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        mask = ~self.removed if mask is None else mask & ~self.removed
+        if facet in self.indexes and np.count_nonzero(mask) > EXACT_FILTER_ROWS:
+            return self._index_top_k(facet, query, limit, mask)
+        if facet in self.quantizers:
+            return self._quantized_top_k(facet, query, limit, mask)
+
+        scores = _scores(self.vectors[facet], query)
+        candidates = np.flatnonzero(mask)
+        if len(candidates) < len(scores):
+            scores = scores[candidates]
+        top = top_positions(scores, limit)
+        return candidates[top], scores[top]
+
+    def _quantized_top_k(
+            self,
+            facet: str,
+            query: np.ndarray,
+            limit: int,
+            mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k from product-quantized scores, optionally rescoring the best candidates exactly.
+        """
+        scores = self.quantizers[facet].scores(self.codes[facet], query)
+        candidates = np.flatnonzero(mask)
+        if len(candidates) < len(scores):
+            scores = scores[candidates]
+        if not self.rerank_factor:
+            top = top_positions(scores, limit)
+            return candidates[top], scores[top]
+
+        shortlist = np.sort(candidates[top_positions(scores, limit * self.rerank_factor)])
+        exact = _scores(self.vectors[facet][shortlist], query)
+        top = top_positions(exact, limit)
+        return shortlist[top], exact[top]
+
+    def _index_top_k(
+            self,
+            facet: str,
+            query: np.ndarray,
+            limit: int,
+            mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k through the facet's HNSW index, restricted to the rows in ``mask``.
+        """
+        index = self.indexes[facet]
+        if facet not in self._index_rows:
+            self._index_rows[facet] = np.array(
+                [self.row_of.get(int(label), -1) for label in index.labels[:index.count]], dtype=np.int64
+            )
+        index_rows = self._index_rows[facet]
+        allowed = (index_rows >= 0) & mask[np.maximum(index_rows, 0)]
+        labels, scores = index.search(query, limit, allowed=allowed)
+        return np.array([self.row_of[int(label)] for label in labels], dtype=np.int64), scores
+
+    def _collection_facets(self, collection_name: str) -> List[str]:
+        if collection_name == MULTI_VECTOR_COLLECTION:
+            return list(self.vectors)
+        for facet, collection in FACET_COLLECTIONS.items():
+            if collection == collection_name:
+                return [facet]
+        raise ValueError(f"Collection '{collection_name}' is not in the local vector store")
+
+    def _query_facet(self, collection_name: str, query_vector) -> Tuple[str, List[float]]:
+        if isinstance(query_vector, models.NamedVector):
+            return query_vector.name, query_vector.vector
+        if isinstance(query_vector, tuple):
+            return query_vector
+        facets = self._collection_facets(collection_name)
+        if len(facets) != 1:
+            raise ValueError(f"Collection '{collection_name}' needs a named query vector")
+        return facets[0], query_vector
+
+    def _payload(self, row: int, with_payload: Union[bool, List[str]]) -> Optional[Dict]:
+        if with_payload is True:
+            return self.payloads[row]
+        if not with_payload:
+            return None
+        if isinstance(with_payload, models.PayloadSelectorInclude):
+            with_payload = with_payload.include
+        payload = self.payloads[row]
+        return {key: payload[key] for key in with_payload if key in payload}
+
+    def _vector(self, row: int, collection_name: str, facets: List[str], with_vectors: Union[bool, List[str]]):
+        if not with_vectors:
+            return None
+        if collection_name != MULTI_VECTOR_COLLECTION:
+            return self.vectors[facets[0]][row].astype(np.float32).tolist()
+        names = facets if with_vectors is True else with_vectors
+        return {name: self.vectors[name][row].astype(np.float32).tolist() for name in names}
+
+    def _filter_mask(self, query_filter: models.Filter) -> np.ndarray:
+        """
+        Evaluate the filter conditions used by PropertySearcher over all stored payloads.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for condition in query_filter.must or []:
+            mask &= self._condition_mask(condition)
+        for condition in query_filter.must_not or []:
+            mask &= ~self._condition_mask(condition)
+        if query_filter.should:
+            should = np.zeros(len(self.ids), dtype=bool)
+            for condition in query_filter.should:
+                should |= self._condition_mask(condition)
+            mask &= should
+        return mask
+
+    def _condition_mask(self, condition) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self._filter_mask(condition)
+        if isinstance(condition, models.HasIdCondition):
+            mask = np.zeros(len(self.ids), dtype=bool)
+            rows = [self.row_of[point_id] for point_id in condition.has_id if point_id in self.row_of]
+            mask[rows] = True
+            return mask
+        if isinstance(condition, models.IsEmptyCondition):
+            values = self.payload_column(condition.is_empty.key)
+            return np.array([value is None or value == [] for value in values], dtype=bool)
+        if isinstance(condition, models.FieldCondition):
+            values = self.payload_column(condition.key)
+            if condition.range is not None:
+                numbers = np.array([as_float(value) for value in values], dtype=float)
+                mask = ~np.isnan(numbers)
+                bounds = condition.range
+                if bounds.gt is not None:
+                    mask &= numbers > bounds.gt
+                if bounds.gte is not None:
+                    mask &= numbers >= bounds.gte
+                if bounds.lt is not None:
+                    mask &= numbers < bounds.lt
+                if bounds.lte is not None:
+                    mask &= numbers <= bounds.lte
+                return mask
+            if isinstance(condition.match, models.MatchValue):
+                return np.array([value == condition.match.value for value in values], dtype=bool)
+            if isinstance(condition.match, models.MatchAny):
+                accepted = set(condition.match.any)
+                return np.array([_hashable(value) in accepted for value in values], dtype=bool)
+        raise ValueError(f"Unsupported filter condition for the local vector store: {condition}")
+
+    def payload_column(self, key: str) -> np.ndarray:
+        """
+        The values of one payload field for every row, None where it is missing, cached until the store changes.
+        """
+        if key not in self._payload_columns:
+            column = np.empty(len(self.payloads), dtype=object)
+            column[:] = [payload.get(key) for payload in self.payloads]
+            self._payload_columns[key] = column
+        return self._payload_columns[key]
+
+
+def top_positions(scores: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Positions of the ``limit`` highest scores, best first.
+    """
+    if limit < len(scores):
+        top = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _scores(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    # Upcast block by block to keep float16 stores from materializing a float32 copy
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        block = matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+        scores[start:start + len(block)] = block @ query
+    return scores
+
+
+def _record_vectors(client: QdrantClient, records: List[models.Record], multi_vector: bool) -> Dict:
+    """
+    Collect the vector of every facet for a page of scrolled records.
+    """
+    if multi_vector:
+        return {record.id: dict(record.vector or {}) for record in records}
+    vectors = {record.id: {"location": record.vector} for record in records}
+    ids = [record.id for record in records]
+    for facet, collection in FACET_COLLECTIONS.items():
+        if facet == "location" or not ids:
+            continue
+        for point in client.retrieve(collection_name=collection, ids=ids, with_vectors=True, with_payload=False):
+            vectors[point.id][facet] = point.vector
+    return vectors
+
+
+def as_float(value) -> float:
+    """
+    A numeric payload value as float, NaN for missing or non-numeric values.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return None
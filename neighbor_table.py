@@ -0,0 +1,313 @@
+import copy
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from qdrant_client import models
+
+from common_class import FACET_COLLECTIONS, MULTI_VECTOR_COLLECTION, SearchMode
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+MANIFEST_FILE = "manifest.json"
+IDS_FILE = "ids.npy"
+# Bumped when the stored lists change meaning; tables of another format must be rebuilt
+TABLE_FORMAT = 2
+# Padding for rows with fewer neighbours than the table width
+NO_NEIGHBOR = -1
+
+
+class NeighborTable:
+    """
+    Precomputed per-facet neighbour lists for every indexed property.
+
+    For each property the table holds the top-N results of every searched facet, exactly
+    as the live facet searches return them (the property itself included). At query time
+    the searcher cuts them to the live search depth and merges them with its weighted RRF,
+    so a listing in the table is answered as live search would have answered it at build
+    time, without any vector search. Rows are int64 ``.npy`` matrices opened memory-mapped,
+    and a property's row is found with a dictionary lookup.
+
+    Properties re-indexed or deleted after the build are marked stale through
+    ``invalidate_ids`` and answered by live search until the table is rebuilt.
+    Their appearances in other rows need no invalidation: deleted neighbours are
+    skipped when the payloads are fetched, and the filters run on current payloads.
+    """
+
+    def __init__(self, directory: str, mmap: bool = True):
+        """
+        Args:
+            directory (str): The directory written by ``build``.
+            mmap (bool): Memory-map the matrices instead of reading them into memory.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest.get("format") != TABLE_FORMAT:
+            raise ValueError(f"Neighbor table in {directory} was written by an older version, rebuild it")
+        count = self.manifest["count"]
+        mmap_mode = "r" if mmap else None
+
+        self.ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode=mmap_mode)[:count]
+        self.neighbors_per_facet = self.manifest["neighbors_per_facet"]
+        self.facet_neighbors = {
+            facet: np.load(os.path.join(directory, f"facet_{facet}.npy"), mmap_mode=mmap_mode)[:count]
+            for facet in self.manifest["facets"]
+        }
+        self.row_of = {int(point_id): row for row, point_id in enumerate(self.ids)}
+        # Seeds whose stored vectors changed (or that were deleted) since the build
+        self.stale_ids = set()
+        logging.info(f"Loaded neighbor table with {count} properties from {directory}")
+
+    def neighbors(self, property_id: int, limit: int) -> Optional[Dict[str, List[int]]]:
+        """
+        Look up the facet search results of a property.
+
+        Args:
+            property_id (int): The ID of the seed property.
+            limit (int): The number of results per facet, as passed to the live facet searches.
+
+        Returns:
+            Optional[Dict[str, List[int]]]: The result IDs per facet, best first, or None if the
+                property has no current row or the table is shallower than ``limit``.
+        """
+        if property_id in self.stale_ids or limit > self.neighbors_per_facet:
+            return None
+        row = self.row_of.get(property_id)
+        if row is None:
+            return None
+        return {
+            facet: [int(neighbor) for neighbor in table[row, :limit] if neighbor != NO_NEIGHBOR]
+            for facet, table in self.facet_neighbors.items()
+        }
+
+    def invalidate_ids(self, property_ids: Iterable[int]) -> int:
+        """
+        Stop serving the rows of re-indexed or deleted properties.
+
+        Args:
+            property_ids (Iterable[int]): The ids of re-indexed or deleted properties.
+
+        Returns:
+            int: The number of rows that became stale.
+        """
+        stale = [property_id for property_id in property_ids if property_id in self.row_of]
+        self.stale_ids.update(stale)
+        return len(stale)
+
+    @staticmethod
+    def build(
+            searcher,
+            directory: str,
+            neighbors_per_facet: int = 50,
+            batch_size: int = 64,
+            facets: Optional[List[str]] = None,
+            verify_sample: int = 20
+    ) -> "NeighborTable":
+        """
+        Compute the facet neighbour lists of every property with batched searches and write the table.
+
+        Args:
+            searcher (PropertySearcher): The searcher whose client and collections are used.
+            directory (str): The directory to write the table to.
+            neighbors_per_facet (int): The number of results kept per facet (N); searches with
+                top_k * 2 <= N are served from the table.
+            batch_size (int): The number of properties queried per batched search.
+            facets (Optional[List[str]]): The facets to search. Defaults to the searcher's facets.
+            verify_sample (int): The number of properties whose table answers are compared with
+                live search after the build; 0 skips the check.
+
+        Returns:
+            NeighborTable: The written table, opened memory-mapped.
+        """
+        os.makedirs(directory, exist_ok=True)
+        client = searcher.client
+        facets = facets or list(searcher.facets)
+        capacity = client.count(collection_name=searcher.payload_collection, exact=True).count
+
+        ids = np.lib.format.open_memmap(os.path.join(directory, IDS_FILE), mode="w+", dtype=np.int64,
+                                        shape=(capacity,))
+        facet_tables = {
+            facet: _open_table(os.path.join(directory, f"facet_{facet}.npy"), capacity, neighbors_per_facet)
+            for facet in facets
+        }
+
+        count = 0
+        offset = None
+        next_report = 10000
+        started = time.monotonic()
+        while count < capacity:
+            records, offset = client.scroll(
+                collection_name=searcher.payload_collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            batch_ids = [record.id for record in records][:capacity - count]
+            vectors = _batch_vectors(searcher, batch_ids, facets)
+            batch_ids = [point_id for point_id in batch_ids if point_id in vectors]
+            results = _batch_search(searcher, batch_ids, vectors, facets, neighbors_per_facet)
+
+            for position, point_id in enumerate(batch_ids):
+                row = count + position
+                ids[row] = point_id
+                for facet, table in facet_tables.items():
+                    _write_row(table, row, [point.id for point in results[facet][position]])
+            count += len(batch_ids)
+            if count >= next_report:
+                logging.info(f"Neighbor table: {count} of {capacity} properties "
+                             f"({count / (time.monotonic() - started):.0f}/s)")
+                next_report += 10000
+            if offset is None:
+                break
+
+        ids.flush()
+        for table in facet_tables.values():
+            table.flush()
+        del ids, facet_tables
+        with open(os.path.join(directory, MANIFEST_FILE), "w") as manifest_file:
+            json.dump({
+                "format": TABLE_FORMAT,
+                "count": count,
+                "collection": searcher.payload_collection,
+                "neighbors_per_facet": neighbors_per_facet,
+                "facets": facets,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }, manifest_file)
+        logging.info(f"Wrote neighbor table for {count} properties to {directory} "
+                     f"in {time.monotonic() - started:.0f}s")
+        table = NeighborTable(directory)
+        if verify_sample:
+            table.verify(searcher, sample_size=verify_sample, top_k=min(10, neighbors_per_facet // 2))
+        return table
+
+    def verify(self, searcher, sample_size: int = 20, top_k: int = 10, seed: int = 42) -> int:
+        """
+        Compare table answers with live search for a sample of properties and every mode.
+
+        Args:
+            searcher (PropertySearcher): A searcher on the collections the table was built from.
+            sample_size (int): The number of properties checked.
+            top_k (int): The number of results compared per search.
+            seed (int): The random seed for drawing the sample.
+
+        Returns:
+            int: The number of (property, mode) searches whose results differ.
+        """
+        # Same client and collections, without the table and cache, so the second answer is a live search;
+        # the table reproduces the searches without server-side filters
+        live = copy.copy(searcher)
+        live.neighbor_table = None
+        live.result_cache = None
+        live.use_server_filters = False
+        served = copy.copy(live)
+        served.neighbor_table = self
+
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(self.ids), size=min(sample_size, len(self.ids)), replace=False)
+        mismatches = 0
+        for row in rows.tolist():
+            property_id = int(self.ids[row])
+            for mode in SearchMode:
+                expected = [prop.get('id') for prop in live.search_similar_properties(property_id, mode, top_k=top_k)]
+                actual = [prop.get('id') for prop in served.search_similar_properties(property_id, mode, top_k=top_k)]
+                if actual != expected:
+                    mismatches += 1
+                    logging.warning(f"Neighbor table answer for {property_id} in {mode} differs from live search: "
+                                    f"{actual} vs {expected}")
+        if mismatches:
+            logging.error(f"Neighbor table differs from live search for {mismatches} of "
+                          f"{len(rows) * len(SearchMode)} sampled searches")
+        else:
+            logging.info(f"Neighbor table matches live search on {len(rows) * len(SearchMode)} sampled searches")
+        return mismatches
+
+
+def _open_table(path: str, rows: int, width: int) -> np.ndarray:
+    table = np.lib.format.open_memmap(path, mode="w+", dtype=np.int64, shape=(rows, width))
+    table[:] = NO_NEIGHBOR
+    return table
+
+
+def _write_row(table: np.ndarray, row: int, neighbor_ids: List[int]):
+    neighbor_ids = neighbor_ids[:table.shape[1]]
+    table[row, :len(neighbor_ids)] = neighbor_ids
+
+
+def _batch_vectors(searcher, property_ids: List[int], facets: List[str]) -> Dict[int, Dict[str, List[float]]]:
+    """
+    Fetch the vectors of every facet for a batch of properties; properties missing a facet are left out.
+    """
+    if not property_ids:
+        return {}
+    client = searcher.client
+    if searcher.multi_vector:
+        points = client.retrieve(collection_name=MULTI_VECTOR_COLLECTION, ids=property_ids, with_vectors=facets,
+                                 with_payload=False)
+        vectors = {point.id: dict(point.vector or {}) for point in points}
+    else:
+        vectors = {}
+        for facet in facets:
+            points = client.retrieve(collection_name=FACET_COLLECTIONS[facet], ids=property_ids, with_vectors=True,
+                                     with_payload=False)
+            for point in points:
+                vectors.setdefault(point.id, {})[facet] = point.vector
+    return {point_id: point_vectors for point_id, point_vectors in vectors.items()
+            if all(facet in point_vectors for facet in facets)}
+
+
+def _batch_search(
+        searcher,
+        property_ids: List[int],
+        vectors: Dict[int, Dict[str, List[float]]],
+        facets: List[str],
+        limit: int
+) -> Dict[str, List[List[models.ScoredPoint]]]:
+    """
+    Search the neighbours of a batch of properties with one batched request per facet,
+    keeping each property in its own results as the live facet searches do.
+    """
+    results = {}
+    for facet in facets:
+        if searcher.multi_vector:
+            collection = MULTI_VECTOR_COLLECTION
+            query = lambda point_id: models.NamedVector(name=facet, vector=vectors[point_id][facet])
+        else:
+            collection = FACET_COLLECTIONS[facet]
+            query = lambda point_id: vectors[point_id][facet]
+        responses = searcher.client.search_batch(
+            collection_name=collection,
+            requests=[
+                models.SearchRequest(vector=query(point_id), limit=limit, with_payload=False)
+                for point_id in property_ids
+            ]
+        ) if property_ids else []
+        results[facet] = [list(response) for response in responses]
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from qdrant_client import QdrantClient
+
+    from property_searcher import PropertySearcher
+
+    parser = argparse.ArgumentParser(description="Precompute similar-property lists for every indexed property")
+    parser.add_argument("--url", default="http://localhost:6333", help="Qdrant URL")
+    parser.add_argument("--api-key", default=None, help="Qdrant API key")
+    parser.add_argument("--output", default="neighbor_table", help="Directory to write the table to")
+    parser.add_argument("--neighbors", type=int, default=50,
+                        help="Results kept per facet; searches with top_k * 2 up to this are served from the table")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--multi-vector", action="store_true", help="Read the multi-vector collection")
+    args = parser.parse_args()
+
+    qdrant_client = QdrantClient(url=args.url, api_key=args.api_key)
+    NeighborTable.build(PropertySearcher(qdrant_client, multi_vector=args.multi_vector), args.output,
+                        neighbors_per_facet=args.neighbors, batch_size=args.batch_size)
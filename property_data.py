@@ -1,26 +1,66 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
+import aiohttp
 import numpy as np
-import requests
 from io import BytesIO
 from PIL import Image
 from sentence_transformers import SentenceTransformer
 from sklearn.preprocessing import normalize
 
+from embedding_cache import EmbeddingCache
+
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
 
+# Text attributes embedded for every property
+TEXT_ATTRIBUTES = ("location", "features", "description")
+# Only the first few photos of a listing contribute to its visual embedding
+MAX_IMAGES_PER_PROPERTY = 5
+TEXT_MODEL_NAME = 'all-MiniLM-L6-v2'
+IMAGE_MODEL_NAME = 'clip-ViT-B-32'
+# Why a photo could not be used: the host failed to serve it (timeouts, connection and server
+# errors, throttling), so a later attempt may succeed, or the photo itself is unusable
+# (client errors such as 403/404, content that cannot be decoded)
+PHOTO_UNAVAILABLE = "unavailable"
+PHOTO_INVALID = "invalid"
+# Client error statuses that still mean the host may serve the photo later
+RETRYABLE_CLIENT_STATUSES = {408, 425, 429}
+
 
 class PropertyData:
     """
     Handles property data and embedding generation with proper normalization.
     """
 
-    def __init__(self):
+    def __init__(
+            self,
+            batch_size: int = 64,
+            max_concurrent_downloads: int = 64,
+            connections_per_host: int = 16,
+            download_timeout: float = 10,
+            cache: Optional[EmbeddingCache] = None
+    ):
+        """
+        Args:
+            batch_size (int): Number of inputs per forward pass in the batch APIs.
+            max_concurrent_downloads (int): Maximum number of photo downloads in flight.
+            connections_per_host (int): Maximum number of open connections to a single photo host.
+            download_timeout (float): Connect and read timeout in seconds of a single photo download. Time spent
+                waiting for a free connection is not counted, so queued downloads of a large batch do not expire.
+            cache (Optional[EmbeddingCache]): Persistent cache to reuse embeddings of unchanged inputs.
+        """
+        self.batch_size = batch_size
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.connections_per_host = connections_per_host
+        self.download_timeout = download_timeout
+        self.cache = cache
         # Initialize text and image embedding models
-        self.text_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.image_model = SentenceTransformer('clip-ViT-B-32')
+        self.text_model = SentenceTransformer(TEXT_MODEL_NAME)
+        self.image_model = SentenceTransformer(IMAGE_MODEL_NAME)
 
     def preprocess_text(self, text: str) -> str:
         """
@@ -34,15 +74,15 @@ class PropertyData:
         """
         return text.lower().strip()
 
-    def generate_text_embeddings(self, property_data: Dict) -> Dict[str, np.ndarray]:
+    def build_text_inputs(self, property_data: Dict) -> Dict[str, str]:
         """
-        Generate normalized text embeddings for different property attributes.
+        Build the preprocessed text for each embedded property attribute.
 
         Args:
             property_data (Dict): The property data.
 
         Returns:
-            Dict[str, np.ndarray]: A dictionary of normalized embeddings.
+            Dict[str, str]: The location, features and description texts.
         """
         for key, value in property_data.items():
             if isinstance(value, str) and value is None:
@@ -83,16 +123,95 @@ class PropertyData:
             property_data.get('lp_listing_description', ''),
         )
 
-        # Generate embeddings
-        embeddings = {
-            "location": self.text_model.encode(location_text),
-            "features": self.text_model.encode(property_features_text),
-            "description": self.text_model.encode(description_text)
+        return {
+            "location": location_text,
+            "features": property_features_text,
+            "description": description_text
         }
 
-        # Normalize embeddings
-        for key in embeddings:
-            embeddings[key] = normalize(embeddings[key].reshape(1, -1))[0]
+    def embedding_fingerprint(self, property_data: Dict) -> str:
+        """
+        Hash everything the embeddings of a property are computed from.
+
+        Two records with the same fingerprint produce the same vectors, so a listing whose
+        fingerprint is unchanged only needs its payload updated.
+
+        Args:
+            property_data (Dict): The property data.
+
+        Returns:
+            str: A hex digest of the model names, the text inputs and the embedded photo URLs.
+        """
+        inputs = {
+            "models": [TEXT_MODEL_NAME, IMAGE_MODEL_NAME],
+            "texts": self.build_text_inputs(property_data),
+            "photos": list(property_data.get("lp_photos") or [])[:MAX_IMAGES_PER_PROPERTY],
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def generate_text_embeddings(self, property_data: Dict) -> Dict[str, np.ndarray]:
+        """
+        Generate normalized text embeddings for different property attributes.
+
+        Args:
+            property_data (Dict): The property data.
+
+        Returns:
+            Dict[str, np.ndarray]: A dictionary of normalized embeddings.
+        """
+        embeddings = self.generate_text_embeddings_batch([property_data])
+        return {key: matrix[0] for key, matrix in embeddings.items()}
+
+    def generate_text_embeddings_batch(
+            self,
+            properties: List[Dict],
+            batch_size: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Generate normalized text embeddings for many properties at once.
+
+        Each attribute is encoded with a single batched call to the text model,
+        so row ``i`` of every returned matrix belongs to ``properties[i]``.
+
+        Args:
+            properties (List[Dict]): The property data records.
+            batch_size (Optional[int]): Sentences per forward pass. Defaults to the instance batch size.
+
+        Returns:
+            Dict[str, np.ndarray]: A (len(properties), dim) matrix of normalized embeddings per attribute.
+        """
+        inputs = [self.build_text_inputs(property_data) for property_data in properties]
+        unique_texts = list(dict.fromkeys(text_inputs[key] for text_inputs in inputs for key in TEXT_ATTRIBUTES))
+        text_embeddings = self._encode_texts(unique_texts, batch_size or self.batch_size)
+
+        embeddings = {}
+        for key in TEXT_ATTRIBUTES:
+            if not inputs:
+                embeddings[key] = np.empty((0, self.text_model.get_sentence_embedding_dimension()), dtype=np.float32)
+                continue
+            embeddings[key] = np.stack([text_embeddings[text_inputs[key]] for text_inputs in inputs])
+
+        return embeddings
+
+    def _encode_texts(self, texts: List[str], batch_size: int) -> Dict[str, np.ndarray]:
+        """
+        Encode distinct texts into normalized embeddings, serving what it can from the cache.
+        """
+        embeddings = {}
+        keys = {}
+        if self.cache is not None:
+            keys = {text: self.cache.text_key(TEXT_MODEL_NAME, text) for text in texts}
+            cached = self.cache.get_many(keys.values())
+            embeddings = {text: cached[key] for text, key in keys.items() if key in cached}
+
+        missing = [text for text in texts if text not in embeddings]
+        if missing:
+            matrix = self.text_model.encode(missing, batch_size=batch_size, show_progress_bar=False)
+            matrix = normalize(np.asarray(matrix).reshape(len(missing), -1))
+            encoded = dict(zip(missing, matrix))
+            embeddings.update(encoded)
+            if self.cache is not None:
+                self.cache.put_many({keys[text]: embedding for text, embedding in encoded.items()})
 
         return embeddings
 
@@ -106,29 +225,140 @@ class PropertyData:
         Returns:
             Optional[np.ndarray]: The aggregated image embedding, or None if failed.
         """
-        embeddings = []
-        for url in image_urls[:5]:  # Limit to first 5 images
-            try:
-                # Download image
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                img = Image.open(BytesIO(response.content)).convert('RGB')
-
-                # Generate embedding
-                embedding = self.image_model.encode(img)
-                embedding = normalize(embedding.reshape(1, -1))[0]
-                embeddings.append(embedding)
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Error fetching image {url}: {e}")
+        return self.generate_image_embeddings_batch([image_urls])[0]
+
+    def generate_image_embeddings_batch(
+            self,
+            image_url_lists: List[List[str]],
+            batch_size: Optional[int] = None,
+            failures: Optional[Dict[int, str]] = None
+    ) -> List[Optional[np.ndarray]]:
+        """
+        Generate normalized aggregated image embeddings for many properties at once.
+
+        The distinct photos of all properties are processed in chunks of batch_size: a chunk
+        is downloaded concurrently, encoded in one batched call to the image model, and its
+        decoded images are released before the next chunk. Each property's embedding is the
+        normalized mean of its normalized image embeddings.
+
+        Args:
+            image_url_lists (List[List[str]]): The photo URLs of each property.
+            batch_size (Optional[int]): Images per forward pass. Defaults to the instance batch size.
+            failures (Optional[Dict[int, str]]): Receives, for the position of every property without an
+                embedding, PHOTO_UNAVAILABLE if any of its photos failed to download for a reason that may
+                go away, PHOTO_INVALID otherwise.
+
+        Returns:
+            List[Optional[np.ndarray]]: The aggregated embedding per property, or None if no photo could be used.
+        """
+        url_lists = [list(image_urls[:MAX_IMAGES_PER_PROPERTY]) for image_urls in image_url_lists]
+        unique_urls = list(dict.fromkeys(url for urls in url_lists for url in urls))
+        url_errors = {}
+        url_embeddings = self._encode_images(unique_urls, batch_size or self.batch_size, url_errors)
+
+        aggregated = []
+        for position, urls in enumerate(url_lists):
+            embeddings = [url_embeddings[url] for url in urls if url in url_embeddings]
+            if not embeddings:
+                if failures is not None:
+                    unavailable = any(url_errors.get(url) == PHOTO_UNAVAILABLE for url in urls)
+                    failures[position] = PHOTO_UNAVAILABLE if unavailable else PHOTO_INVALID
+                aggregated.append(None)
                 continue
-            except Exception as e:
-                logging.warning(f"Error processing image {url}: {e}")
+            # Aggregate embeddings by computing the mean
+            mean_embedding = np.mean(embeddings, axis=0)
+            aggregated.append(normalize(mean_embedding.reshape(1, -1))[0])
+
+        return aggregated
+
+    def _encode_images(self, urls: List[str], batch_size: int,
+                       errors: Optional[Dict[str, str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Encode distinct photo URLs into normalized embeddings, downloading only cache misses.
+        Photos that cannot be fetched or decoded are left out of the result, and their reason is
+        added to ``errors``.
+        """
+        embeddings = {}
+        keys = {}
+        if self.cache is not None:
+            keys = {url: self.cache.image_key(IMAGE_MODEL_NAME, url) for url in urls}
+            cached = self.cache.get_many(keys.values())
+            embeddings = {url: cached[key] for url, key in keys.items() if key in cached}
+
+        missing = [url for url in urls if url not in embeddings]
+        # Download, encode and drop one chunk of photos at a time, so peak memory is bounded by the
+        # model batch rather than by the number of photos in the indexer batch
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            downloaded = [(url, img) for url, img in zip(chunk, self.download_images(chunk, errors))
+                          if img is not None]
+            if not downloaded:
                 continue
+            matrix = self.image_model.encode([img for _, img in downloaded], batch_size=batch_size,
+                                             show_progress_bar=False)
+            matrix = normalize(np.asarray(matrix).reshape(len(downloaded), -1))
+            encoded = {url: embedding for (url, _), embedding in zip(downloaded, matrix)}
+            embeddings.update(encoded)
+            if self.cache is not None:
+                self.cache.put_many({keys[url]: embedding for url, embedding in encoded.items()})
+
+        return embeddings
+
+    def download_images(self, urls: List[str],
+                        errors: Optional[Dict[str, str]] = None) -> List[Optional[Image.Image]]:
+        """
+        Download and decode photos concurrently.
+
+        Must be called outside of a running event loop.
+
+        Args:
+            urls (List[str]): The photo URLs.
+            errors (Optional[Dict[str, str]]): Receives PHOTO_UNAVAILABLE or PHOTO_INVALID for every URL that failed.
+
+        Returns:
+            List[Optional[Image.Image]]: The decoded RGB image per URL, or None if it failed.
+        """
+        if not urls:
+            return []
+        results = asyncio.run(self._download_images(urls))
+        if errors is not None:
+            errors.update({url: error for url, (_, error) in zip(urls, results) if error is not None})
+        return [image for image, _ in results]
+
+    async def _download_images(self, urls: List[str]) -> List[Tuple[Optional[Image.Image], Optional[str]]]:
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrent_downloads,
+            limit_per_host=self.connections_per_host
+        )
+        # A total timeout would include the wait for a pooled connection, so only connecting and reading are timed
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.download_timeout,
+                                        sock_read=self.download_timeout)
+        slots = asyncio.Semaphore(self.max_concurrent_downloads)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            return await asyncio.gather(*[self._fetch_image(session, url, slots) for url in urls])
+
+    async def _fetch_image(self, session: aiohttp.ClientSession, url: str,
+                           slots: asyncio.Semaphore) -> Tuple[Optional[Image.Image], Optional[str]]:
+        try:
+            async with slots, session.get(url) as response:
+                response.raise_for_status()
+                content = await response.read()
+        except aiohttp.ClientResponseError as e:
+            logging.warning(f"Error fetching image {url}: {e}")
+            if 400 <= e.status < 500 and e.status not in RETRYABLE_CLIENT_STATUSES:
+                return None, PHOTO_INVALID
+            return None, PHOTO_UNAVAILABLE
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Error fetching image {url}: {e}")
+            return None, PHOTO_UNAVAILABLE
+
+        try:
+            # Decode off the event loop so downloads keep flowing
+            return await asyncio.get_running_loop().run_in_executor(None, _decode_image, content), None
+        except Exception as e:
+            logging.warning(f"Error processing image {url}: {e}")
+            return None, PHOTO_INVALID
 
-        if not embeddings:
-            return None
 
-        # Aggregate embeddings by computing the mean
-        mean_embedding = np.mean(embeddings, axis=0)
-        mean_embedding = normalize(mean_embedding.reshape(1, -1))[0]
-        return mean_embedding
+def _decode_image(content: bytes) -> Image.Image:
+    return Image.open(BytesIO(content)).convert('RGB')
@@ -1,23 +1,62 @@
 import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
 from time import sleep
-from typing import Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from qdrant_client import QdrantClient, models
 
-from property_data import PropertyData
+from common_class import FACET_COLLECTIONS, FACET_DIMENSIONS, MULTI_VECTOR_COLLECTION, IndexingReport, SyncReport
+from neighbor_table import NeighborTable
+from property_data import PHOTO_UNAVAILABLE, PropertyData
+from search_cache import SearchResultCache
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
 
+# Payload fields filtered on inside vector searches
+FILTER_PAYLOAD_INDEXES = {
+    "price_min": models.PayloadSchemaType.FLOAT,
+    "price_max": models.PayloadSchemaType.FLOAT,
+    "bedrooms_total": models.PayloadSchemaType.FLOAT,
+    "lp_calculated_bath": models.PayloadSchemaType.FLOAT,
+    "lp_property_type": models.PayloadSchemaType.KEYWORD,
+    "lp_sale_lease": models.PayloadSchemaType.KEYWORD,
+}
+# Payload field holding the hash of the inputs a point's vectors were computed from
+FINGERPRINT_FIELD = "embedding_fingerprint"
+
 
 class PropertyIndexer:
     """
     Handles indexing of property data into Qdrant collections.
     """
 
-    def __init__(self, client: QdrantClient):
+    def __init__(
+            self,
+            client: QdrantClient,
+            property_data: Optional[PropertyData] = None,
+            multi_vector: bool = False,
+            result_cache: Optional[SearchResultCache] = None,
+            neighbor_table: Optional[NeighborTable] = None
+    ):
+        """
+        Args:
+            client (QdrantClient): The Qdrant client instance.
+            property_data (Optional[PropertyData]): Embedding generator. A default one is created if omitted.
+            multi_vector (bool): Store all vectors as named vectors of one point in a single collection
+                instead of one collection per attribute.
+            result_cache (Optional[SearchResultCache]): The searcher's result cache, invalidated
+                for every upserted or deleted property.
+            neighbor_table (Optional[NeighborTable]): The searcher's neighbor table, whose rows of
+                upserted or deleted properties stop being served.
+        """
         self.client = client
-        self.property_data = PropertyData()
+        self.property_data = property_data or PropertyData()
+        self.multi_vector = multi_vector
+        self.result_cache = result_cache
+        self.neighbor_table = neighbor_table
 
     def validate_property_data(self, property_data: Dict) -> bool:
         """
@@ -29,7 +68,7 @@ class PropertyIndexer:
         Returns:
             bool: True if validation passes, False otherwise.
         """
-        required_fields = ["listing_id", "lp_full_address", "association_amenities", "lp_photos"]
+        required_fields = ["id", "listing_id", "lp_full_address", "association_amenities", "lp_photos"]
         for field in required_fields:
             if field not in property_data:
                 logging.error(f"Missing required field: {field}")
@@ -47,47 +86,376 @@ class PropertyIndexer:
             bool: True if indexing is successful, False otherwise.
         """
         try:
-            if not self.validate_property_data(property_data):
-                raise ValueError("Property data validation failed")
+            report = self.index_properties([property_data], batch_size=1)
+        except Exception as e:
+            logging.error(f"Error indexing property {_failure_key(property_data)}: {e}")
+            return False
+        return bool(report.succeeded)
+
+    def index_properties(
+            self,
+            properties: Iterable[Dict],
+            batch_size: int = 256,
+            wait: bool = True,
+            parallelism: int = 1
+    ) -> IndexingReport:
+        """
+        Index many properties, upserting their vectors into each collection in batches.
+
+        Embeddings for a batch are generated with the batched PropertyData APIs and each
+        collection receives one upsert per batch; in multi-vector mode that is a single
+        upsert carrying all vectors and one payload per point. Upserts run on a thread pool so the next
+        batch is embedded while the previous one is being written. When the upsert to one collection
+        fails, its points are retried one by one; properties that still fail are removed again if they
+        are new, and otherwise keep their stored points until the next sync re-indexes them.
+
+        Args:
+            properties (Iterable[Dict]): The property data to index.
+            batch_size (int): The number of properties per upsert request.
+            wait (bool): Whether each upsert waits for the changes to be applied.
+            parallelism (int): The maximum number of upsert requests in flight.
 
-            # Generate embeddings
-            text_embeddings = self.property_data.generate_text_embeddings(property_data)
-            image_embedding = self.property_data.generate_image_embedding(property_data["lp_photos"])
+        Returns:
+            IndexingReport: The ids of indexed properties and the failure reason of the others.
+        """
+        report = IndexingReport()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            for batch in _batched(properties, batch_size):
+                points, ids = self._prepare_points(batch, report)
+                if ids:
+                    futures = {
+                        collection: executor.submit(self.client.upsert, collection_name=collection,
+                                                    points=collection_points, wait=wait)
+                        for collection, collection_points in points.items()
+                    }
+                    pending.append((futures, points, ids))
+                # Bound the number of prepared batches held in memory
+                while len(pending) > parallelism:
+                    self._collect_upserts(*pending.popleft(), report, wait)
+            while pending:
+                self._collect_upserts(*pending.popleft(), report, wait)
 
+        logging.info(f"Indexed {len(report.succeeded)} properties, {len(report.failed)} failed")
+        return report
+
+    def _prepare_points(self, batch: List[Dict], report: IndexingReport) -> Tuple[Dict[str, List], List]:
+        """
+        Validate a batch of properties and build the points to upsert, grouped by collection.
+        Properties that cannot be indexed are recorded as failed in the report.
+        """
+        collections = [MULTI_VECTOR_COLLECTION] if self.multi_vector else list(FACET_COLLECTIONS.values())
+        valid = []
+        for property_data in batch:
+            if self.validate_property_data(property_data):
+                valid.append(property_data)
+            else:
+                report.failed[_failure_key(property_data)] = "Property data validation failed"
+                report.permanent_failures.append(_failure_key(property_data))
+
+        points = {collection: [] for collection in collections}
+        ids = []
+        if not valid:
+            return points, ids
+
+        try:
+            text_embeddings = self.property_data.generate_text_embeddings_batch(valid)
+            photo_failures = {}
+            image_embeddings = self.property_data.generate_image_embeddings_batch(
+                [property_data["lp_photos"] for property_data in valid], failures=photo_failures
+            )
+        except Exception as e:
+            logging.error(f"Error generating embeddings for batch: {e}")
+            for property_data in valid:
+                report.failed[_failure_key(property_data)] = f"Failed to generate embeddings: {e}"
+            return points, ids
+
+        for row, (property_data, image_embedding) in enumerate(zip(valid, image_embeddings)):
             if image_embedding is None:
-                raise ValueError("Failed to generate image embeddings")
-
-            # Store normalized vectors in their respective collections
-            vectors = [
-                text_embeddings["location"],
-                text_embeddings["features"],
-                text_embeddings["description"],
-                image_embedding
-            ]
-            collections = [
-                "location_vectors",
-                "features_vectors",
-                "description_vectors",
-                "visual_vectors",
-            ]
-
-            for collection, vector in zip(collections, vectors):
-                response = self.client.upsert(
+                if photo_failures.get(row) == PHOTO_UNAVAILABLE:
+                    # Timeouts and server errors may clear up, so the next sync retries the listing
+                    report.failed[_failure_key(property_data)] = "Failed to download photos"
+                    continue
+                # None of the photos exists or could be decoded
+                report.failed[_failure_key(property_data)] = "Failed to generate image embeddings"
+                report.permanent_failures.append(_failure_key(property_data))
+                continue
+            try:
+                payload = self._payload(property_data)
+                vectors = {
+                    "location": text_embeddings["location"][row],
+                    "features": text_embeddings["features"][row],
+                    "description": text_embeddings["description"][row],
+                    "visual": image_embedding
+                }
+                if self.multi_vector:
+                    property_points = {MULTI_VECTOR_COLLECTION: models.PointStruct(
+                        id=property_data["id"],
+                        vector={key: vector.tolist() for key, vector in vectors.items()},
+                        payload=payload
+                    )}
+                else:
+                    property_points = {
+                        FACET_COLLECTIONS[key]: models.PointStruct(
+                            id=property_data["id"],
+                            vector=vector.tolist(),
+                            payload=payload
+                        )
+                        for key, vector in vectors.items()
+                    }
+            except Exception as e:
+                # A record that cannot be turned into points fails alone instead of aborting the run
+                logging.error(f"Error building points for property {_failure_key(property_data)}: {e}")
+                report.failed[_failure_key(property_data)] = f"Failed to build points: {e}"
+                report.permanent_failures.append(_failure_key(property_data))
+                continue
+            for collection, point in property_points.items():
+                points[collection].append(point)
+            ids.append(property_data["id"])
+
+        return points, ids
+
+    def _payload(self, property_data: Dict) -> Dict:
+        """
+        Build the stored payload of a property, with its search fields and embedding fingerprint.
+        """
+        return {**with_search_fields(property_data),
+                FINGERPRINT_FIELD: self.property_data.embedding_fingerprint(property_data)}
+
+    def _collect_upserts(
+            self,
+            futures: Dict[str, Future],
+            points: Dict[str, List],
+            ids: List,
+            report: IndexingReport,
+            wait: bool = True
+    ):
+        """
+        Wait for the upserts of one batch and record its outcome in the report.
+
+        The points of a collection whose upsert failed are retried one by one. Properties that
+        still cannot be written are recorded as failed: new ones are rolled back from every
+        collection, while existing ones keep their stored points and are left for the next sync to
+        repair.
+        """
+        failed_collections = {}
+        for collection, future in futures.items():
+            try:
+                response = future.result()
+                logging.debug(f"Upsert response: {response}")
+            except Exception as e:
+                failed_collections[collection] = str(e)
+        # Even a failed batch may have been written to some collections
+        self._invalidate(ids)
+        if not failed_collections:
+            report.succeeded.extend(ids)
+            return
+
+        logging.warning(f"Error upserting batch of {len(ids)} properties into {list(failed_collections)}: "
+                        f"{list(failed_collections.values())}, retrying them one by one")
+        errors = {}
+        unwritten = {}
+        for collection in failed_collections:
+            for point in points[collection]:
+                try:
+                    self.client.upsert(collection_name=collection, points=[point], wait=wait)
+                except Exception as e:
+                    errors.setdefault(point.id, []).append(f"{collection}: {e}")
+                    unwritten.setdefault(collection, []).append(point.id)
+        if errors:
+            self._resolve_partial_upserts(errors, unwritten, report)
+        report.succeeded.extend(property_id for property_id in ids if property_id not in errors)
+
+    def _resolve_partial_upserts(self, errors: Dict, unwritten: Dict[str, List], report: IndexingReport):
+        """
+        Record properties whose upsert failed in some collections, without losing stored listings.
+
+        A failed upsert leaves the collection as it was, so a property missing there was new to
+        this run and is deleted from the collections it did reach. Properties that were stored
+        before keep their points; their fingerprint is cleared so the next sync re-indexes them.
+        """
+        existing = set()
+        for collection, property_ids in unwritten.items():
+            try:
+                existing.update(point.id for point in self.client.retrieve(
+                    collection_name=collection, ids=property_ids, with_payload=False, with_vectors=False))
+            except Exception as e:
+                # Deleting a stored listing loses data, keeping a new one only needs a repair
+                logging.warning(f"Could not check which properties exist in {collection}, keeping them: {e}")
+                existing.update(property_ids)
+        new = [property_id for property_id in errors if property_id not in existing]
+        kept = [property_id for property_id in errors if property_id in existing]
+        logging.error(f"Failed to upsert {len(errors)} properties: rolling back {len(new)} new ones, "
+                      f"keeping the stored points of {len(kept)}")
+
+        rolled_back = self.delete_properties(new) if new else True
+        fingerprints = MULTI_VECTOR_COLLECTION if self.multi_vector else FACET_COLLECTIONS["location"]
+        # Where the fingerprint collection itself was not written, the old fingerprint already differs
+        stale = [property_id for property_id in kept if property_id not in unwritten.get(fingerprints, [])]
+        repair_marked = True
+        if stale:
+            try:
+                self.client.set_payload(collection_name=fingerprints, payload={FINGERPRINT_FIELD: None},
+                                        points=stale)
+            except Exception as e:
+                logging.error(f"Could not mark {len(stale)} partially updated properties for repair: {e}")
+                repair_marked = False
+        for property_id, property_errors in errors.items():
+            if property_id in existing:
+                outcome = "stored version kept" if repair_marked else "stored version kept, not marked for repair"
+            else:
+                outcome = "rolled back" if rolled_back else "rollback failed"
+            report.failed[property_id] = f"Upsert failed ({outcome}): {'; '.join(property_errors)}"
+
+    def _invalidate(self, property_ids: List, vectors_changed: bool = True):
+        """
+        Drop cached search results of rewritten or deleted properties, and their neighbor table
+        rows when their vectors changed.
+        """
+        if self.result_cache is not None:
+            self.result_cache.invalidate_ids(property_ids)
+        if self.neighbor_table is not None and vectors_changed:
+            self.neighbor_table.invalidate_ids(property_ids)
+
+    def delete_properties(self, property_ids: List[int]) -> bool:
+        """
+        Delete properties (e.g. delisted listings) from every collection.
+
+        Args:
+            property_ids (List[int]): The IDs of the properties to delete.
+
+        Returns:
+            bool: True if the properties were deleted from every collection, False otherwise.
+        """
+        if not property_ids:
+            return True
+        collections = [MULTI_VECTOR_COLLECTION] if self.multi_vector else list(FACET_COLLECTIONS.values())
+        success = True
+        for collection in collections:
+            try:
+                self.client.delete(
                     collection_name=collection,
-                    points=[{
-                        "id": property_data["id"],
-                        "vector": vector.tolist(),
-                        "payload": property_data
-                    }]
+                    points_selector=models.PointIdsList(points=list(property_ids))
                 )
-                logging.info(f"Upsert response for collection {collection}: {response}")
+            except Exception as e:
+                logging.error(f"Error deleting {len(property_ids)} properties from {collection}: {e}")
+                success = False
+        self._invalidate(property_ids)
+        logging.info(f"Deleted {len(property_ids)} properties")
+        return success
 
-            logging.info(f"Successfully indexed property {property_data['id']}")
-            return True
+    def sync_properties(
+            self,
+            properties: Iterable[Dict],
+            batch_size: int = 256,
+            parallelism: int = 1,
+            status_field: str = "lp_listing_status"
+    ) -> SyncReport:
+        """
+        Apply a delta of changed listings to the collections.
+
+        Listings whose status is no longer active are deleted. For the others, the embedding
+        fingerprint is compared with the one stored on the existing point: new listings and
+        listings whose text or photos changed are re-embedded and upserted, while listings
+        where only other fields (price, status, timestamps) changed get a payload-only update.
+        Records without a status field are treated as active.
+
+        Args:
+            properties (Iterable[Dict]): The latest record of every changed listing.
+            batch_size (int): The number of properties per request.
+            parallelism (int): The maximum number of upsert requests in flight when re-indexing.
+            status_field (str): The payload field holding the listing status.
+
+        Returns:
+            SyncReport: The ids that were re-indexed, updated in place, deleted or failed.
+        """
+        report = SyncReport()
+        for batch in _batched(properties, batch_size):
+            for property_data in batch:
+                if property_data.get("id") is None:
+                    report.failed[_failure_key(property_data)] = "Property data validation failed"
+                    report.permanent_failures.append(_failure_key(property_data))
+            batch = [property_data for property_data in batch if property_data.get("id") is not None]
+            inactive = [property_data["id"] for property_data in batch
+                        if str(property_data.get(status_field) or "active").lower() != "active"]
+            if inactive:
+                if self.delete_properties(inactive):
+                    report.deleted.extend(inactive)
+                else:
+                    for property_id in inactive:
+                        report.failed[property_id] = "Delete failed"
+
+            active = [property_data for property_data in batch
+                      if str(property_data.get(status_field) or "active").lower() == "active"]
+            if not active:
+                continue
+            stored = self._stored_fingerprints([property_data["id"] for property_data in active])
+            changed = []
+            unchanged = []
+            for property_data in active:
+                try:
+                    payload = self._payload(property_data)
+                except Exception as e:
+                    logging.error(f"Error building the payload of property {property_data['id']}: {e}")
+                    report.failed[property_data["id"]] = f"Failed to build payload: {e}"
+                    report.permanent_failures.append(property_data["id"])
+                    continue
+                if stored.get(property_data["id"]) == payload[FINGERPRINT_FIELD]:
+                    unchanged.append((property_data["id"], payload))
+                else:
+                    changed.append(property_data)
 
+            if changed:
+                indexing_report = self.index_properties(changed, batch_size=batch_size, parallelism=parallelism)
+                report.reindexed.extend(indexing_report.succeeded)
+                report.failed.update(indexing_report.failed)
+                report.permanent_failures.extend(indexing_report.permanent_failures)
+            if unchanged:
+                self._overwrite_payloads(unchanged, report)
+
+        logging.info(f"Synced properties: {len(report.reindexed)} re-indexed, {len(report.payload_updated)} "
+                     f"payload-only updates, {len(report.deleted)} deleted, {len(report.failed)} failed")
+        return report
+
+    def _stored_fingerprints(self, property_ids: List) -> Dict:
+        """
+        Read the embedding fingerprints stored for the given properties; unknown ids are left out.
+        """
+        collection = MULTI_VECTOR_COLLECTION if self.multi_vector else FACET_COLLECTIONS["location"]
+        try:
+            points = self.client.retrieve(collection_name=collection, ids=property_ids,
+                                          with_payload=[FINGERPRINT_FIELD], with_vectors=False)
         except Exception as e:
-            logging.error(f"Error indexing property {property_data.get('id', 'unknown')}: {e}")
-            return False
+            # Re-indexing everything is always correct, only slower
+            logging.warning(f"Could not read stored fingerprints, re-indexing the batch: {e}")
+            return {}
+        return {point.id: (point.payload or {}).get(FINGERPRINT_FIELD) for point in points}
+
+    def _overwrite_payloads(self, payloads: List[Tuple], report: SyncReport):
+        """
+        Replace the payloads of points whose vectors are unchanged, in every collection.
+        """
+        collections = [MULTI_VECTOR_COLLECTION] if self.multi_vector else list(FACET_COLLECTIONS.values())
+        operations = [
+            models.OverwritePayloadOperation(overwrite_payload=models.SetPayload(payload=payload, points=[property_id]))
+            for property_id, payload in payloads
+        ]
+        ids = [property_id for property_id, _ in payloads]
+        errors = []
+        for collection in collections:
+            try:
+                self.client.batch_update_points(collection_name=collection, update_operations=operations)
+            except Exception as e:
+                errors.append(f"{collection}: {e}")
+        # Payload-only updates keep the vectors, and the table filters on current payloads
+        self._invalidate(ids, vectors_changed=False)
+
+        if errors:
+            logging.error(f"Error updating payloads of {len(ids)} properties: {errors}")
+            for property_id in ids:
+                report.failed[property_id] = f"Payload update failed: {'; '.join(errors)}"
+        else:
+            report.payload_updated.extend(ids)
 
     def initialize_collections(self, client: QdrantClient):
         """
@@ -96,28 +464,208 @@ class PropertyIndexer:
         Args:
             client (QdrantClient): The Qdrant client instance.
         """
-        collections = {
-            "description_vectors": 384,
-            "location_vectors": 384,
-            "features_vectors": 384,
-            "visual_vectors": 512
-        }
+        if self.multi_vector:
+            self._create_collection(client, MULTI_VECTOR_COLLECTION, _multi_vector_config())
+            self._create_payload_indexes(client, MULTI_VECTOR_COLLECTION)
+            return
+
+        for key, collection in FACET_COLLECTIONS.items():
+            self._create_collection(client, collection, models.VectorParams(
+                size=FACET_DIMENSIONS[key],  # Adjust based on your model's output dimension
+                distance=models.Distance.COSINE
+            ))
+            self._create_payload_indexes(client, collection)
 
-        for collection in collections.keys():
+    def _create_payload_indexes(self, client: QdrantClient, collection: str):
+        """
+        Index the payload fields used by the search filters.
+        """
+        for field_name, field_schema in FILTER_PAYLOAD_INDEXES.items():
             try:
-                # Check if the collection already exists
-                client.get_collection(collection_name=collection)
-                logging.info(f"Collection '{collection}' already exists.")
-            except Exception:
-                # Create the collection if it doesn't exist
-                client.create_collection(
+                client.create_payload_index(
                     collection_name=collection,
-                    vectors_config=models.VectorParams(
-                        size=collections[collection],  # Adjust based on your model's output dimension
-                        distance=models.Distance.COSINE
-                    )
+                    field_name=field_name,
+                    field_schema=field_schema
                 )
-                logging.info(f"Created collection '{collection}'.")
-                sleep(1)
-                collection_info = client.get_collection(collection)
-                logging.debug(f"Collection info: {collection_info}")
\ No newline at end of file
+            except Exception as e:
+                logging.warning(f"Could not create payload index '{field_name}' on '{collection}': {e}")
+
+    def _create_collection(self, client: QdrantClient, collection: str, vectors_config):
+        """
+        Create a collection unless it already exists.
+        """
+        try:
+            # Check if the collection already exists
+            client.get_collection(collection_name=collection)
+            logging.info(f"Collection '{collection}' already exists.")
+        except Exception:
+            # Create the collection if it doesn't exist
+            client.create_collection(
+                collection_name=collection,
+                vectors_config=vectors_config
+            )
+            logging.info(f"Created collection '{collection}'.")
+            sleep(1)
+            collection_info = client.get_collection(collection)
+            logging.debug(f"Collection info: {collection_info}")
+
+    def migrate_to_multi_vector(self, batch_size: int = 256) -> IndexingReport:
+        """
+        Copy the per-attribute collections into the single multi-vector collection.
+
+        Points are read from the location collection together with their payload, the
+        remaining vectors are fetched for the same ids in one retrieve per collection,
+        and the combined points are upserted in batches.
+
+        Args:
+            batch_size (int): The number of points copied per request.
+
+        Returns:
+            IndexingReport: The ids of migrated points and the reason the others were skipped.
+        """
+        self._create_collection(self.client, MULTI_VECTOR_COLLECTION, _multi_vector_config())
+        self._create_payload_indexes(self.client, MULTI_VECTOR_COLLECTION)
+
+        report = IndexingReport()
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=FACET_COLLECTIONS["location"],
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if records:
+                ids = [record.id for record in records]
+                vectors = {record.id: {"location": record.vector} for record in records}
+                for key, collection in FACET_COLLECTIONS.items():
+                    if key == "location":
+                        continue
+                    for point in self.client.retrieve(collection_name=collection, ids=ids, with_vectors=True,
+                                                      with_payload=False):
+                        vectors[point.id][key] = point.vector
+
+                points = []
+                for record in records:
+                    missing = [key for key in FACET_COLLECTIONS if key not in vectors[record.id]]
+                    if missing:
+                        report.failed[record.id] = f"Missing vectors: {missing}"
+                        continue
+                    points.append(models.PointStruct(id=record.id, vector=vectors[record.id],
+                                                     payload=with_search_fields(record.payload or {})))
+
+                try:
+                    if points:
+                        self.client.upsert(collection_name=MULTI_VECTOR_COLLECTION, points=points)
+                    report.succeeded.extend(point.id for point in points)
+                except Exception as e:
+                    logging.error(f"Error migrating batch of {len(points)} points: {e}")
+                    for point in points:
+                        report.failed[point.id] = f"Upsert failed: {e}"
+
+            if offset is None:
+                break
+
+        logging.info(f"Migrated {len(report.succeeded)} points to '{MULTI_VECTOR_COLLECTION}', "
+                     f"{len(report.failed)} skipped")
+        return report
+
+    def backfill_search_fields(self, batch_size: int = 256) -> int:
+        """
+        Add the price_min/price_max payload fields to points indexed before they existed.
+
+        Args:
+            batch_size (int): The number of points updated per request.
+
+        Returns:
+            int: The number of points updated.
+        """
+        collections = [MULTI_VECTOR_COLLECTION] if self.multi_vector else list(FACET_COLLECTIONS.values())
+        updated = 0
+        for collection in collections:
+            offset = None
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name=collection,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=["price_range", "list_price"],
+                    with_vectors=False
+                )
+                operations = []
+                for record in records:
+                    fields = price_bounds(record.payload or {})
+                    if fields:
+                        operations.append(models.SetPayloadOperation(
+                            set_payload=models.SetPayload(payload=fields, points=[record.id])
+                        ))
+                if operations:
+                    self.client.batch_update_points(collection_name=collection, update_operations=operations)
+                    updated += len(operations)
+                if offset is None:
+                    break
+            logging.info(f"Backfilled search fields in collection '{collection}'")
+        # Filtered results may change for any property
+        if self.result_cache is not None and updated:
+            self.result_cache.clear()
+        return updated
+
+
+def price_bounds(property_data: Dict) -> Dict[str, float]:
+    """
+    Derive the numeric price bounds used by the search filters.
+
+    Mirrors PropertySearcher.apply_filters: a "min-max" price_range wins over list_price,
+    and properties without usable price information get no bounds.
+
+    Args:
+        property_data (Dict): The property data.
+
+    Returns:
+        Dict[str, float]: price_min and price_max, or an empty dict.
+    """
+    try:
+        if property_data.get('price_range'):
+            price_min, price_max = map(float, property_data['price_range'].split('-'))
+            return {"price_min": price_min, "price_max": price_max}
+        if property_data.get('list_price'):
+            list_price = float(property_data['list_price'])
+            return {"price_min": list_price, "price_max": list_price}
+    except (TypeError, ValueError, AttributeError) as e:
+        logging.warning(f"Unusable price information for property {property_data.get('id')}: {e}")
+    return {}
+
+
+def with_search_fields(property_data: Dict) -> Dict:
+    """
+    Build the payload stored for a property, including the derived search fields.
+
+    Args:
+        property_data (Dict): The property data.
+
+    Returns:
+        Dict: A copy of the property data with price_min/price_max added when available.
+    """
+    return {**property_data, **price_bounds(property_data)}
+
+
+def _multi_vector_config() -> Dict[str, models.VectorParams]:
+    return {
+        key: models.VectorParams(size=size, distance=models.Distance.COSINE)
+        for key, size in FACET_DIMENSIONS.items()
+    }
+
+
+def _failure_key(property_data: Dict):
+    """
+    The key a property's failure is reported under: its id, or its listing id when it has none.
+    """
+    property_id = property_data.get("id")
+    return property_id if property_id is not None else property_data.get("lp_listing_id")
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
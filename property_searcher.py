@@ -1,10 +1,15 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from time import sleep
 from typing import List, Dict, Optional, Tuple
 
 from qdrant_client import QdrantClient, models
 
-from common_class import SearchMode, PropertyFilters
+from common_class import FACET_COLLECTIONS, MULTI_VECTOR_COLLECTION, SearchMode, PropertyFilters
+from filter_engine import CompiledPropertyFilter
+from neighbor_table import NeighborTable
+from search_cache import SearchResultCache
 
 # Set up logging configuration
 logging.basicConfig(
@@ -15,14 +20,56 @@ logging.basicConfig(
         logging.StreamHandler()  # Also log to console
     ]
 )
+# Payload fields needed by apply_filters and the usual result fields; pass as payload_fields to
+# return a reduced payload instead of the full one
+RESULT_PAYLOAD_FIELDS = (
+    "id", "lp_provider_id", "lp_listing_id", "listing_id", "lp_full_address", "lp_formatted_address",
+    "lp_property_type", "lp_sale_lease", "list_price", "price_range", "bedrooms_total", "lp_calculated_bath",
+    "lp_listing_description", "lp_photos", "city", "state_or_province",
+)
+
 
 class PropertySearcher:
     """
     Handles multi-collection search and result aggregation.
     """
 
-    def __init__(self, client: QdrantClient):
+    def __init__(
+            self,
+            client: QdrantClient,
+            multi_vector: bool = False,
+            payload_fields: Optional[Tuple[str, ...]] = None,
+            use_server_filters: bool = False,
+            result_cache: Optional[SearchResultCache] = None,
+            neighbor_table: Optional[NeighborTable] = None
+    ):
+        """
+        Args:
+            client (QdrantClient): The Qdrant client instance, or a LocalVectorStore for in-process
+                exact or HNSW search.
+            multi_vector (bool): Search the single multi-vector collection instead of one collection per attribute.
+            payload_fields (Optional[Tuple[str, ...]]): Payload fields returned for similar properties,
+                e.g. RESULT_PAYLOAD_FIELDS. Defaults to None, which returns the full payload.
+            use_server_filters (bool): Evaluate filters inside each vector search. Price filters need the
+                price_min/price_max payload fields written by PropertyIndexer; run
+                PropertyIndexer.backfill_search_fields on collections indexed before they existed.
+            result_cache (Optional[SearchResultCache]): Cache of search results. Pass the same
+                cache to PropertyIndexer so re-indexed properties are invalidated.
+            neighbor_table (Optional[NeighborTable]): Precomputed facet search results. Properties with
+                a current row deep enough for top_k are answered from the table with the same merge and
+                filters as live search; the others fall back to live search.
+        """
         self.client = client
+        self.multi_vector = multi_vector
+        self.payload_fields = payload_fields
+        self.use_server_filters = use_server_filters
+        self.result_cache = result_cache
+        self.neighbor_table = neighbor_table
+        # Attributes searched for similar properties; "visual" and "description" are not queried
+        self.facets = ["location", "features"]
+        self.payload_collection = MULTI_VECTOR_COLLECTION if multi_vector else FACET_COLLECTIONS["location"]
+        # Shared pool for querying the per-attribute collections in parallel
+        self._executor = ThreadPoolExecutor(max_workers=len(FACET_COLLECTIONS))
         # Define weights for each search mode
         self.search_modes = {
             SearchMode.BALANCED.value: {
@@ -77,79 +124,8 @@ class PropertySearcher:
         if not filters:
             return properties
 
-        filtered_results = []
-        for prop in properties:
-            try:
-                logging.info(f"Applying filters to property {prop['id']}")
-
-                # Price filtering
-                if 'price_range' in prop and prop.get('price_range'):
-                    price_min, price_max = map(float, prop['price_range'].split('-'))
-                    if filters.min_price is not None and price_max < filters.min_price:
-                        logging.info(f"Property {prop['id']} excluded due to min_price filter.")
-                        continue
-                    if filters.max_price is not None and price_min > filters.max_price:
-                        logging.info(f"Property {prop['id']} excluded due to max_price filter.")
-                        continue
-                elif 'list_price' in prop and prop.get('list_price'):
-                    if ((filters.min_price and filters.min_price > prop.get('list_price')) or
-                            (filters.max_price and filters.max_price < prop.get('list_price'))):
-                        continue
-                else:
-                    logging.info(f"Property {prop['id']} excluded due to missing price information.")
-                    continue
-
-                # Bedroom filtering
-                bedrooms = prop.get('bedrooms_total', None)
-                if bedrooms is not None:
-                    if filters.min_bedrooms is not None and bedrooms < filters.min_bedrooms:
-                        logging.info(f"Property {prop['id']} excluded due to min_bedrooms filter.")
-                        continue
-                    if filters.max_bedrooms is not None and bedrooms > filters.max_bedrooms:
-                        logging.info(f"Property {prop['id']} excluded due to max_bedrooms filter.")
-                        continue
-                else:
-                    logging.info(f"Property {prop['id']} excluded due to missing bedroom information.")
-                    continue
-
-                # Bathroom filtering
-                bathrooms = prop.get('lp_calculated_bath', None)
-                if bathrooms is not None:
-                    if filters.min_bathrooms is not None and bathrooms < filters.min_bathrooms:
-                        logging.info(f"Property {prop['id']} excluded due to min_bathrooms filter.")
-                        continue
-                    if filters.max_bathrooms is not None and bathrooms > filters.max_bathrooms:
-                        logging.info(f"Property {prop['id']} excluded due to max_bathrooms filter.")
-                        continue
-                else:
-                    logging.info(f"Property {prop['id']} excluded due to missing bathroom information.")
-                    continue
-
-                # Property type filtering
-                if filters.property_type is not None and prop.get('lp_property_type') != filters.property_type:
-                    continue
-
-                # Amenities filtering
-                if filters.must_have_amenities:
-                    missing_amenities = [
-                        amenity for amenity in filters.must_have_amenities
-                        if amenity not in prop.get('lp_listing_description', "")
-                    ]
-                    if missing_amenities:
-                        logging.info(f"Property {prop['id']} excluded due to missing amenities: {missing_amenities}")
-                        continue
-
-                # Sale or lease filtering
-                if filters.sale_lease and filters.sale_lease != prop.get('lp_sale_lease'):
-                    logging.info(f"Property {prop['id']} excluded due to sale_lease filter.")
-                    continue
-
-                logging.info(f"Property {prop['id']} passed all filters.")
-                filtered_results.append(prop)
-            except Exception as e:
-                logging.warning(f"Error applying filters to property {prop.get('id')}: {e}")
-                continue
-
+        filtered_results = CompiledPropertyFilter(filters).apply(properties)
+        logging.info(f"{len(filtered_results)} of {len(properties)} properties passed filters.")
         return filtered_results
 
     def search_similar_properties(
@@ -157,7 +133,8 @@ class PropertySearcher:
             property_id: int,
             mode: SearchMode = SearchMode.BALANCED,
             filters: Optional[PropertyFilters] = None,
-            top_k: int = 10
+            top_k: int = 10,
+            raise_errors: bool = False
     ) -> List[Dict]:
         """
         Search for properties similar to the given property ID.
@@ -167,73 +144,297 @@ class PropertySearcher:
             mode (SearchMode): The search mode determining attribute weights.
             filters (Optional[PropertyFilters]): Filters to apply to the results.
             top_k (int): The number of top results to return.
+            raise_errors (bool): Raise search errors instead of logging them and returning no results,
+                for callers that must tell a failed search from one without matches.
 
         Returns:
             List[Dict]: A list of similar property data.
         """
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = SearchResultCache.make_key(property_id, mode, filters, top_k)
+            cached_results = self.result_cache.get(cache_key)
+            if cached_results is not None:
+                logging.info(f"Serving similar properties of {property_id} from the result cache")
+                return cached_results
+
         try:
+            if self.neighbor_table is not None:
+                table_results = self._search_neighbor_table(property_id, mode, filters, top_k)
+                if table_results is not None:
+                    if cache_key is not None:
+                        self.result_cache.put(cache_key, table_results, depends_on=[property_id])
+                    return table_results
+
             # Fetch the weights for the chosen search mode
             weights = self.search_modes[mode.value]
 
-            # Initialize a dictionary to store search results
-            search_results = {}
-
-            # Iterate through each vector collection (e.g., location, features, visual)
-            for key in ["location", "features", ]: #"visual_1image" "visual". "location", "features",
-                collection = f"{key}_vectors"
+            seed_vectors, seed_payload = self._retrieve_seed(property_id, self.facets)
 
-                initial_vector_result = self.client.retrieve(
-                    collection_name=collection,
-                    ids=[property_id],
-                    with_vectors=True
+            # Similar properties must match the seed's sale/lease type
+            if not filters:
+                filters = PropertyFilters(
+                    sale_lease = ''
                 )
+            filters.sale_lease = seed_payload.get('lp_sale_lease')
 
-                if not initial_vector_result or not initial_vector_result[0].vector:
-                    raise ValueError(f"Property ID {property_id} not found in {collection}")
+            query_filter = None
+            candidate_limit = top_k * 5
+            if self.use_server_filters:
+                query_filter = self.build_search_filter(filters, exclude_ids=[property_id])
+                # When the server filter covers every client-side rule, every candidate is a hit
+                if self._server_filter_is_exact(filters):
+                    candidate_limit = top_k
 
-                vector = initial_vector_result[0].vector
-
-                results = self.client.search(
-                    collection_name=collection,
-                    query_vector=vector,
-                    limit=top_k * 2
-                )
-                search_results[key] = results
+            # Search each vector collection (e.g., location, features, visual) concurrently
+            search_results = self._search_facets(seed_vectors, limit=top_k * 2, query_filter=query_filter)
 
             merged_results = self._weighted_rrf_merge(search_results, weights)
 
-            properties = []
-            for prop_id, score in merged_results[:top_k * 5]:
+            candidate_ids = []
+            for prop_id, score in merged_results[:candidate_limit]:
                 logging.info(f"Property ID {prop_id} has merged score {score:.4f}")
-                point = self.client.retrieve(
-                    collection_name="location_vectors",
-                    ids=[prop_id]
-                )
-                if point and point[0].payload:
-                    if prop_id != property_id:
-                        properties.append(point[0].payload)
+                if prop_id != property_id:
+                    candidate_ids.append(prop_id)
+            properties = self._fetch_payloads(candidate_ids)
             # Apply filters to the properties
-            if not filters:
-                filters = PropertyFilters(
-                    sale_lease = ''
-                )
-            filters.sale_lease = initial_vector_result[0].payload.get('lp_sale_lease')
             filtered_results = self.apply_filters(properties, filters)
             logging.info("Top similar properties after filters:")
             for rank, prop in enumerate(filtered_results[:top_k], start=1):
                 logging.info(f"Rank {rank}: Property {prop['id']} passed filters and scored highly.")
 
+            if cache_key is not None:
+                self.result_cache.put(cache_key, filtered_results[:top_k], depends_on=[property_id])
             return filtered_results[:top_k]
 
         except Exception as e:
             logging.error(f"Error searching for similar properties: {e}")
+            if raise_errors:
+                raise
+            return []
+
+    def _search_neighbor_table(
+            self,
+            property_id: int,
+            mode: SearchMode,
+            filters: Optional[PropertyFilters],
+            top_k: int
+    ) -> Optional[List[Dict]]:
+        """
+        Answer a search from the precomputed neighbour table.
+
+        The stored facet results are cut to the live search depth of top_k * 2 and go through
+        the same weighted RRF merge, candidate window, seed exclusion and filters as live search
+        without server-side filters, so only the vector searches are skipped.
+
+        Args:
+            property_id (int): The ID of the seed property.
+            mode (SearchMode): The search mode.
+            filters (Optional[PropertyFilters]): Filters to apply to the results.
+            top_k (int): The number of top results to return.
+
+        Returns:
+            Optional[List[Dict]]: The similar properties, or None to fall back to live search.
+        """
+        facet_neighbors = self.neighbor_table.neighbors(property_id, top_k * 2)
+        if facet_neighbors is None or any(facet not in facet_neighbors for facet in self.facets):
+            return None
+        search_results = {
+            facet: [models.ScoredPoint(id=neighbor_id, version=0, score=0.0) for neighbor_id in facet_neighbors[facet]]
+            for facet in self.facets
+        }
+        merged_results = self._weighted_rrf_merge(search_results, self.search_modes[mode.value], log_details=False)
+        candidate_ids = [prop_id for prop_id, _ in merged_results[:top_k * 5] if prop_id != property_id]
+
+        # The seed is fetched along with the candidates for its sale/lease type
+        properties = self._fetch_payloads([property_id, *candidate_ids])
+        if not properties or properties[0].get('id') != property_id:
+            return None
+        table_filters = replace(filters) if filters else PropertyFilters()
+        table_filters.sale_lease = properties[0].get('lp_sale_lease')
+        filtered_results = self.apply_filters(properties[1:], table_filters)
+        logging.info(f"Serving similar properties of {property_id} from the neighbor table")
+        return filtered_results[:top_k]
+
+    def build_search_filter(
+            self,
+            filters: PropertyFilters,
+            exclude_ids: Optional[List[int]] = None
+    ) -> models.Filter:
+        """
+        Translate property filters into a Qdrant filter evaluated inside each vector search.
+
+        The conditions mirror apply_filters: price ranges overlap through the price_min/price_max
+        payload fields written at indexing time. Properties without price, bedroom or bathroom
+        information are only excluded here for the bounds that are set, so unset bounds never depend
+        on fields that older collections lack; apply_filters still drops them afterwards. Amenity
+        checks are substring matches on the description and stay client-side.
+
+        Args:
+            filters (PropertyFilters): The filters to translate.
+            exclude_ids (Optional[List[int]]): Property IDs that must not be returned (e.g. the seed).
+
+        Returns:
+            models.Filter: The equivalent Qdrant filter.
+        """
+        must = []
+        if filters.min_price is not None:
+            must.append(models.FieldCondition(key="price_max", range=models.Range(gte=filters.min_price)))
+        if filters.max_price is not None:
+            must.append(models.FieldCondition(key="price_min", range=models.Range(lte=filters.max_price)))
+        if filters.min_bedrooms is not None or filters.max_bedrooms is not None:
+            must.append(models.FieldCondition(
+                key="bedrooms_total",
+                range=models.Range(gte=filters.min_bedrooms, lte=filters.max_bedrooms)
+            ))
+        if filters.min_bathrooms is not None or filters.max_bathrooms is not None:
+            must.append(models.FieldCondition(
+                key="lp_calculated_bath",
+                range=models.Range(gte=filters.min_bathrooms, lte=filters.max_bathrooms)
+            ))
+        if filters.property_type is not None:
+            must.append(models.FieldCondition(key="lp_property_type",
+                                              match=models.MatchValue(value=filters.property_type)))
+        if filters.sale_lease:
+            must.append(models.FieldCondition(key="lp_sale_lease", match=models.MatchValue(value=filters.sale_lease)))
+
+        bounded_fields = []
+        if filters.min_price is not None or filters.max_price is not None:
+            bounded_fields.append("price_min")
+        if filters.min_bedrooms is not None or filters.max_bedrooms is not None:
+            bounded_fields.append("bedrooms_total")
+        if filters.min_bathrooms is not None or filters.max_bathrooms is not None:
+            bounded_fields.append("lp_calculated_bath")
+        must_not = [models.IsEmptyCondition(is_empty=models.PayloadField(key=key)) for key in bounded_fields]
+        if exclude_ids:
+            must_not.append(models.HasIdCondition(has_id=list(exclude_ids)))
+
+        return models.Filter(must=must or None, must_not=must_not or None)
+
+    @staticmethod
+    def _server_filter_is_exact(filters: PropertyFilters) -> bool:
+        """
+        Whether build_search_filter rejects everything apply_filters would, i.e. no amenities are
+        required and price, bedroom and bathroom bounds are all set.
+        """
+        return (not filters.must_have_amenities
+                and (filters.min_price is not None or filters.max_price is not None)
+                and (filters.min_bedrooms is not None or filters.max_bedrooms is not None)
+                and (filters.min_bathrooms is not None or filters.max_bathrooms is not None))
+
+    def _retrieve_seed(self, property_id: int, facets: List[str]) -> Tuple[Dict[str, List[float]], Dict]:
+        """
+        Fetch the query vector of each facet and the payload of the seed property.
+
+        In multi-vector mode all named vectors come from a single retrieve, otherwise
+        the facet collections are read in parallel.
+
+        Args:
+            property_id (int): The ID of the seed property.
+            facets (List[str]): The attributes whose vectors are needed.
+
+        Returns:
+            Tuple[Dict[str, List[float]], Dict]: The vector per facet and the seed payload.
+        """
+        if self.multi_vector:
+            seed = self.client.retrieve(
+                collection_name=MULTI_VECTOR_COLLECTION,
+                ids=[property_id],
+                with_vectors=facets
+            )
+            if not seed or not seed[0].vector:
+                raise ValueError(f"Property ID {property_id} not found in {MULTI_VECTOR_COLLECTION}")
+            missing = [key for key in facets if key not in seed[0].vector]
+            if missing:
+                raise ValueError(f"Property ID {property_id} has no {missing} vectors in {MULTI_VECTOR_COLLECTION}")
+            return {key: seed[0].vector[key] for key in facets}, seed[0].payload or {}
+
+        seeds = dict(zip(facets, self._executor.map(
+            lambda key: self.client.retrieve(collection_name=FACET_COLLECTIONS[key], ids=[property_id],
+                                             with_vectors=True),
+            facets
+        )))
+        for key, initial_vector_result in seeds.items():
+            if not initial_vector_result or not initial_vector_result[0].vector:
+                raise ValueError(f"Property ID {property_id} not found in {FACET_COLLECTIONS[key]}")
+        return {key: seed[0].vector for key, seed in seeds.items()}, seeds[facets[0]][0].payload or {}
+
+    def _search_facets(
+            self,
+            vectors: Dict[str, List[float]],
+            limit: int,
+            query_filter: Optional[models.Filter] = None
+    ) -> Dict[str, List[models.ScoredPoint]]:
+        """
+        Search the nearest neighbours of the seed vectors in every facet at once.
+
+        In multi-vector mode all facets are queried with one batched search request. Otherwise
+        each facet collection is queried on its own thread, so the latency is that of the
+        slowest facet rather than the sum.
+
+        Args:
+            vectors (Dict[str, List[float]]): The query vector per facet.
+            limit (int): The number of results per facet.
+            query_filter (Optional[models.Filter]): Conditions every result must satisfy.
+
+        Returns:
+            Dict[str, List[models.ScoredPoint]]: The scored nearest neighbours per facet.
+        """
+        if self.multi_vector:
+            responses = self.client.search_batch(
+                collection_name=MULTI_VECTOR_COLLECTION,
+                requests=[
+                    models.SearchRequest(
+                        vector=models.NamedVector(name=key, vector=vector),
+                        filter=query_filter,
+                        limit=limit,
+                        with_payload=False
+                    )
+                    for key, vector in vectors.items()
+                ]
+            )
+            return dict(zip(vectors, responses))
+
+        futures = {
+            key: self._executor.submit(
+                self.client.search,
+                collection_name=FACET_COLLECTIONS[key],
+                query_vector=vector,
+                query_filter=query_filter,
+                limit=limit,
+                with_payload=False
+            )
+            for key, vector in vectors.items()
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+    def _fetch_payloads(self, property_ids: List[int]) -> List[Dict]:
+        """
+        Fetch the payloads of many properties with a single retrieve, keeping the given order.
+
+        Args:
+            property_ids (List[int]): The IDs of the properties, in result order.
+
+        Returns:
+            List[Dict]: The payloads of the properties that were found, in the same order.
+        """
+        if not property_ids:
             return []
+        points = self.client.retrieve(
+            collection_name=self.payload_collection,
+            ids=property_ids,
+            with_payload=list(self.payload_fields) if self.payload_fields is not None else True,
+            with_vectors=False
+        )
+        payloads = {point.id: point.payload for point in points if point.payload}
+        return [payloads[prop_id] for prop_id in property_ids if prop_id in payloads]
 
     def _weighted_rrf_merge(
         self,
         search_results: Dict[str, List[models.ScoredPoint]],
         weights: Dict[str, float],
-        k: int = 60
+        k: int = 60,
+        log_details: bool = True
     ) -> List[Tuple[str, float]]:
         """
         Merge search results from different collections using Weighted Reciprocal Rank Fusion.
@@ -242,6 +443,7 @@ class PropertySearcher:
             search_results (Dict[str, List[models.ScoredPoint]]): Search results from each collection.
             weights (Dict[str, float]): Weights for each collection.
             k (int): The constant used in the RRF formula.
+            log_details (bool): Log every contribution and final score, as single searches do.
 
         Returns:
             List[Tuple[str, float]]: A list of property IDs and their aggregated scores.
@@ -249,19 +451,22 @@ class PropertySearcher:
         scores = {}
         for key, results in search_results.items():
             weight = weights.get(key, 0)
-            logging.info(f"Merging results for {key} collection with weight {weight}")
+            if log_details:
+                logging.info(f"Merging results for {key} collection with weight {weight}")
             for rank, result in enumerate(results):
                 property_id = result.id
                 weighted_score = weight * (1 / (k + rank + 1))
                 scores[property_id] = scores.get(property_id, 0) + weighted_score
-                logging.info(
-                    f"Property {property_id} in {key} ranked {rank} contributes {weighted_score:.4f} to the score."
-                )
+                if log_details:
+                    logging.info(
+                        f"Property {property_id} in {key} ranked {rank} contributes {weighted_score:.4f} to the score."
+                    )
 
         sorted_properties = sorted(scores.items(), key=lambda x: x[1], reverse=True)
 
-        for prop_id, score in sorted_properties:
-            logging.info(f"Final aggregated score for property {prop_id}: {score:.4f}")
+        if log_details:
+            for prop_id, score in sorted_properties:
+                logging.info(f"Final aggregated score for property {prop_id}: {score:.4f}")
 
         return sorted_properties
 
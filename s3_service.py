@@ -1,6 +1,12 @@
 import asyncio
+import functools
 import logging
+import queue
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 
 import aioboto3
 import aiohttp
@@ -8,27 +14,157 @@ import awswrangler as wr
 import boto3
 import botocore
 import sqlglot
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
 
+# Default number of S3 requests in flight for the async bulk operations
+DEFAULT_MAX_CONCURRENCY = 64
+# Log throughput of bulk copies every this many objects
+PROGRESS_INTERVAL = 10000
+# Streamed uploads are split into parts of this size; S3 requires at least 5 MiB for all but the last part
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+MIN_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+MAX_MULTIPART_PARTS = 10000
+# Parts of one streamed upload sent in parallel; memory per transfer stays below (this + 1) * part size
+MULTIPART_PARTS_IN_FLIGHT = 4
+
+# Marks the end of one sub-prefix listing in iter_objects_v2
+_SHARD_DONE = object()
+
+# Partition directories listed concurrently by get_table_partition_accumulated_size
+DEFAULT_SCAN_WORKERS = 32
+# Log scan progress every this many directories
+SCAN_PROGRESS_INTERVAL = 100
+
+# S3 error codes (or HTTP statuses) grouped by how a bulk copy reacts to them
+THROTTLING_ERRORS = {"SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded", "TooManyRequests",
+                     "503", "429"}
+TRANSIENT_ERRORS = {"InternalError", "ServiceUnavailable", "RequestTimeout", "RequestTimeoutException",
+                    "OperationAborted", "500", "502", "504"}
+FORBIDDEN_ERRORS = {"AccessDenied", "AllAccessDisabled", "403"}
+MISSING_ERRORS = {"NoSuchKey", "NoSuchBucket", "404"}
+# Exceptions raised for connection problems rather than S3 responses; always retried
+TRANSIENT_EXCEPTIONS = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                        botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError)
+
+
+def _uses_clients(method):
+    """Hold the pooled async clients of the S3Service for the duration of an async method call."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        await self._acquire_clients()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            await self._release_clients()
+    return wrapper
+
+
+@functools.lru_cache(maxsize=None)
+def _default_s3_client():
+    """Shared boto3 S3 client of the static helpers; boto3 clients are thread-safe."""
+    return boto3.client("s3")
+
+
+@dataclass
+class CopyResult:
+    """Outcome of copying one object.
+    status is one of: copied (server-side copy), pulled (downloaded and re-uploaded after a 403),
+    forbidden, missing or failed.
+    """
+    source_url: str
+    destination: str
+    status: str = "failed"
+    attempts: int = 0
+    error: str | None = None
+
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease limit on the S3 requests in flight.
+
+    Every successful request raises the limit by 1/limit, i.e. about one slot per round of requests,
+    up to the maximum. A throttling response halves it, at most once per cooldown so that one burst of
+    SlowDown replies to requests already in flight counts as a single signal.
+    """
+
+    def __init__(self, initial, maximum, minimum=1, cooldown_seconds=1.0):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.successes += 1
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        self.throttles += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown_seconds:
+            self._last_decrease = now
+            self.limit = max(self.minimum, self.limit / 2)
+            logging.warning(f"S3 is throttling, reducing concurrency to {int(self.limit)}")
+
 
 class S3Service:
     """A class for writing Pandas DataFrame to S3 and updating Glue Catalog using
     AWS Data Wrangler Refer: https://aws-sdk-pandas.readthedocs.io/en/stable/.
     """
 
-    def __init__(self, wr_client=wr, debug=False):
+    def __init__(self, wr_client=wr, debug=False, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_attempts=5,
+                 base_backoff=0.1, max_backoff=20.0):
         """Initializes a new instance of the S3Service class.
 
         Args:
             wr_client: (optional) The AWS Data Wrangler client to use.
                 Defaults to the `awswrangler` module.
+            max_concurrency: (int, optional) The maximum number of async S3 requests in flight, shared by
+                all bulk operations of this instance. Also sizes the connection pools.
+            max_attempts: (int, optional) Attempts per request of a bulk copy for throttling and transient errors.
+            base_backoff: (float, optional) The first retry waits up to this many seconds, doubling per attempt.
+            max_backoff: (float, optional) The cap of the retry wait in seconds.
         """
         self.wr_client = wr_client
         self.async_boto_session = aioboto3.Session()
+        self.max_concurrency = max_concurrency
+        # Pooled async clients, created on first use in the running event loop. They live for an async with block,
+        # or for a single call outside one, and are closed in that loop (see _acquire_clients)
+        self._s3_client = None
+        self._s3_client_context = None
+        # Client of the bulk copies, without botocore retries: _with_retries and the limiter handle them
+        self._copy_client = None
+        self._copy_client_context = None
+        self._http_session = None
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._limiter = None
+        self._clients_loop = None
+        self._clients_lock = None
+        # Calls and async with blocks using the clients; they are closed when the last one ends
+        self._client_users = 0
+        self._sync_s3_client = None
         if debug:
             logging.getLogger("awswrangler").setLevel(logging.DEBUG)
             # We are setting only 1 handler for general logger, reuse it here to avoid re-creation of its stuff like
@@ -36,6 +172,154 @@ class S3Service:
             logging.getLogger("awswrangler").addHandler(logging.handlers[0])
             logging.getLogger("botocore.credentials").setLevel(logging.CRITICAL)
 
+    async def __aenter__(self):
+        await self._acquire_clients()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._release_clients()
+
+    async def _acquire_clients(self):
+        """Register a user of the pooled clients, creating them if needed.
+        Inside async with S3Service() the clients live for the whole block and are shared by every call in it.
+        A call made outside such a block, e.g. through asyncio.run from synchronous code, holds them only for
+        its own duration, so no client outlives the event loop it was created in.
+        """
+        self._bind_loop()
+        # Counted before creating the clients, so a concurrent call finishing meanwhile does not close them
+        self._client_users += 1
+        try:
+            await self._ensure_clients()
+        except BaseException:
+            await self._release_clients()
+            raise
+
+    async def _release_clients(self):
+        """Unregister a user of the pooled clients and close them once nobody uses them.
+        """
+        self._client_users = max(0, self._client_users - 1)
+        if not self._client_users:
+            await self.close()
+
+    def _bind_loop(self):
+        """Forget the clients of another event loop; they are bound to the loop that created them, so clients from
+        a finished asyncio.run cannot be reused. Clients still open there cannot be closed from this loop and are
+        dropped with a warning.
+        """
+        loop = asyncio.get_running_loop()
+        if self._clients_loop is loop:
+            return
+        if self._s3_client is not None:
+            logging.warning("S3Service clients of a previous event loop were not closed; call close() or use "
+                            "async with S3Service() before the loop ends")
+        self._s3_client = self._s3_client_context = self._http_session = None
+        self._copy_client = self._copy_client_context = None
+        self._clients_lock = asyncio.Lock()
+        self._clients_loop = loop
+        self._client_users = 0
+
+    async def _ensure_clients(self):
+        """Create the pooled aioboto3 S3 clients, aiohttp session and concurrency limiter, once per event loop.
+        They are reused by every async call instead of opening a client (and its connection pool) per object.
+        The bulk copy client makes a single attempt per call, so throttling reaches the adaptive limiter at once
+        instead of after botocore's own retries.
+        Public async methods go through _acquire_clients/_release_clients (see _uses_clients), so clients are
+        closed in the loop that created them.
+        """
+        self._bind_loop()
+        if self._s3_client is not None:
+            return
+        async with self._clients_lock:
+            if self._s3_client is not None:
+                return
+            config = Config(max_pool_connections=self.max_concurrency)
+            self._s3_client_context = self.async_boto_session.client("s3", config=config)
+            self._s3_client = await self._s3_client_context.__aenter__()
+            copy_config = Config(max_pool_connections=self.max_concurrency,
+                                 retries={'mode': 'standard', 'total_max_attempts': 1})
+            self._copy_client_context = self.async_boto_session.client("s3", config=copy_config)
+            self._copy_client = await self._copy_client_context.__aenter__()
+            self._http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency))
+            # Start at half the maximum and let successes grow the limit
+            self._limiter = AdaptiveConcurrencyLimiter(max(1, self.max_concurrency // 2), self.max_concurrency)
+
+    async def close(self):
+        """Close the pooled async clients, in the event loop that created them. They are recreated on the next
+        async call.
+        """
+        self._client_users = 0
+        if self._s3_client_context is not None:
+            await self._s3_client_context.__aexit__(None, None, None)
+        if self._copy_client_context is not None:
+            await self._copy_client_context.__aexit__(None, None, None)
+        if self._http_session is not None:
+            await self._http_session.close()
+        self._s3_client = self._s3_client_context = self._http_session = None
+        self._copy_client = self._copy_client_context = None
+
+    def _get_sync_s3_client(self):
+        """Return the cached boto3 S3 client; boto3 clients are thread-safe and keep their connection pool.
+        """
+        if self._sync_s3_client is None:
+            self._sync_s3_client = boto3.client("s3", config=Config(max_pool_connections=self.max_concurrency))
+        return self._sync_s3_client
+
+    async def _run_bounded(self, worker, items, max_concurrency=None):
+        """Run worker(item) for every item with at most max_concurrency calls in flight.
+        A fixed set of tasks pulls from the items, so memory stays constant however many items there are.
+        The S3 requests of the workers are further limited by the adaptive limiter shared by the instance.
+        :param worker: coroutine function called with each item
+        :param items: iterable of items
+        :param max_concurrency: tasks pulling from the items, the instance max_concurrency by default
+        :return: results in item order
+        """
+        await self._ensure_clients()
+        items = list(items)
+        results = [None] * len(items)
+        next_index = 0
+        started = time.monotonic()
+
+        async def run():
+            nonlocal next_index
+            while next_index < len(items):
+                index = next_index
+                next_index += 1
+                results[index] = await worker(items[index])
+                if (index + 1) % PROGRESS_INTERVAL == 0:
+                    elapsed = time.monotonic() - started
+                    logging.info(f"Processed {index + 1} of {len(items)} objects ({(index + 1) / elapsed:.0f}/s, "
+                                 f"concurrency {int(self._limiter.limit)}, {self._limiter.throttles} throttled)")
+
+        workers = min(max_concurrency or self.max_concurrency, len(items))
+        await asyncio.gather(*(run() for _ in range(workers)))
+        return results
+
+    async def _with_retries(self, operation, result):
+        """Run an S3 operation under the adaptive limiter, retrying throttling and transient errors with
+        full-jitter exponential backoff. The slot is released while waiting to retry.
+        :param operation: coroutine function performing one attempt
+        :param result: CopyResult whose attempt count is updated
+        :return: the operation result; the last error is raised once the attempts are exhausted
+        """
+        for attempt in range(self.max_attempts):
+            result.attempts += 1
+            try:
+                async with self._limiter:
+                    response = await operation()
+                self._limiter.on_success()
+                return response
+            except Exception as ex:
+                code = s3_error_code(ex)
+                throttled = code in THROTTLING_ERRORS
+                if throttled:
+                    self._limiter.on_throttle()
+                retryable = throttled or code in TRANSIENT_ERRORS or isinstance(ex, TRANSIENT_EXCEPTIONS)
+                if not retryable or attempt == self.max_attempts - 1:
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                logging.debug(f"Retrying after {code or type(ex).__name__} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
     def write_dataframe_s3_glue(self,
                                 df,
                                 database,
@@ -102,12 +386,17 @@ class S3Service:
             logging.error(f"Failed to write DataFrame, error: {e}")
             raise e
 
-    def read_athena(self, sql, database, s3_output, ctas_approach=True):
+    def read_athena(self, sql, database, s3_output, ctas_approach=True, chunksize=None, dtype_backend=None):
         """Read athena DB by given SQL query
         :param sql: SQL query
         :param database: DB to read from
         :param s3_output: S3 athena output bucket and path
-        :return: df: DataFrame of data read
+        :param ctas_approach: Wrap the query in a CTAS and read the resulting Parquet files
+        :param chunksize: Number of rows per DataFrame; when set, an iterator of DataFrames is returned
+            and the results are read lazily, one chunk in memory at a time
+        :param dtype_backend: awswrangler dtype backend; "pyarrow" keeps list and struct columns as Arrow arrays
+            instead of converting every element to numpy objects
+        :return: df: DataFrame of data read, or an iterator of DataFrames when chunksize is set
         """
         logging.info(f"Validating sql with sqlglot")
         start_time = get_current_time_ms()
@@ -122,9 +411,15 @@ class S3Service:
         logging.info(f"Reading athena with query {sql} on db {database} to {s3_output}")
         start_time = get_current_time_ms()
         try:
-            df = self.wr_client.athena.read_sql_query(sql, database, s3_output=s3_output, ctas_approach=ctas_approach)
+            kwargs = {'dtype_backend': dtype_backend} if dtype_backend else {}
+            df = self.wr_client.athena.read_sql_query(sql, database, s3_output=s3_output, ctas_approach=ctas_approach,
+                                                      chunksize=chunksize, **kwargs)
             end_time = get_current_time_ms()
-            logging.info(f"Reading athena completed, took {(end_time - start_time) / 1000.0} seconds")
+            if chunksize:
+                logging.info(f"Athena query completed, took {(end_time - start_time) / 1000.0} seconds, "
+                             f"streaming results in chunks of {chunksize} rows")
+            else:
+                logging.info(f"Reading athena completed, took {(end_time - start_time) / 1000.0} seconds")
             return df
         except Exception as ex:
             logging.error(f"Failed to read Athena with query {sql} on db {database}")
@@ -166,37 +461,46 @@ class S3Service:
             logging.error(f"Failed to copy s3 data in copy_s3_objects, error {ex}")
             raise ex
 
-    async def copy_s3_objects_async(self, s3_target, paths=[], content_type=None):
-        """Asynchronously copy s3 objects from source to target provided a list of paths
+    @_uses_clients
+    async def copy_s3_objects_async(self, s3_target, paths=[], content_type=None, max_concurrency=None):
+        """Asynchronously copy s3 objects from source to target provided a list of paths.
+        Every object is attempted; failures are reported in the results instead of aborting the batch.
         :param s3_target: target path to copy to
         :param paths: the list of tuples containing (source s3 path, property id)
-        :return:
+        :param content_type: content type of objects that have to be re-uploaded
+        :param max_concurrency: copies in flight at most, the instance max_concurrency by default
+        :return: a CopyResult per path
         """
-        tasks = []
-        for path in paths:
-            s3_path = path[0]
-            property_id = path[1]
-            task = self.copy_object(s3_path, property_id, s3_target, content_type)
-            tasks.append(task)
-
-        if tasks:
-            logging.info(f"Executing {len(tasks)} asynchronous copy tasks...")
-            tasks_start_time = time.time()
-            results = await asyncio.gather(*tasks)
-            logging.info(f"Successfully copied {results.count(True)} objects and pulled and pushed {results.count(False)} objects.")
-            tasks_end_time = time.time()
-            processing_time = tasks_end_time - tasks_start_time
-            logging.info(f"All asynchronous copy tasks completed. Total processing time:"
-                        f" {processing_time} seconds.")
-
-
+        if not paths:
+            return []
+        logging.info(f"Executing {len(paths)} asynchronous copy tasks...")
+        tasks_start_time = time.time()
+        results = await self._run_bounded(
+            lambda path: self.copy_object(path[0], path[1], s3_target, content_type), paths, max_concurrency)
+        statuses = {}
+        for result in results:
+            statuses[result.status] = statuses.get(result.status, 0) + 1
+        logging.info(f"Copied {statuses.get('copied', 0)} objects and pulled and pushed {statuses.get('pulled', 0)} "
+                     f"objects; outcomes: {statuses}")
+        tasks_end_time = time.time()
+        processing_time = tasks_end_time - tasks_start_time
+        logging.info(f"All asynchronous copy tasks completed. Total processing time:"
+                     f" {processing_time} seconds ({len(paths) / processing_time if processing_time else 0:.1f} objects/s, "
+                     f"{self._limiter.throttles} throttled requests, final concurrency {int(self._limiter.limit)}).")
+        return results
+
+    @_uses_clients
     async def copy_object(self, source_url, property_id, s3_target, content_type=None):
         """Attempts to copy an object from source to target. If the copy fails due to 403 (Access Denied) error,
         it will attempt to read the data from source and upload it to target.
-        Returns True if the copy was successful, False if handling the 403 error was successful, and raises an exception otherwise.
+        Throttling and transient errors are retried with backoff. Errors are classified by their S3 error code
+        and returned in the result rather than raised.
+        :param source_url: s3 url of the source object
+        :param property_id: folder of the object under the target path
+        :param s3_target: target path to copy to
+        :param content_type: content type set when the object has to be re-uploaded
+        :return: CopyResult with status copied, pulled, forbidden, missing or failed
         """
-        #logging.info(f"Copying {source_url} to {s3_target}")
-        #logging.info(f"task {index}, started at {time.ctime(start_time)}")
         #example source url: s3://mlsgrid/images/img_1.jpg
         source_bucket = source_url.split('/', 3)[2]
         source_key = source_url.split('/', 3)[3]
@@ -205,54 +509,54 @@ class S3Service:
         destination_path = s3_target.split('/', 3)[3]
         source_file_name = source_key.split('/')[-1]
         destination_key = f"{destination_path}/{property_id}/{source_file_name}"
-        async with self.async_boto_session.client("s3") as s3_client:
-            try:
-                await s3_client.copy_object(
-                    Bucket=destination_bucket,
-                    Key=destination_key,
-                    CopySource={'Bucket': source_bucket, 'Key': source_key}
-                )
-                return True
-            except Exception as ex:
-                if '403' in str(ex) or 'Access Denied' in str(ex):
-                    logging.error(f"Failed to copy s3 data in copy_object (403 error): {ex}.")
-                    # Pull content for media and store to LP storage
-                    try:
-                        aws_source_url = f"https://{source_bucket}.s3.amazonaws.com/{source_key}"
-                        logging.info(f"Trying to read data from {aws_source_url}")
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(aws_source_url) as response:
-                                data = await response.read()
-                                try:
-                                    logging.info(f"Uploading data to {destination_bucket}/{destination_key}")
-                                    s3_params = {
-                                        'Body': data,
-                                        'Bucket': destination_bucket,
-                                        'Key': destination_key,
-                                    }
-                                    if content_type:
-                                        s3_params['ContentType'] = content_type
-
-                                    await s3_client.put_object(**s3_params)
-
-                                    logging.info(f"Successfully uploaded data to {destination_bucket}/{destination_key}")
-                                    return False
-                                except Exception as ex:
-                                    logging.error(
-                                        f"Copying object to LP bucket failed for {aws_source_url} due to {ex}")
-                                    raise ex
-                    except Exception as ex:
-                        # It's possible we still get 403, which means we can't even download it. Just skip it then.
-                        if '403' in str(ex) or 'Access Denied' in str(ex):
-                            logging.warning(f"Failed reading data for {source_url} due to 403 error: {ex}")
-                elif '404' in str(ex):
-                    logging.warning(f"Failed to copy {source_url} to {s3_target} due to 404 (file missing) error")
-                elif 'NoSuchBucket' in str(ex):
-                    logging.warning(f"Failed to copy {source_url} to {s3_target} due to NoSuchBucket error")
-
-                else:
-                    logging.error(f"Failed to copy s3 data in copy_object, error {ex}")
-                    raise ex
+        result = CopyResult(source_url, f"s3://{destination_bucket}/{destination_key}")
+        try:
+            await self._with_retries(lambda: self._copy_client.copy_object(
+                Bucket=destination_bucket,
+                Key=destination_key,
+                CopySource={'Bucket': source_bucket, 'Key': source_key}
+            ), result)
+            result.status = "copied"
+            return result
+        except Exception as ex:
+            code = s3_error_code(ex)
+            if code in MISSING_ERRORS:
+                logging.warning(f"Failed to copy {source_url} to {s3_target} due to {code} (file missing) error")
+                result.status, result.error = "missing", str(ex)
+                return result
+            if code not in FORBIDDEN_ERRORS:
+                logging.error(f"Failed to copy s3 data in copy_object, error {ex}")
+                result.status, result.error = "failed", str(ex)
+                return result
+            logging.info(f"Server-side copy of {source_url} was denied, pulling it over https")
+
+        # Pull content for media and store to LP storage
+        aws_source_url = f"https://{source_bucket}.s3.amazonaws.com/{source_key}"
+        try:
+            await self._with_retries(
+                lambda: self._pull_and_push(aws_source_url, destination_bucket, destination_key, content_type), result)
+            result.status, result.error = "pulled", None
+        except Exception as ex:
+            code = s3_error_code(ex)
+            # It's possible we still get 403, which means we can't even download it. Just skip it then.
+            if code in FORBIDDEN_ERRORS:
+                logging.warning(f"Failed reading data for {source_url} due to 403 error: {ex}")
+                result.status = "forbidden"
+            elif code in MISSING_ERRORS:
+                result.status = "missing"
+            else:
+                logging.error(f"Copying object to LP bucket failed for {aws_source_url} due to {ex}")
+                result.status = "failed"
+            result.error = str(ex)
+        return result
+
+    async def _pull_and_push(self, source_url, destination_bucket, destination_key, content_type=None):
+        """Download an object over https and upload it to the destination.
+        The body is streamed into the destination part by part instead of being read into memory whole.
+        """
+        async with self._http_session.get(source_url) as response:
+            response.raise_for_status()
+            await self.push_s3_stream_async(response.content, destination_bucket, destination_key, content_type)
 
     def push_s3_content(self, data, s3_bucket, s3_path, content_type=None):
         """Wrapper used to push content into s3 bucket
@@ -269,13 +573,14 @@ class S3Service:
         }
         if content_type:
             s3_params['ContentType'] = content_type
-        client = boto3.client("s3")
+        client = self._get_sync_s3_client()
         try:
             client.put_object(**s3_params)
         except Exception as ex:
             logging.error(f"Unable to push content to s3 bucket {s3_bucket} due to {ex}")
             raise ex
 
+    @_uses_clients
     async def push_s3_content_async(self, data, s3_bucket, s3_path, content_type=None):
         """Asynchronously push content into s3 bucket
         :param data: Byte data to push
@@ -291,36 +596,211 @@ class S3Service:
         }
         if content_type:
             s3_params['ContentType'] = content_type
-        async with self.async_boto_session.client("s3") as s3_client:
-            try:
-                await s3_client.put_object(**s3_params)
-            except Exception as ex:
-                logging.error(f"Unable to push content to s3 bucket {s3_bucket} due to {ex}")
-                raise ex
+        try:
+            await self._s3_client.put_object(**s3_params)
+        except Exception as ex:
+            logging.error(f"Unable to push content to s3 bucket {s3_bucket} due to {ex}")
+            raise ex
             
+    def push_s3_stream(self, fileobj, s3_bucket, s3_path, content_type=None, part_size=MULTIPART_PART_SIZE,
+                       max_parts_in_flight=MULTIPART_PARTS_IN_FLIGHT):
+        """Push a file-like object into s3 bucket without reading it into memory first.
+        boto3 switches to a multipart upload with parallel parts once the object is larger than one part.
+        :param fileobj: Readable binary file-like object
+        :param s3_bucket: Bucket to push to
+        :param s3_path: Path within the bucket where to store new data
+        :param content_type: Data content type
+        :param part_size: Size of the multipart upload parts in bytes
+        :param max_parts_in_flight: Parts uploaded in parallel
+        :return:
+        """
+        extra_args = {'ContentType': content_type} if content_type else None
+        config = TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                                max_concurrency=max_parts_in_flight)
+        client = self._get_sync_s3_client()
+        try:
+            client.upload_fileobj(fileobj, s3_bucket, s3_path, ExtraArgs=extra_args, Config=config)
+        except Exception as ex:
+            logging.error(f"Unable to push content to s3 bucket {s3_bucket} due to {ex}")
+            raise ex
+
+    @_uses_clients
+    async def push_s3_stream_async(self, stream, s3_bucket, s3_path, content_type=None, part_size=MULTIPART_PART_SIZE,
+                                   max_parts_in_flight=MULTIPART_PARTS_IN_FLIGHT):
+        """Asynchronously push a stream into s3 bucket, holding at most (max_parts_in_flight + 1) parts in memory.
+        A stream shorter than one part is sent with a single put_object. Longer streams go through a multipart
+        upload whose parts are uploaded in parallel while the next part is read; the upload is aborted on failure
+        so no orphaned parts are left behind.
+        :param stream: Object with an async read(n) method, e.g. the content of an aiohttp response
+        :param s3_bucket: Bucket to push to
+        :param s3_path: Path within the bucket where to store new data
+        :param content_type: Data content type
+        :param part_size: Size of the multipart upload parts in bytes, at least 5 MiB
+        :param max_parts_in_flight: Parts uploaded in parallel
+        :return: number of bytes pushed
+        """
+        if part_size < MIN_MULTIPART_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_MULTIPART_PART_SIZE} bytes, got {part_size}")
+        data = await _read_part(stream, part_size)
+        if len(data) < part_size:
+            await self.push_s3_content_async(data, s3_bucket, s3_path, content_type)
+            return len(data)
+
+        s3_params = {'Bucket': s3_bucket, 'Key': s3_path}
+        create_params = dict(s3_params, ContentType=content_type) if content_type else s3_params
+        upload_id = (await self._s3_client.create_multipart_upload(**create_params))['UploadId']
+        slots = asyncio.Semaphore(max_parts_in_flight)
+        tasks = set()
+        parts = []
+        total_size = 0
+
+        async def upload_part(part_number, body):
+            try:
+                response = await self._s3_client.upload_part(Body=body, PartNumber=part_number, UploadId=upload_id,
+                                                             **s3_params)
+                parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+            finally:
+                slots.release()
+
+        try:
+            part_number = 1
+            await slots.acquire()
+            while data:
+                if part_number > MAX_MULTIPART_PARTS:
+                    raise ValueError(f"{s3_path} needs more than {MAX_MULTIPART_PARTS} parts of {part_size} bytes")
+                tasks.add(asyncio.create_task(upload_part(part_number, data)))
+                total_size += len(data)
+                part_number += 1
+                # Wait for a free slot before reading the next part, which is what bounds the memory
+                await slots.acquire()
+                for task in [task for task in tasks if task.done()]:
+                    tasks.discard(task)
+                    # Re-raises the error of a failed part, so the transfer stops early
+                    task.result()
+                data = await _read_part(stream, part_size)
+            await asyncio.gather(*tasks)
+            await self._s3_client.complete_multipart_upload(
+                UploadId=upload_id, MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])},
+                **s3_params)
+            logging.debug(f"Streamed {total_size} bytes to s3://{s3_bucket}/{s3_path} in {part_number - 1} parts")
+            return total_size
+        except BaseException as ex:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._s3_client.abort_multipart_upload(UploadId=upload_id, **s3_params)
+            except Exception as abort_ex:
+                logging.error(f"Unable to abort multipart upload {upload_id} of {s3_path}: {abort_ex}")
+            logging.error(f"Unable to stream content to s3 bucket {s3_bucket} due to {ex}")
+            raise
+
     @staticmethod
     def list_objects_v2(s3_bucket, s3_prefix):
         """Wrapper used to list objects in s3 bucket
+        All pages are read, so prefixes with more than 1000 keys are listed completely; prefer iter_objects_v2
+        for large prefixes.
+        :param s3_bucket: Bucket to list from
+        :param s3_prefix: Prefix to filter objects
+        :return: list of objects, or None when nothing matches
+        """
+        paginator = _default_s3_client().get_paginator('list_objects_v2')
+        try:
+            contents = [obj for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix)
+                        for obj in page.get('Contents', [])]
+            return contents or None
+        except Exception as ex:
+            logging.error(f"Unable to list objects in s3 bucket {s3_bucket}/{s3_prefix} due to {ex}")
+            raise ex
+
+    def iter_objects_v2(self, s3_bucket, s3_prefix, max_workers=1, shard_delimiter='/', page_size=1000):
+        """Lazily list objects in s3 bucket, one page in memory at a time.
+        With max_workers > 1 the prefix is sharded into its sub-prefixes (the common prefixes up to
+        shard_delimiter), which are listed concurrently. Objects are then yielded in no particular order, and
+        at most a few pages per worker are buffered.
         :param s3_bucket: Bucket to list from
         :param s3_prefix: Prefix to filter objects
-        :return: list of objects
+        :param max_workers: sub-prefixes listed concurrently; 1 lists the prefix sequentially in key order
+        :param shard_delimiter: delimiter splitting the prefix into sub-prefixes
+        :param page_size: keys requested per list call, at most 1000
+        :return: iterator of object metadata dicts (Key, Size, LastModified, ETag, ...)
         """
-        client = boto3.client("s3")
+        paginator = self._get_sync_s3_client().get_paginator('list_objects_v2')
+        pagination_config = {'PageSize': page_size}
         try:
-            response = client.list_objects_v2(Bucket=s3_bucket, Prefix=s3_prefix)
-            return response.get('Contents')
+            if max_workers <= 1:
+                for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix,
+                                               PaginationConfig=pagination_config):
+                    yield from page.get('Contents', [])
+                return
+
+            shards = []
+            for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix, Delimiter=shard_delimiter,
+                                           PaginationConfig=pagination_config):
+                # Objects directly under the prefix are not in any shard
+                yield from page.get('Contents', [])
+                shards.extend(common_prefix['Prefix'] for common_prefix in page.get('CommonPrefixes', []))
+            logging.info(f"Listing {len(shards)} sub-prefixes of s3://{s3_bucket}/{s3_prefix} "
+                         f"with {max_workers} workers")
+            yield from self._iter_shards(paginator, s3_bucket, shards, max_workers, pagination_config)
         except Exception as ex:
             logging.error(f"Unable to list objects in s3 bucket {s3_bucket}/{s3_prefix} due to {ex}")
             raise ex
 
+    @staticmethod
+    def _iter_shards(paginator, s3_bucket, shards, max_workers, pagination_config):
+        """List sub-prefixes on a thread pool, passing pages to the consumer through a bounded queue.
+        Workers block while the queue is full, so a slow consumer does not make the listing buffer every key.
+        Closing the generator early stops the workers.
+        """
+        if not shards:
+            return
+        pages = queue.Queue(maxsize=2 * max_workers)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def list_shard(shard):
+            try:
+                for page in paginator.paginate(Bucket=s3_bucket, Prefix=shard, PaginationConfig=pagination_config):
+                    if not put(page.get('Contents', [])):
+                        return
+                put(_SHARD_DONE)
+            except Exception as ex:
+                put(ex)
+
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(shards)))
+        try:
+            for shard in shards:
+                executor.submit(list_shard, shard)
+            remaining = len(shards)
+            while remaining:
+                item = pages.get()
+                if item is _SHARD_DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @_uses_clients
     async def check_s3_file_exists(self, s3_bucket, s3_path):
             try:
-                async with self.async_boto_session.resource("s3") as S3:
-                    obj = await S3.Object(s3_bucket, s3_path)
-                    await obj.load()
-                    return True
+                # HEAD request, as Object.load() of the resource API does
+                await self._s3_client.head_object(Bucket=s3_bucket, Key=s3_path)
+                return True
             except botocore.exceptions.ClientError as e:
-                if e.response['Error']['Code'] == "404":
+                if e.response['Error']['Code'] in ("404", "NoSuchKey"):
                     return False
                 else:
                     logging.error(f"ClientError when checking if file {s3_path} exists in bucket {s3_bucket}: {e}")
@@ -335,11 +815,11 @@ class S3Service:
                 logging.error(f"Unexpected error when checking if file {s3_path} exists in bucket {s3_bucket}: {e}")
                 raise e
     
+    @_uses_clients
     async def upload_to_s3(self, bucket, data, path, content_type):
             try:
-                async with self.async_boto_session.client('s3') as s3:
-                    await s3.put_object(Bucket=bucket, Key=path,
-                                        Body=data, ContentType=content_type)
+                await self._s3_client.put_object(Bucket=bucket, Key=path,
+                                                 Body=data, ContentType=content_type)
             except ClientError as e:
                 # Handle client-side error (e.g., S3 bucket not found, access denied)
                 logging.error(f"Client error occurred during s3 upload to {bucket}/{path}: {e}")
@@ -386,8 +866,16 @@ class S3Service:
         table_type = table_metadata.get('table_type', None)
         return table_type and table_type.lower() == 'iceberg'
 
-    def get_table_partition_accumulated_size(self, database, table):
+    def get_table_partition_accumulated_size(self, database, table, max_workers=DEFAULT_SCAN_WORKERS,
+                                             sample_size=None, seed=None):
         """Get the size of the table partitions per partition, and total number of files, directory.
+        The partition directories are listed in parallel on a thread pool sharing one boto3 client.
+        :param database: DB name
+        :param table: Table name
+        :param max_workers: partition directories listed concurrently
+        :param sample_size: when set, list only this many randomly chosen directories and estimate the others
+            from their mean file count and size; estimated entries are flagged with 'estimated': True
+        :param seed: random seed of the sample
         :return: size of the table partitions
         """
         location = self.get_table_location(database, table)
@@ -397,48 +885,63 @@ class S3Service:
             prefix = f"{prefix.rstrip('/')}/data/" if not prefix.endswith('/data/') else prefix
             # prefix = f"{prefix.rstrip('/')}/metadata" if not prefix.endswith('/metadata/') else prefix
 
-        # Initialize a boto3 client
-        s3 = boto3.client('s3')
+        # boto3 clients are thread-safe, so all workers share the cached one and its connection pool
+        s3 = self._get_sync_s3_client()
 
         # Initialize the paginator for the list_objects_v2 method
         paginator = s3.get_paginator('list_objects_v2')
 
-        # Initialize a list to store directory info
-        directory_info = []
-
-        # Use the paginator to retrieve objects within the specified path
+        # Use the paginator to retrieve the directories within the specified path
         # Delimiter is used to treat '/' as a directory separator
         operation_parameters = {'Bucket': bucket_name, 'Prefix': prefix, 'Delimiter': '/'}
-        page_iterator = paginator.paginate(**operation_parameters)
-
-        num_directories = 0
-
-        for page in page_iterator:
-            # Handling directories
-            if 'CommonPrefixes' in page:
-                for directory in page['CommonPrefixes']:
-                    num_directories += 1
-                    directory_prefix = directory['Prefix']
-
-                    # Initialize counters for the directory
-                    file_count = 0
-                    total_size = 0
-
-                    # List all objects in the current directory
-                    for obj_page in paginator.paginate(Bucket=bucket_name, Prefix=directory_prefix):
-                        if 'Contents' in obj_page:
-                            for obj in obj_page['Contents']:
-                                file_count += 1
-                                total_size += obj['Size']
-
-                    # Append directory info to the list
-                    info = {
-                        'prefix': directory_prefix,
-                        'file_count': file_count,
-                        'total_size_bytes': total_size,
-                        'total_size_mb': total_size / (1024 * 1024)
-                    }
-                    directory_info.append(info)
+        directory_prefixes = [directory['Prefix']
+                              for page in paginator.paginate(**operation_parameters)
+                              for directory in page.get('CommonPrefixes', [])]
+        num_directories = len(directory_prefixes)
+
+        scanned_prefixes = directory_prefixes
+        if sample_size is not None and sample_size < num_directories:
+            scanned_prefixes = random.Random(seed).sample(directory_prefixes, sample_size)
+            logging.info(f"Sampling {sample_size} of {num_directories} directories under s3://{bucket_name}/{prefix}")
+
+        def scan_directory(directory_prefix):
+            # List all objects in the directory
+            file_count = 0
+            total_size = 0
+            for obj_page in paginator.paginate(Bucket=bucket_name, Prefix=directory_prefix):
+                for obj in obj_page.get('Contents', []):
+                    file_count += 1
+                    total_size += obj['Size']
+            return {
+                'prefix': directory_prefix,
+                'file_count': file_count,
+                'total_size_bytes': total_size,
+                'total_size_mb': total_size / (1024 * 1024)
+            }
+
+        directory_info = []
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(scanned_prefixes)))) as executor:
+            futures = [executor.submit(scan_directory, directory_prefix) for directory_prefix in scanned_prefixes]
+            for done, future in enumerate(as_completed(futures), start=1):
+                directory_info.append(future.result())
+                if done % SCAN_PROGRESS_INTERVAL == 0 or done == len(futures):
+                    logging.info(f"Scanned {done} of {len(futures)} directories under s3://{bucket_name}/{prefix} "
+                                 f"({time.monotonic() - started:.1f}s)")
+
+        if len(scanned_prefixes) < num_directories:
+            mean_files = sum(x['file_count'] for x in directory_info) / len(directory_info) if directory_info else 0
+            mean_size = sum(x['total_size_bytes'] for x in directory_info) / len(directory_info) if directory_info else 0
+            sampled = set(scanned_prefixes)
+            for info in directory_info:
+                info['estimated'] = False
+            directory_info.extend({
+                'prefix': directory_prefix,
+                'file_count': round(mean_files),
+                'total_size_bytes': round(mean_size),
+                'total_size_mb': mean_size / (1024 * 1024),
+                'estimated': True
+            } for directory_prefix in directory_prefixes if directory_prefix not in sampled)
 
         # Sort the list by total size in descending order
         sorted_directory_info = sorted(directory_info, key=lambda x: x['total_size_bytes'], reverse=True)
@@ -452,5 +955,33 @@ class S3Service:
         }
 
 
+def s3_error_code(ex):
+    """Extract the S3 error code (or HTTP status) of an exception from botocore or aiohttp.
+    :param ex: the exception
+    :return: the error code as a string, or None
+    """
+    if isinstance(ex, ClientError):
+        error = ex.response.get('Error', {})
+        status = ex.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        return error.get('Code') or (str(status) if status else None)
+    if isinstance(ex, aiohttp.ClientResponseError):
+        return str(ex.status)
+    return None
+
+
+async def _read_part(stream, part_size):
+    """Read up to part_size bytes from an async stream; shorter only at the end of the stream.
+    """
+    chunks = []
+    size = 0
+    while size < part_size:
+        chunk = await stream.read(part_size - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+
 def get_current_time_ms():
     return round(time.time() * 1000)
\ No newline at end of file
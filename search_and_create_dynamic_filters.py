@@ -1,7 +1,9 @@
 import csv
 import logging
 from qdrant_client import QdrantClient
+from batch_similarity import batch_similar_properties, write_similar_properties_csv
 from common_class import PropertyFilters, SearchMode
+from local_vector_store import LocalVectorStore
 from property_indexer import PropertyIndexer
 from property_searcher import PropertySearcher
 
@@ -54,6 +56,18 @@ def get_all_property_data_from_collection(client, collection_name):
     return property_data
 
 
+# Function to build the dynamic search filters of a property from its calculated filter bounds
+def build_dynamic_filters(data):
+    return PropertyFilters(
+        min_price=data["min_price"],
+        max_price=data["max_price"],
+        min_bedrooms=data["min_bedrooms"],
+        max_bedrooms=data["max_bedrooms"],
+        property_type=data['property_type'],
+        sale_lease=data["lp_sale_lease"]
+    )
+
+
 # Function to search similar properties for all properties in Qdrant or from provided property ID list, and save to CSV
 def search_and_save_similar_properties(client, searcher, property_data, mode=SearchMode.BALANCED, top_k=5,
                                        output_csv="search_and_create_dynamic_filter.csv",
@@ -67,14 +81,7 @@ def search_and_save_similar_properties(client, searcher, property_data, mode=Sea
         # Iterate over each property to find similar properties with dynamic filters
         for data in property_data_part:
             # Create a dynamic filter for each property based on its attributes
-            filters = PropertyFilters(
-                min_price=data["min_price"],
-                max_price=data["max_price"],
-                min_bedrooms=data["min_bedrooms"],
-                max_bedrooms=data["max_bedrooms"],
-                property_type=data['property_type'],
-                sale_lease=data["lp_sale_lease"]
-            )
+            filters = build_dynamic_filters(data)
 
             # Find similar properties
             try:
@@ -109,14 +116,7 @@ if __name__ == "__main__":
     indexer = PropertyIndexer(client)
     searcher = PropertySearcher(client)
 
-    # Retrieve property data from Qdrant, including dynamic filter criteria
-    collection_name = "location_vectors"  # Replace with your actual collection name
-    property_data = get_all_property_data_from_collection(client, collection_name)
-
-    # Run the similarity search for all properties in Qdrant, saving results to CSV
-    for mode in [SearchMode.BALANCED, SearchMode.BALANCED_WITHOUT_VISUAL,
-                 SearchMode.LOCATION_FOCUS, SearchMode.FEATURES_FOCUS,
-                 SearchMode.DESCRIPTION_FOCUS, SearchMode.VISUAL_FOCUS]:
-        search_and_save_similar_properties(client, searcher, property_data=property_data, mode=mode, top_k=5,
-                                           output_csv=f"similar_properties_dynamic_filter_{mode}.csv",
-                                           limit=200)
+    # Load every facet vector once and compute all modes with vectorized dynamic filters
+    store = LocalVectorStore.export(client, "vector_store")
+    results = batch_similar_properties(store, modes=list(SearchMode), top_k=5, dynamic_filters=True)
+    write_similar_properties_csv(store, results, output_csv="similar_properties_dynamic_filter_{mode}.csv")
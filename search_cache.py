@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from common_class import PropertyFilters, SearchMode
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+
+class SearchResultCache:
+    """
+    In-memory LRU cache of similar-property results with a time-to-live.
+
+    Entries are keyed by the seed property, search mode, normalized filters and
+    top_k. Every entry also remembers the ids it depends on (the seed and the
+    returned properties), so re-indexing or deleting any of them drops the entry.
+    Properties that become newly relevant to a cached seed are picked up once the
+    entry expires.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        """
+        Args:
+            max_entries (int): The maximum number of cached result lists.
+            ttl_seconds (float): How long a result list is served before it is recomputed.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Dict], Tuple]]" = OrderedDict()
+        # Property id -> keys of the entries that depend on it
+        self._keys_by_id: Dict[Hashable, set] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+            property_id: int,
+            mode: SearchMode,
+            filters: Optional[PropertyFilters],
+            top_k: int
+    ) -> Hashable:
+        """
+        Build the cache key of a search.
+
+        sale_lease is left out because the searcher always replaces it with the seed's
+        value, and amenities are compared as a set.
+
+        Args:
+            property_id (int): The seed property ID.
+            mode (SearchMode): The search mode.
+            filters (Optional[PropertyFilters]): The requested filters; None equals no filters.
+            top_k (int): The number of results.
+
+        Returns:
+            Hashable: The cache key.
+        """
+        fields = asdict(filters) if filters else asdict(PropertyFilters())
+        fields.pop("sale_lease", None)
+        fields["must_have_amenities"] = tuple(sorted(set(fields.get("must_have_amenities") or ())))
+        return property_id, mode.value, tuple(sorted(fields.items())), top_k
+
+    def get(self, key: Hashable) -> Optional[List[Dict]]:
+        """
+        Look up the results of a search.
+
+        Args:
+            key (Hashable): The key built by ``make_key``.
+
+        Returns:
+            Optional[List[Dict]]: A copy of the cached results, or None on a miss or expired entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, results, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(result) for result in results]
+
+    def put(self, key: Hashable, results: List[Dict], depends_on: Iterable[Hashable] = ()):
+        """
+        Store the results of a search.
+
+        Args:
+            key (Hashable): The key built by ``make_key``.
+            results (List[Dict]): The results to cache.
+            depends_on (Iterable[Hashable]): Further property ids (e.g. the seed) whose
+                re-indexing invalidates the entry; the result ids are always included.
+        """
+        ids = tuple({*depends_on, *(result.get("id") for result in results)})
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, [dict(result) for result in results], ids)
+            for property_id in ids:
+                self._keys_by_id.setdefault(property_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_ids(self, property_ids: Iterable[Hashable]) -> int:
+        """
+        Drop every entry that depends on any of the given properties.
+
+        Args:
+            property_ids (Iterable[Hashable]): The ids of re-indexed or deleted properties.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        dropped = 0
+        with self._lock:
+            for property_id in property_ids:
+                for key in self._keys_by_id.pop(property_id, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        """
+        Drop all entries, e.g. after a bulk payload update.
+        """
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_id.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report cache size and hit/miss counters.
+
+        Returns:
+            Dict[str, float]: Entry count, hits, misses, evictions, expirations, invalidations and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: Hashable):
+        _, _, ids = self._entries.pop(key)
+        for property_id in ids:
+            keys = self._keys_by_id.get(property_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_id[property_id]
@@ -1,7 +1,9 @@
 import csv
 import logging
 from qdrant_client import QdrantClient
+from batch_similarity import batch_similar_properties, write_similar_properties_csv
 from common_class import PropertyFilters, SearchMode
+from local_vector_store import LocalVectorStore
 from property_indexer import PropertyIndexer
 from property_searcher import PropertySearcher
 
@@ -111,7 +113,8 @@ if __name__ == "__main__":
     # Example property ID list (optional; will fetch from Qdrant if not provided)
     property_data = None  # Set to None to fetch from Qdrant
 
-    # Run the similarity search for all properties in Qdrant or from provided list, saving results to CSV
-    search_and_save_similar_properties(client, searcher, filters=None, property_data=None,
-                                       mode=SearchMode.FEATURES_FOCUS, top_k=5, output_csv="similar_properties.csv",
-                                       limit=120)
+    # Run the similarity search for all properties in Qdrant in one vectorized pass, saving results to CSV.
+    # Without filters only the seed's sale/lease type is matched, as in search_similar_properties.
+    store = LocalVectorStore.export(client, "vector_store")
+    results = batch_similar_properties(store, modes=[SearchMode.FEATURES_FOCUS], top_k=5, dynamic_filters=False)
+    write_similar_properties_csv(store, results, output_csv="similar_properties.csv")
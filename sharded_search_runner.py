@@ -0,0 +1,290 @@
+import csv
+import json
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, replace
+from typing import Dict, List, Optional, Sequence
+
+from qdrant_client import QdrantClient
+
+from common_class import PropertyFilters, SearchMode
+from local_vector_store import LocalVectorStore
+from property_searcher import PropertySearcher
+from search_and_create_dynamic_filters import build_dynamic_filters
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+LAYOUT_FILE = "shards.json"
+
+# The searcher of a worker process, created once by _init_worker
+_worker_searcher: Optional[PropertySearcher] = None
+
+
+def run_sharded_search(
+        property_data: List[Dict],
+        output_dir: str,
+        client_kwargs: Optional[Dict] = None,
+        store_directory: Optional[str] = None,
+        searcher_kwargs: Optional[Dict] = None,
+        modes: Sequence[SearchMode] = tuple(SearchMode),
+        filters: Optional[PropertyFilters] = None,
+        dynamic_filters: bool = False,
+        top_k: int = 5,
+        num_workers: Optional[int] = None,
+        num_shards: Optional[int] = None
+) -> int:
+    """
+    Search the similar properties of every property on a process pool, one shard at a time.
+
+    Properties are assigned to shards by id, and the shard count is kept in ``output_dir``,
+    so a rerun over the same directory sees the same shards. Each worker process builds its
+    own client and PropertySearcher. Every shard writes one CSV per mode into ``output_dir``
+    and appends the id of every finished property to the shard's checkpoint file, so a rerun
+    with the same arguments skips the properties that are already done. A failed search stops
+    its shard without checkpointing the property, so the rerun searches it again. The search
+    arguments are stored with the shard count, and resuming with different ones is refused.
+    Call ``merge_shard_outputs`` afterwards to produce the final CSVs.
+
+    Args:
+        property_data (List[Dict]): The properties to search, with at least property_id and lp_listing_id
+            (and the filter bounds of get_all_property_data_from_collection when dynamic_filters is set).
+        output_dir (str): The directory for shard outputs and checkpoints.
+        client_kwargs (Optional[Dict]): Keyword arguments of QdrantClient for each worker.
+        store_directory (Optional[str]): A LocalVectorStore directory used instead of Qdrant; the workers
+            share its memory-mapped matrices.
+        searcher_kwargs (Optional[Dict]): Extra keyword arguments of PropertySearcher.
+        modes (Sequence[SearchMode]): The search modes to run for every property.
+        filters (Optional[PropertyFilters]): Filters applied to every search.
+        dynamic_filters (bool): Use the per-property filters of build_dynamic_filters instead of ``filters``.
+        top_k (int): The number of similar properties per property.
+        num_workers (Optional[int]): The number of worker processes. Defaults to the CPU count.
+        num_shards (Optional[int]): The number of shards of a new output directory. Defaults to four per worker.
+
+    Returns:
+        int: The number of properties searched by this run.
+
+    Raises:
+        ValueError: If ``output_dir`` holds a run started with different modes, filters or top_k.
+    """
+    if client_kwargs is None and store_directory is None:
+        raise ValueError("Either client_kwargs or store_directory is required")
+    os.makedirs(output_dir, exist_ok=True)
+    num_workers = num_workers or os.cpu_count() or 1
+    layout_path = os.path.join(output_dir, LAYOUT_FILE)
+    settings = {
+        "modes": [mode.value for mode in modes],
+        "filters": asdict(filters) if filters else None,
+        "dynamic_filters": dynamic_filters,
+        "top_k": top_k,
+    }
+    if os.path.exists(layout_path):
+        with open(layout_path) as layout_file:
+            layout = json.load(layout_file)
+        mismatched = [key for key, value in settings.items() if layout.get(key) != value]
+        if mismatched:
+            raise ValueError(f"{output_dir} was started with different {mismatched}: {layout}; "
+                             f"rerun with the same arguments or use a new output directory")
+        num_shards = layout["num_shards"]
+        logging.info(f"Resuming {num_shards} shards in {output_dir}")
+    else:
+        num_shards = num_shards or num_workers * 4
+        with open(layout_path, "w") as layout_file:
+            json.dump({"num_shards": num_shards, **settings}, layout_file)
+    shards = [[] for _ in range(num_shards)]
+    for data in property_data:
+        shards[_shard_of(data["property_id"], num_shards)].append(data)
+
+    started = time.monotonic()
+    searched = 0
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                             initargs=(client_kwargs, store_directory, searcher_kwargs or {})) as executor:
+        futures = {
+            executor.submit(_run_shard, index, shard, output_dir, list(modes), filters, dynamic_filters, top_k): index
+            for index, shard in enumerate(shards) if shard
+        }
+        for future in as_completed(futures):
+            try:
+                searched += future.result()
+            except Exception as e:
+                logging.error(f"Shard {futures[future]} failed, rerun to resume it: {e}")
+    elapsed = time.monotonic() - started
+    logging.info(f"Searched {searched} properties with {num_workers} workers in {elapsed:.0f}s "
+                 f"({searched / elapsed if elapsed else 0:.1f}/s)")
+    return searched
+
+
+def merge_shard_outputs(output_dir: str, output_csv: str = "similar_properties_dynamic_filter_{mode}.csv") -> List[str]:
+    """
+    Combine the shard outputs into one CSV per mode, in the layout of search_and_save_similar_properties.
+    Rows are ordered by property id, the order in which the collection is scrolled.
+
+    Args:
+        output_dir (str): The directory passed to ``run_sharded_search``.
+        output_csv (str): The file name pattern; ``{mode}`` is replaced by the SearchMode.
+
+    Returns:
+        List[str]: The written files.
+    """
+    with open(os.path.join(output_dir, LAYOUT_FILE)) as layout_file:
+        layout = json.load(layout_file)
+    paths = []
+    for mode_value in layout["modes"]:
+        mode = SearchMode(mode_value)
+        rows = {}
+        for index in range(layout["num_shards"]):
+            shard_path = _shard_output_path(output_dir, index, mode)
+            if not os.path.exists(shard_path):
+                continue
+            with open(shard_path, newline="") as shard_file:
+                for row in csv.reader(shard_file):
+                    if len(row) != 3:
+                        logging.warning(f"Skipping malformed row in {shard_path}: {row}")
+                        continue
+                    property_id, listing_id, similar_ids = row
+                    # A property appears twice if a run stopped between its row and its checkpoint
+                    rows.setdefault(property_id, (listing_id, similar_ids))
+
+        path = output_csv.format(mode=mode)
+        with open(path, mode="w", newline="") as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(["property_id", "similar_property_ids"])
+            for property_id in sorted(rows, key=_id_order):
+                listing_id, similar_ids = rows[property_id]
+                csv_writer.writerow([listing_id, json.loads(similar_ids)])
+        logging.info(f"Merged {len(rows)} rows into {path}")
+        paths.append(path)
+    return paths
+
+
+def _init_worker(client_kwargs: Optional[Dict], store_directory: Optional[str], searcher_kwargs: Dict):
+    global _worker_searcher
+    client = LocalVectorStore(store_directory) if store_directory else QdrantClient(**client_kwargs)
+    _worker_searcher = PropertySearcher(client, **searcher_kwargs)
+
+
+def _run_shard(
+        index: int,
+        shard: List[Dict],
+        output_dir: str,
+        modes: List[SearchMode],
+        filters: Optional[PropertyFilters],
+        dynamic_filters: bool,
+        top_k: int
+) -> int:
+    """
+    Search one shard in a worker process, skipping the properties in its checkpoint.
+    """
+    checkpoint_path = os.path.join(output_dir, f"shard_{index:05d}{CHECKPOINT_SUFFIX}")
+    output_paths = {mode: _shard_output_path(output_dir, index, mode) for mode in modes}
+    # A crash in the middle of a write leaves a partial last line, which the next append would corrupt
+    for path in [checkpoint_path, *output_paths.values()]:
+        _truncate_partial_line(path)
+    done = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as checkpoint_file:
+            done = {line.strip() for line in checkpoint_file if line.strip()}
+    pending = [data for data in shard if str(data["property_id"]) not in done]
+    if not pending:
+        return 0
+
+    outputs = {mode: open(path, "a", newline="") for mode, path in output_paths.items()}
+    try:
+        writers = {mode: csv.writer(output) for mode, output in outputs.items()}
+        with open(checkpoint_path, "a") as checkpoint_file:
+            for data in pending:
+                # Every mode is searched before any row is written; a failed search raises and stops
+                # the shard, leaving the property unchecked for the next run
+                rows = {}
+                for mode in modes:
+                    # search_similar_properties overwrites sale_lease, so every search gets its own filters
+                    search_filters = build_dynamic_filters(data) if dynamic_filters else (
+                        replace(filters) if filters else None)
+                    similar_properties = _worker_searcher.search_similar_properties(
+                        property_id=data["property_id"],
+                        mode=mode,
+                        filters=search_filters,
+                        top_k=top_k,
+                        raise_errors=True
+                    )
+                    similar_property_ids = [prop.get("lp_listing_id") for prop in similar_properties]
+                    rows[mode] = [data["property_id"], data["lp_listing_id"], json.dumps(similar_property_ids)]
+                for mode, row in rows.items():
+                    writers[mode].writerow(row)
+                # Rows reach the disk before the checkpoint records the property as done
+                for output in outputs.values():
+                    output.flush()
+                checkpoint_file.write(f"{data['property_id']}\n")
+                checkpoint_file.flush()
+    finally:
+        for output in outputs.values():
+            output.close()
+    logging.info(f"Shard {index}: searched {len(pending)} properties")
+    return len(pending)
+
+
+def _truncate_partial_line(path: str, block_size: int = 65536):
+    """
+    Cut a file back to its last complete line, reading only its tail.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b"\n":
+            return
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        file.truncate(position)
+    logging.warning(f"Removed a partial last line from {path}")
+
+
+def _shard_of(property_id, num_shards: int) -> int:
+    # Stable across processes and runs, unlike hash() of a string
+    if isinstance(property_id, int):
+        return property_id % num_shards
+    return zlib.crc32(str(property_id).encode("utf-8")) % num_shards
+
+
+def _id_order(property_id: str):
+    return (0, int(property_id), "") if property_id.isdigit() else (1, 0, property_id)
+
+
+def _shard_output_path(output_dir: str, index: int, mode: SearchMode) -> str:
+    return os.path.join(output_dir, f"shard_{index:05d}_{mode.value}.csv")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from search_and_create_dynamic_filters import get_all_property_data_from_collection
+
+    parser = argparse.ArgumentParser(description="Sharded, resumable similar-property CSV generation")
+    parser.add_argument("--url", default="http://localhost:6333", help="Qdrant URL")
+    parser.add_argument("--api-key", default=None, help="Qdrant API key")
+    parser.add_argument("--store", default=None, help="Search a LocalVectorStore directory instead of Qdrant")
+    parser.add_argument("--output-dir", default="similar_properties_shards")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    qdrant_kwargs = {"url": args.url, "api_key": args.api_key}
+    source = LocalVectorStore(args.store) if args.store else QdrantClient(**qdrant_kwargs)
+    all_property_data = get_all_property_data_from_collection(source, "location_vectors")
+    run_sharded_search(all_property_data, args.output_dir, client_kwargs=qdrant_kwargs, store_directory=args.store,
+                       dynamic_filters=True, top_k=args.top_k, num_workers=args.workers)
+    merge_shard_outputs(args.output_dir, "similar_properties_dynamic_filter_{mode}.csv")
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+SNAPSHOT_SUFFIX = ".parquet"
+
+
+class SnapshotCache:
+    """
+    Local Parquet snapshots of Athena query results.
+
+    A snapshot is keyed by a hash of the generated SQL and the options that select the
+    data source, so re-running an unchanged query reads the local file instead of
+    waiting for Athena. Snapshots expire after ``ttl_seconds``, and the oldest ones are
+    evicted once the directory grows beyond ``max_bytes``. Reads are memory-mapped and
+    can be restricted to a subset of columns, which Parquet reads without touching the
+    other columns.
+    """
+
+    def __init__(self, directory: str = "athena_snapshots", ttl_seconds: float = 86400.0,
+                 max_bytes: int = 10 * 1024 ** 3):
+        """
+        Args:
+            directory (str): The directory holding the snapshots.
+            ttl_seconds (float): How long a snapshot is served after it was written.
+            max_bytes (int): The total size of snapshots kept.
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(sql: str, options: Optional[Dict] = None) -> str:
+        """
+        Build the snapshot key of a query.
+
+        Args:
+            sql (str): The generated SQL.
+            options (Optional[Dict]): Further inputs that change the result, e.g. the database.
+
+        Returns:
+            str: The snapshot key.
+        """
+        payload = json.dumps({"sql": " ".join(sql.split()), "options": options or {}}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{SNAPSHOT_SUFFIX}")
+
+    def contains(self, key: str) -> bool:
+        """
+        Check for a snapshot that has not expired; expired snapshots are deleted.
+
+        Args:
+            key (str): The key built by ``make_key``.
+
+        Returns:
+            bool: True if the snapshot can be read.
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return False
+        if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+            logging.info(f"Snapshot {key} expired, removing it")
+            _remove(path)
+            return False
+        return True
+
+    def read(self, key: str, columns: Optional[List[str]] = None, dtype_backend: Optional[str] = None) -> pd.DataFrame:
+        """
+        Read a snapshot as one data frame.
+
+        Args:
+            key (str): The key built by ``make_key``.
+            columns (Optional[List[str]]): The columns to read. Defaults to all.
+            dtype_backend (Optional[str]): "pyarrow" for Arrow-backed columns, otherwise numpy-backed.
+
+        Returns:
+            pd.DataFrame: The query result.
+        """
+        started = time.monotonic()
+        table = pq.read_table(self.path(key), columns=columns, memory_map=True)
+        logging.info(f"Read {table.num_rows} rows from snapshot {key} in {time.monotonic() - started:.2f}s")
+        return _to_pandas(table, dtype_backend)
+
+    def iter_chunks(self, key: str, chunksize: int, columns: Optional[List[str]] = None,
+                    dtype_backend: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Read a snapshot as data frames of at most ``chunksize`` rows.
+
+        Args:
+            key (str): The key built by ``make_key``.
+            chunksize (int): The number of rows per data frame.
+            columns (Optional[List[str]]): The columns to read. Defaults to all.
+            dtype_backend (Optional[str]): "pyarrow" for Arrow-backed columns, otherwise numpy-backed.
+
+        Returns:
+            Iterator[pd.DataFrame]: The query result in chunks.
+        """
+        parquet_file = pq.ParquetFile(self.path(key), memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield _to_pandas(pa.Table.from_batches([batch]), dtype_backend)
+
+    def write(self, key: str, frames: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """
+        Pass data frames through while writing them to a snapshot.
+
+        The snapshot is only published once every frame has been consumed, so an
+        interrupted load leaves no partial snapshot behind.
+
+        Args:
+            key (str): The key built by ``make_key``.
+            frames (Iterable[pd.DataFrame]): The query result, in one or more frames.
+
+        Returns:
+            Iterator[pd.DataFrame]: The same frames.
+        """
+        temp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        writer = None
+        completed = False
+        try:
+            for frame in frames:
+                if frame.empty:
+                    # Column types cannot be inferred from an empty frame
+                    yield frame
+                    continue
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(temp_path, table.schema)
+                elif table.schema != writer.schema:
+                    # A chunk with only nulls in a column infers a different type
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                yield frame
+            completed = True
+        finally:
+            if writer is not None:
+                writer.close()
+                if completed:
+                    os.replace(temp_path, self.path(key))
+                    logging.info(f"Saved snapshot {key} ({os.path.getsize(self.path(key)) / 1024 ** 2:.1f} MB)")
+                else:
+                    _remove(temp_path)
+        if completed:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete expired snapshots, then the oldest ones until the directory fits in ``max_bytes``.
+        """
+        now = time.time()
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SNAPSHOT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            if now - stat.st_mtime > self.ttl_seconds:
+                _remove(path)
+            else:
+                snapshots.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, path in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            logging.info(f"Evicting snapshot {path} to stay below {self.max_bytes} bytes")
+            _remove(path)
+            total -= size
+
+
+def _to_pandas(table: pa.Table, dtype_backend: Optional[str]) -> pd.DataFrame:
+    if dtype_backend == "pyarrow":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+
+class WatermarkStore:
+    """
+    Persistent high-water marks of ``event_modification_timestamp`` per provider.
+
+    An incremental sync only loads the records modified after the provider's mark and
+    advances the mark once the delta has been applied. The marks are kept in a small
+    JSON file that is replaced atomically, so an interrupted run leaves the previous
+    marks in place and simply reprocesses the same delta.
+    """
+
+    def __init__(self, path: str = "sync_watermarks.json"):
+        """
+        Args:
+            path (str): The JSON file holding the marks.
+        """
+        self.path = path
+        self.watermarks: Dict[str, str] = {}
+        # Provider -> (newest, newest below it) timestamp seen by observe since the last advance
+        self._observed: Dict[str, Tuple[pd.Timestamp, Optional[pd.Timestamp]]] = {}
+        if os.path.exists(path):
+            with open(path) as watermark_file:
+                self.watermarks = json.load(watermark_file)
+
+    def get(self, provider_id: str) -> Optional[str]:
+        """
+        Look up the mark of a provider.
+
+        Args:
+            provider_id (str): The lp_provider_id.
+
+        Returns:
+            Optional[str]: The timestamp as 'YYYY-MM-DD HH:MM:SS.fff', or None before the first sync.
+        """
+        return self.watermarks.get(provider_id)
+
+    def observe(self, records: List[Dict], timestamp_column: str = "event_modification_timestamp"):
+        """
+        Track the timestamps of a batch of the delta without moving the marks yet.
+
+        Only the newest timestamp per provider and the newest one below it are kept, so a
+        pull can be observed batch by batch in any order and in constant memory.
+
+        Args:
+            records (List[Dict]): Records of the delta, with lp_provider_id.
+            timestamp_column (str): The modification timestamp field.
+        """
+        for record in records:
+            value = record.get(timestamp_column)
+            if value is None or pd.isna(value):
+                continue
+            value = pd.Timestamp(value)
+            newest, below_newest = self._observed.get(record["lp_provider_id"], (None, None))
+            if newest is None or value > newest:
+                below_newest = newest
+                newest = value
+            elif value < newest and (below_newest is None or value > below_newest):
+                below_newest = value
+            self._observed[record["lp_provider_id"]] = (newest, below_newest)
+
+    def advance(
+            self,
+            records: Optional[List[Dict]] = None,
+            timestamp_column: str = "event_modification_timestamp",
+            truncated: bool = False
+    ) -> Dict[str, str]:
+        """
+        Move the marks of the observed providers to their newest timestamp.
+
+        Call it once the whole delta has been read and applied, with the records of the
+        delta or after passing its batches to ``observe``. When the query was cut off by its
+        row limit, rows sharing the newest timestamp may not all have been read, so the mark
+        stops just below it and those rows are read again by the next sync. Marks never move
+        backwards. Call ``save`` to persist them.
+
+        Args:
+            records (Optional[List[Dict]]): Further records of the applied delta, with lp_provider_id.
+            timestamp_column (str): The modification timestamp field.
+            truncated (bool): Whether the query returned as many rows as its limit.
+
+        Returns:
+            Dict[str, str]: The marks that changed.
+        """
+        if records:
+            self.observe(records, timestamp_column)
+        observed, self._observed = self._observed, {}
+
+        changed = {}
+        for provider_id, (newest, below_newest) in observed.items():
+            if truncated:
+                if below_newest is None:
+                    logging.info(f"Holding the {provider_id} watermark below {newest}, where the row limit "
+                                 f"may have cut off rows")
+                    continue
+                newest = below_newest
+            watermark = _format_timestamp(newest)
+            current = self.watermarks.get(provider_id)
+            if current is None or pd.Timestamp(current) < newest:
+                self.watermarks[provider_id] = watermark
+                changed[provider_id] = watermark
+        return changed
+
+    def save(self):
+        """
+        Write the marks to the JSON file.
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as watermark_file:
+            json.dump(self.watermarks, watermark_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+        logging.info(f"Saved sync watermarks to {self.path}: {self.watermarks}")
+
+
+def _format_timestamp(timestamp: pd.Timestamp) -> str:
+    # Millisecond precision, matching the timestamp(3) cast of the load query
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class FailedRecordStore:
+    """
+    Listings an incremental sync could not index for good, e.g. invalid data or no usable photos.
+
+    Retrying them cannot succeed until their source record changes, which gives them a newer
+    timestamp and brings them back into the delta, so the watermark moves past them and their
+    ids are kept here for inspection. Listings that a later sync does apply are removed again.
+    """
+
+    def __init__(self, path: str = "sync_failed_records.json"):
+        """
+        Args:
+            path (str): The JSON file holding the failures.
+        """
+        self.path = path
+        self.failures: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path) as failures_file:
+                self.failures = json.load(failures_file)
+
+    def update(self, failures: Dict, resolved: Iterable = ()):
+        """
+        Record permanent failures and forget listings that have since been applied.
+
+        Args:
+            failures (Dict): Property id -> failure reason.
+            resolved (Iterable): Ids of properties indexed, updated or deleted by the sync.
+        """
+        for property_id in resolved:
+            self.failures.pop(str(property_id), None)
+        for property_id, reason in failures.items():
+            self.failures[str(property_id)] = reason
+
+    def save(self):
+        """
+        Write the failures to the JSON file.
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as failures_file:
+            json.dump(self.failures, failures_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+        logging.info(f"{len(self.failures)} listings failed permanently, see {self.path}")
@@ -0,0 +1,149 @@
+import random
+from typing import Dict, List
+
+import pytest
+
+from common_class import PropertyFilters
+from filter_engine import CompiledPropertyFilter
+
+
+def reference_apply_filters(properties: List[Dict], filters: PropertyFilters) -> List[Dict]:
+    """
+    The original per-property PropertySearcher.apply_filters, without its logging.
+    """
+    filtered_results = []
+    for prop in properties:
+        try:
+            prop['id']
+            if 'price_range' in prop and prop.get('price_range'):
+                price_min, price_max = map(float, prop['price_range'].split('-'))
+                if filters.min_price is not None and price_max < filters.min_price:
+                    continue
+                if filters.max_price is not None and price_min > filters.max_price:
+                    continue
+            elif 'list_price' in prop and prop.get('list_price'):
+                if ((filters.min_price and filters.min_price > prop.get('list_price')) or
+                        (filters.max_price and filters.max_price < prop.get('list_price'))):
+                    continue
+            else:
+                continue
+
+            bedrooms = prop.get('bedrooms_total', None)
+            if bedrooms is not None:
+                if filters.min_bedrooms is not None and bedrooms < filters.min_bedrooms:
+                    continue
+                if filters.max_bedrooms is not None and bedrooms > filters.max_bedrooms:
+                    continue
+            else:
+                continue
+
+            bathrooms = prop.get('lp_calculated_bath', None)
+            if bathrooms is not None:
+                if filters.min_bathrooms is not None and bathrooms < filters.min_bathrooms:
+                    continue
+                if filters.max_bathrooms is not None and bathrooms > filters.max_bathrooms:
+                    continue
+            else:
+                continue
+
+            if filters.property_type is not None and prop.get('lp_property_type') != filters.property_type:
+                continue
+
+            if filters.must_have_amenities:
+                missing_amenities = [
+                    amenity for amenity in filters.must_have_amenities
+                    if amenity not in prop.get('lp_listing_description', "")
+                ]
+                if missing_amenities:
+                    continue
+
+            if filters.sale_lease and filters.sale_lease != prop.get('lp_sale_lease'):
+                continue
+
+            filtered_results.append(prop)
+        except Exception:
+            continue
+    return filtered_results
+
+
+AMENITIES = ["parking", "pool", "garden", "gym"]
+
+
+def random_property(rng: random.Random, property_id: int) -> Dict:
+    prop = {}
+    if rng.random() > 0.05:
+        prop['id'] = property_id
+    price = rng.choice(["range", "list", "list_text", "bad_range", "zero", "none"])
+    if price == "range":
+        low = rng.randrange(100, 5000) * 100
+        prop['price_range'] = f"{low}-{low + rng.randrange(1, 50) * 1000}"
+    elif price == "list":
+        prop['list_price'] = rng.choice([rng.randrange(1000, 900000), rng.uniform(1000, 900000)])
+    elif price == "list_text":
+        prop['list_price'] = "call for price"
+    elif price == "bad_range":
+        prop['price_range'] = "n/a"
+    elif price == "zero":
+        prop['list_price'] = 0
+    for key in ('bedrooms_total', 'lp_calculated_bath'):
+        prop[key] = rng.choice([None, "two", rng.randrange(0, 7), rng.randrange(0, 7) + 0.5])
+        if prop[key] is None and rng.random() < 0.5:
+            del prop[key]
+    prop['lp_property_type'] = rng.choice(["Condo", "House", "", None, ["Condo"]])
+    prop['lp_sale_lease'] = rng.choice(["Sale", "Lease", None])
+    description = " ".join(rng.sample(AMENITIES + ["view", "quiet"], rng.randrange(0, 4)))
+    choice = rng.random()
+    if choice < 0.05:
+        prop['lp_listing_description'] = None
+    elif choice < 0.1:
+        pass
+    else:
+        prop['lp_listing_description'] = description
+    return prop
+
+
+def random_filters(rng: random.Random) -> PropertyFilters:
+    def maybe(value):
+        return value if rng.random() < 0.5 else None
+
+    min_bedrooms = maybe(rng.randrange(0, 4))
+    min_price = maybe(rng.choice([0, rng.randrange(1000, 500000)]))
+    return PropertyFilters(
+        min_price=min_price,
+        max_price=maybe(rng.randrange(100000, 1000000)),
+        min_bedrooms=min_bedrooms,
+        max_bedrooms=maybe(rng.randrange(2, 7)),
+        min_bathrooms=maybe(rng.choice([1, 1.5, 2])),
+        max_bathrooms=maybe(rng.randrange(2, 6)),
+        property_type=maybe(rng.choice(["Condo", "House", ""])),
+        must_have_amenities=rng.sample(AMENITIES, rng.randrange(0, 3)),
+        sale_lease=rng.choice(["", "Sale", "Lease"]),
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_compiled_filter_matches_reference(seed):
+    rng = random.Random(seed)
+    properties = [random_property(rng, property_id) for property_id in range(400)]
+    for _ in range(50):
+        filters = random_filters(rng)
+        expected = reference_apply_filters(properties, filters)
+        assert CompiledPropertyFilter(filters).apply(properties) == expected, filters
+
+
+def test_columns_are_reusable_across_filters():
+    rng = random.Random(7)
+    properties = [random_property(rng, property_id) for property_id in range(200)]
+    all_filters = [random_filters(rng) for _ in range(20)]
+    amenities = {amenity for filters in all_filters for amenity in filters.must_have_amenities}
+    columns = CompiledPropertyFilter(PropertyFilters(must_have_amenities=sorted(amenities))).columns(properties)
+    for filters in all_filters:
+        keep = CompiledPropertyFilter(filters).mask(columns)
+        kept = [prop for prop, passed in zip(properties, keep) if passed]
+        assert kept == reference_apply_filters(properties, filters)
+
+
+def test_mask_requires_amenity_columns():
+    columns = CompiledPropertyFilter(PropertyFilters()).columns([{'id': 1, 'list_price': 10}])
+    with pytest.raises(ValueError):
+        CompiledPropertyFilter(PropertyFilters(must_have_amenities=["pool"])).mask(columns)
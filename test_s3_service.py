@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("awswrangler")
+from botocore.exceptions import ClientError  # noqa: E402
+
+import s3_service  # noqa: E402
+from s3_service import AdaptiveConcurrencyLimiter, S3Service  # noqa: E402
+
+
+def client_error(code, operation="CopyObject"):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class FakeS3Client:
+    """
+    Records the calls of the aioboto3 S3 client methods used by S3Service.
+    """
+
+    def __init__(self, fail_part=None, throttles=0):
+        self.fail_part = fail_part
+        self.throttles = throttles
+        self.calls = []
+        self.parts = {}
+        self.objects = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.closed = False
+
+    async def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append("put_object")
+        self.objects[Key] = Body
+
+    async def head_object(self, Bucket, Key):
+        self.calls.append("head_object")
+        if Key not in self.objects:
+            raise client_error("404", "HeadObject")
+
+    async def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.calls.append("create_multipart_upload")
+        return {"UploadId": "upload-1"}
+
+    async def upload_part(self, Bucket, Key, Body, PartNumber, UploadId):
+        self.calls.append("upload_part")
+        await asyncio.sleep(0)
+        if PartNumber == self.fail_part:
+            raise client_error("InternalError", "UploadPart")
+        self.parts[PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        self.objects[Key] = b"".join(self.parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+
+    async def copy_object(self, Bucket, Key, CopySource):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            if self.throttles:
+                self.throttles -= 1
+                raise client_error("SlowDown")
+            self.objects[Key] = CopySource["Key"]
+        finally:
+            self.in_flight -= 1
+
+
+class FakeSession:
+    """
+    Stands in for aioboto3.Session, handing out the same fake client.
+    """
+
+    def __init__(self, client):
+        self.client_instance = client
+        self.opened = 0
+
+    def client(self, *args, **kwargs):
+        session = self
+
+        class Context:
+            async def __aenter__(self):
+                session.opened += 1
+                session.client_instance.closed = False
+                return session.client_instance
+
+            async def __aexit__(self, *exc_info):
+                session.client_instance.closed = True
+
+        return Context()
+
+
+class FakeStream:
+    def __init__(self, data, chunk_size=1 << 20):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.position = 0
+
+    async def read(self, size):
+        chunk = self.data[self.position:self.position + min(size, self.chunk_size)]
+        self.position += len(chunk)
+        return chunk
+
+
+def make_service(client, **kwargs):
+    service = S3Service(wr_client=None, **kwargs)
+    service.async_boto_session = FakeSession(client)
+    return service
+
+
+def test_limiter_halves_on_throttle_once_per_cooldown(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(s3_service.time, "monotonic", lambda: now[0])
+    limiter = AdaptiveConcurrencyLimiter(16, 32, minimum=2, cooldown_seconds=1.0)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 8
+    now[0] += 1.0
+    for _ in range(3):
+        limiter.on_throttle()
+        now[0] += 1.0
+    assert limiter.limit == 2
+    assert limiter.throttles == 5
+
+
+def test_limiter_grows_by_one_slot_per_round():
+    limiter = AdaptiveConcurrencyLimiter(4, 6)
+    for _ in range(4):
+        limiter.on_success()
+    assert 4.9 < limiter.limit < 5.0
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 6
+
+
+def test_limiter_bounds_requests_in_flight():
+    limiter = AdaptiveConcurrencyLimiter(3, 3)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.001)
+
+    async def run():
+        await asyncio.gather(*[request() for _ in range(20)])
+
+    asyncio.run(run())
+    assert peak == 3
+    assert limiter.in_flight == 0
+
+
+def test_failed_part_aborts_the_multipart_upload():
+    client = FakeS3Client(fail_part=2)
+    service = make_service(client)
+    part_size = s3_service.MIN_MULTIPART_PART_SIZE
+    with pytest.raises(ClientError):
+        asyncio.run(service.push_s3_stream_async(FakeStream(b"x" * (3 * part_size + 10)), "bucket", "key",
+                                                 part_size=part_size))
+    assert "abort_multipart_upload" in client.calls
+    assert "complete_multipart_upload" not in client.calls
+    assert client.closed
+
+
+def test_stream_is_uploaded_in_parts():
+    client = FakeS3Client()
+    service = make_service(client)
+    part_size = s3_service.MIN_MULTIPART_PART_SIZE
+    data = bytes(range(256)) * (part_size // 128 + 3)
+    size = asyncio.run(service.push_s3_stream_async(FakeStream(data), "bucket", "key", part_size=part_size))
+    assert size == len(data)
+    assert client.objects["key"] == data
+    assert client.calls.count("upload_part") == 3
+    assert "abort_multipart_upload" not in client.calls
+
+
+def test_short_stream_is_a_single_put():
+    client = FakeS3Client()
+    service = make_service(client)
+    assert asyncio.run(service.push_s3_stream_async(FakeStream(b"small"), "bucket", "key")) == 5
+    assert client.calls == ["put_object"]
+
+
+def test_throttled_copies_are_retried_under_the_limiter():
+    client = FakeS3Client(throttles=5)
+    service = make_service(client, max_concurrency=8, base_backoff=0.001, max_backoff=0.01)
+    paths = [(f"s3://source/images/{number}.jpg", number) for number in range(50)]
+    results = asyncio.run(service.copy_s3_objects_async("s3://target/media", paths))
+    assert [result.status for result in results] == ["copied"] * 50
+    assert sum(result.attempts for result in results) == 55
+    assert client.peak_in_flight <= 8
+    assert service._limiter.throttles == 5
+
+
+def test_calls_outside_async_with_close_their_clients():
+    client = FakeS3Client()
+    service = make_service(client)
+    for _ in range(3):
+        assert asyncio.run(service.check_s3_file_exists("bucket", "missing")) is False
+        assert client.closed
+    # Two clients (requests and bulk copies) per call
+    assert service.async_boto_session.opened == 6
+
+
+def test_async_with_shares_clients_across_calls():
+    client = FakeS3Client()
+    service = make_service(client)
+
+    async def run():
+        async with service:
+            await service.upload_to_s3("bucket", b"data", "key", "text/plain")
+            exists = await service.check_s3_file_exists("bucket", "key")
+            assert not client.closed
+            return exists
+
+    assert asyncio.run(run()) is True
+    assert client.closed
+    assert service.async_boto_session.opened == 2
@@ -0,0 +1,91 @@
+import pytest
+
+import search_cache
+from common_class import PropertyFilters, SearchMode
+from search_cache import SearchResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(search_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SearchResultCache(ttl_seconds=60)
+    key = cache.make_key(1, SearchMode.BALANCED, None, 5)
+    cache.put(key, [{"id": 2}], depends_on=[1])
+
+    clock[0] += 59
+    assert cache.get(key) == [{"id": 2}]
+    clock[0] += 1
+    assert cache.get(key) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_get_returns_copies(clock):
+    cache = SearchResultCache()
+    key = cache.make_key(1, SearchMode.BALANCED, None, 5)
+    cache.put(key, [{"id": 2}])
+    cache.get(key)[0]["id"] = 3
+    assert cache.get(key) == [{"id": 2}]
+
+
+def test_invalidate_drops_entries_depending_on_seed_or_results(clock):
+    cache = SearchResultCache()
+    first = cache.make_key(1, SearchMode.BALANCED, None, 5)
+    second = cache.make_key(4, SearchMode.BALANCED, None, 5)
+    cache.put(first, [{"id": 2}, {"id": 3}], depends_on=[1])
+    cache.put(second, [{"id": 5}], depends_on=[4])
+
+    assert cache.invalidate_ids([3]) == 1
+    assert cache.get(first) is None
+    assert cache.get(second) == [{"id": 5}]
+    assert cache.invalidate_ids([4]) == 1
+    assert cache.get(second) is None
+    # Nothing is left to depend on
+    assert cache.invalidate_ids([1, 2, 5]) == 0
+
+
+def test_replacing_an_entry_forgets_old_dependencies(clock):
+    cache = SearchResultCache()
+    key = cache.make_key(1, SearchMode.BALANCED, None, 5)
+    cache.put(key, [{"id": 2}], depends_on=[1])
+    cache.put(key, [{"id": 3}], depends_on=[1])
+    assert cache.invalidate_ids([2]) == 0
+    assert cache.get(key) == [{"id": 3}]
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = SearchResultCache(max_entries=2)
+    keys = [cache.make_key(seed, SearchMode.BALANCED, None, 5) for seed in range(3)]
+    cache.put(keys[0], [])
+    cache.put(keys[1], [])
+    cache.get(keys[0])
+    cache.put(keys[2], [])
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == []
+    assert cache.stats()["evictions"] == 1
+
+
+def test_clear_drops_everything(clock):
+    cache = SearchResultCache()
+    key = cache.make_key(1, SearchMode.BALANCED, None, 5)
+    cache.put(key, [{"id": 2}])
+    cache.clear()
+    assert cache.get(key) is None
+    assert cache.invalidate_ids([2]) == 0
+
+
+def test_key_normalizes_filters():
+    make_key = SearchResultCache.make_key
+    assert make_key(1, SearchMode.BALANCED, None, 5) == make_key(1, SearchMode.BALANCED, PropertyFilters(), 5)
+    assert (make_key(1, SearchMode.BALANCED, PropertyFilters(must_have_amenities=["pool", "gym", "pool"]), 5) ==
+            make_key(1, SearchMode.BALANCED, PropertyFilters(must_have_amenities=["gym", "pool"]), 5))
+    assert (make_key(1, SearchMode.BALANCED, PropertyFilters(sale_lease="Sale"), 5) ==
+            make_key(1, SearchMode.BALANCED, PropertyFilters(sale_lease="Lease"), 5))
+    assert make_key(1, SearchMode.BALANCED, None, 5) != make_key(1, SearchMode.VISUAL_FOCUS, None, 5)
+    assert (make_key(1, SearchMode.BALANCED, PropertyFilters(min_price=1), 5) !=
+            make_key(1, SearchMode.BALANCED, None, 5))
@@ -0,0 +1,67 @@
+import json
+
+from sync_watermarks import FailedRecordStore, WatermarkStore
+
+
+def record(provider_id, timestamp):
+    return {"lp_provider_id": provider_id, "event_modification_timestamp": timestamp}
+
+
+def test_advance_moves_marks_to_the_newest_timestamp(tmp_path):
+    store = WatermarkStore(str(tmp_path / "marks.json"))
+    changed = store.advance([record("a", "2024-01-02 10:00:00"), record("a", "2024-01-03 09:30:00.250"),
+                             record("b", "2024-01-01 00:00:00"), record("b", None)])
+    assert changed == {"a": "2024-01-03 09:30:00.250", "b": "2024-01-01 00:00:00.000"}
+    assert store.get("a") == "2024-01-03 09:30:00.250"
+    assert store.get("c") is None
+
+
+def test_observe_in_batches_matches_advance_with_records(tmp_path):
+    records = [record("a", f"2024-01-{day:02d} 12:00:00") for day in (5, 1, 9, 3)]
+    batched = WatermarkStore(str(tmp_path / "batched.json"))
+    for start in range(0, len(records), 2):
+        batched.observe(records[start:start + 2])
+    direct = WatermarkStore(str(tmp_path / "direct.json"))
+    assert batched.advance() == direct.advance(records) == {"a": "2024-01-09 12:00:00.000"}
+
+
+def test_marks_never_move_backwards(tmp_path):
+    store = WatermarkStore(str(tmp_path / "marks.json"))
+    store.advance([record("a", "2024-02-01 00:00:00")])
+    assert store.advance([record("a", "2024-01-01 00:00:00")]) == {}
+    assert store.get("a") == "2024-02-01 00:00:00.000"
+
+
+def test_truncated_delta_stops_below_the_newest_timestamp(tmp_path):
+    store = WatermarkStore(str(tmp_path / "marks.json"))
+    changed = store.advance([record("a", "2024-01-01 00:00:00"), record("a", "2024-01-02 00:00:00"),
+                             record("a", "2024-01-02 00:00:00"), record("b", "2024-01-05 00:00:00")],
+                            truncated=True)
+    # b only has rows at its newest timestamp, which the row limit may have cut off
+    assert changed == {"a": "2024-01-01 00:00:00.000"}
+    assert store.get("b") is None
+
+
+def test_advance_forgets_observed_timestamps(tmp_path):
+    store = WatermarkStore(str(tmp_path / "marks.json"))
+    store.observe([record("a", "2024-01-01 00:00:00")])
+    store.advance()
+    assert store.advance() == {}
+
+
+def test_marks_survive_save_and_reload(tmp_path):
+    path = str(tmp_path / "marks.json")
+    store = WatermarkStore(path)
+    store.advance([record("a", "2024-01-01 00:00:00")])
+    store.save()
+    assert json.load(open(path)) == {"a": "2024-01-01 00:00:00.000"}
+    assert WatermarkStore(path).get("a") == "2024-01-01 00:00:00.000"
+
+
+def test_failed_records_are_resolved_once_applied(tmp_path):
+    path = str(tmp_path / "failed.json")
+    failures = FailedRecordStore(path)
+    failures.update({1: "Failed to download photos", 2: "Property data validation failed"})
+    failures.update({}, resolved=[1])
+    failures.save()
+    assert FailedRecordStore(path).failures == {"2": "Property data validation failed"}
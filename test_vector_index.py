@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+import pytest
+
+from hnsw_index import HNSWIndex
+from local_vector_store import IDS_FILE, MANIFEST_FILE, PAYLOADS_FILE, LocalVectorStore, top_positions
+from vector_quantizer import ProductQuantizer
+
+DIM = 32
+K = 10
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    # Clustered like real embeddings, normalized as the collections store them
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, DIM))
+    points = centers[rng.integers(0, len(centers), size=1000)] + 0.4 * rng.normal(size=(1000, DIM))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def queries(vectors):
+    rng = np.random.default_rng(1)
+    return vectors[rng.choice(len(vectors), size=100, replace=False)] + 0.05 * rng.normal(size=(100, DIM))
+
+
+@pytest.fixture(scope="module")
+def index(vectors):
+    index = HNSWIndex(DIM, M=8, ef_construction=100, ef_search=64, capacity=16)
+    index.add_items(list(range(len(vectors))), vectors)
+    return index
+
+
+def exact_top_k(vectors, query, k, allowed=None):
+    scores = vectors @ (query / np.linalg.norm(query))
+    if allowed is not None:
+        scores = np.where(allowed, scores, -np.inf)
+    return top_positions(scores, k)
+
+
+def recall(found, expected):
+    return len(set(np.asarray(found).tolist()) & set(np.asarray(expected).tolist())) / len(expected)
+
+
+def test_hnsw_recall(index, vectors, queries):
+    recalls = [recall(index.search(query, K)[0], exact_top_k(vectors, query, K)) for query in queries]
+    assert np.mean(recalls) >= 0.95
+
+
+def test_hnsw_scores_are_cosine_similarities(index, vectors, queries):
+    labels, scores = index.search(queries[0], K)
+    expected = vectors[labels] @ (queries[0] / np.linalg.norm(queries[0]))
+    np.testing.assert_allclose(scores, expected, atol=1e-5)
+    assert np.all(np.diff(scores) <= 1e-6)
+
+
+def test_hnsw_never_returns_deleted_or_disallowed_labels(vectors, queries):
+    # Own index, deleting from the shared one would change the other tests
+    index = HNSWIndex(DIM, M=8, ef_construction=100, capacity=len(vectors))
+    index.add_items(list(range(len(vectors))), vectors)
+    deleted = set(range(0, len(vectors), 3))
+    for label in deleted:
+        assert index.delete(label)
+    allowed = np.arange(len(vectors)) % 2 == 0
+    expected_allowed = allowed & ~np.isin(np.arange(len(vectors)), list(deleted))
+    recalls = []
+    for query in queries:
+        labels, _ = index.search(query, K, ef=128, allowed=allowed)
+        assert not set(labels.tolist()) & deleted
+        assert np.all(labels % 2 == 0)
+        recalls.append(recall(labels, exact_top_k(vectors, query, K, expected_allowed)))
+    assert np.mean(recalls) >= 0.9
+
+
+def test_hnsw_survives_save_and_load(index, queries, tmp_path):
+    index.save(str(tmp_path / "hnsw"))
+    loaded = HNSWIndex.load(str(tmp_path / "hnsw"))
+    for query in queries[:10]:
+        np.testing.assert_array_equal(loaded.search(query, K)[0], index.search(query, K)[0])
+
+
+def test_product_quantizer_recall(vectors, queries):
+    quantizer = ProductQuantizer(DIM, num_subspaces=8)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (len(vectors), 8) and codes.dtype == np.uint8
+
+    approximate, reranked = [], []
+    for query in queries:
+        query = query / np.linalg.norm(query)
+        expected = exact_top_k(vectors, query, K)
+        scores = quantizer.scores(codes, query)
+        approximate.append(recall(top_positions(scores, K), expected))
+        # Rescore a 4x shortlist exactly, as LocalVectorStore does with rerank_factor=4
+        shortlist = top_positions(scores, 4 * K)
+        reranked.append(recall(shortlist[top_positions(vectors[shortlist] @ query, K)], expected))
+    assert np.mean(approximate) >= 0.4
+    assert np.mean(reranked) >= 0.95
+
+
+def test_product_quantizer_scores_match_decoded_vectors(vectors, queries):
+    quantizer = ProductQuantizer(DIM, num_subspaces=8)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors[:100])
+    np.testing.assert_allclose(quantizer.scores(codes, queries[0]), quantizer.decode(codes) @ queries[0],
+                               rtol=1e-4, atol=1e-4)
+
+
+def test_local_store_search_after_adding_points(vectors, tmp_path):
+    np.save(tmp_path / IDS_FILE, np.arange(100, dtype=np.int64))
+    np.save(tmp_path / "features.npy", vectors[:100])
+    (tmp_path / PAYLOADS_FILE).write_text("".join(json.dumps({"id": number}) + "\n" for number in range(100)))
+    (tmp_path / MANIFEST_FILE).write_text(json.dumps({"count": 100, "dtype": "float32",
+                                                      "facets": {"features": {"dim": DIM}}}))
+    store = LocalVectorStore(str(tmp_path))
+    for number in range(100, len(vectors)):
+        store.add_points([number], {"features": vectors[number:number + 1]}, [{"id": number}])
+    # Replacing a point hides its old row
+    store.add_points([5], {"features": -vectors[5:6]}, [{"id": 5}])
+
+    assert len(store.ids) == len(store.removed) == len(store.payloads) == len(vectors) + 1
+    assert len(store._buffers["ids"]) < 2 * len(store.ids)
+    expected = vectors.copy()
+    expected[5] = -vectors[5]
+    for query in vectors[::97]:
+        found = [point.id for point in store.search("features_vectors", query, limit=K)]
+        assert found == exact_top_k(expected, query, K).tolist()
@@ -0,0 +1,189 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+# Set up logging configuration
+logging.basicConfig(level=logging.INFO)
+
+# Vectors encoded per block, bounding the temporary distance matrices
+ENCODE_BLOCK_ROWS = 65536
+
+
+class ProductQuantizer:
+    """
+    Product quantizer for normalized facet embeddings.
+
+    Each vector is split into ``num_subspaces`` contiguous sub-vectors, and each
+    sub-vector is replaced by the index of its nearest centroid in a per-subspace
+    codebook of up to 256 entries, so a vector is stored as ``num_subspaces`` bytes.
+    With the default of 2 dimensions per subspace a 384-d float32 vector shrinks
+    from 1536 to 192 bytes (8x). Queries are scored with asymmetric distance
+    computation: the unquantized query is dotted with every centroid once, and a
+    candidate's score is the sum of the looked-up entries for its codes.
+    """
+
+    def __init__(self, dim: int, num_subspaces: Optional[int] = None, num_centroids: int = 256):
+        """
+        Args:
+            dim (int): The vector dimension.
+            num_subspaces (Optional[int]): The number of sub-vectors (bytes per vector). Must divide dim.
+                Defaults to dim // 2.
+            num_centroids (int): The codebook size per subspace, at most 256.
+        """
+        num_subspaces = num_subspaces or dim // 2
+        if dim % num_subspaces:
+            raise ValueError(f"num_subspaces {num_subspaces} does not divide the dimension {dim}")
+        if not 1 < num_centroids <= 256:
+            raise ValueError("num_centroids must be between 2 and 256 to fit uint8 codes")
+        self.dim = dim
+        self.num_subspaces = num_subspaces
+        self.sub_dim = dim // num_subspaces
+        self.num_centroids = num_centroids
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.num_subspaces
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, sample_size: int = 100000, seed: int = 42):
+        """
+        Learn the codebooks with k-means on a sample of the embeddings.
+
+        Args:
+            vectors (np.ndarray): A (n, dim) matrix of training vectors.
+            iterations (int): The number of k-means iterations per subspace.
+            sample_size (int): The maximum number of vectors used for training.
+            seed (int): The random seed for sampling and initialization.
+        """
+        rng = np.random.default_rng(seed)
+        if len(vectors) > sample_size:
+            vectors = vectors[np.sort(rng.choice(len(vectors), size=sample_size, replace=False))]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < self.num_centroids:
+            raise ValueError(f"Need at least {self.num_centroids} training vectors, got {len(vectors)}")
+
+        self.codebooks = np.empty((self.num_subspaces, self.num_centroids, self.sub_dim), dtype=np.float32)
+        for subspace in range(self.num_subspaces):
+            points = vectors[:, subspace * self.sub_dim:(subspace + 1) * self.sub_dim]
+            self.codebooks[subspace] = _kmeans(points, self.num_centroids, iterations, rng)
+        logging.info(f"Trained product quantizer with {self.num_subspaces} subspaces on {len(vectors)} vectors")
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Quantize vectors to codes.
+
+        Args:
+            vectors (np.ndarray): A (n, dim) matrix.
+
+        Returns:
+            np.ndarray: A (n, num_subspaces) uint8 code matrix.
+        """
+        self._check_trained()
+        codes = np.empty((len(vectors), self.num_subspaces), dtype=np.uint8)
+        for start in range(0, len(vectors), ENCODE_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + ENCODE_BLOCK_ROWS], dtype=np.float32)
+            for subspace, codebook in enumerate(self.codebooks):
+                points = block[:, subspace * self.sub_dim:(subspace + 1) * self.sub_dim]
+                codes[start:start + len(block), subspace] = _nearest_centroids(points, codebook)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Reconstruct approximate vectors from codes.
+
+        Args:
+            codes (np.ndarray): A (n, num_subspaces) code matrix.
+
+        Returns:
+            np.ndarray: A (n, dim) float32 matrix.
+        """
+        self._check_trained()
+        subspaces = np.arange(self.num_subspaces)
+        return self.codebooks[subspaces, codes].reshape(len(codes), self.dim)
+
+    def lookup_table(self, query: np.ndarray) -> np.ndarray:
+        """
+        Dot products of the query's sub-vectors with every centroid.
+
+        Args:
+            query (np.ndarray): The query vector.
+
+        Returns:
+            np.ndarray: A (num_subspaces, num_centroids) float32 table.
+        """
+        self._check_trained()
+        sub_queries = np.asarray(query, dtype=np.float32).reshape(self.num_subspaces, self.sub_dim)
+        return np.einsum("scd,sd->sc", self.codebooks, sub_queries)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate dot products of the query with every encoded vector.
+
+        Args:
+            codes (np.ndarray): A (n, num_subspaces) code matrix.
+            query (np.ndarray): The query vector.
+
+        Returns:
+            np.ndarray: The n approximate scores.
+        """
+        table = self.lookup_table(query)
+        scores = np.zeros(len(codes), dtype=np.float32)
+        # One subspace at a time keeps the temporaries at n floats
+        for subspace in range(self.num_subspaces):
+            scores += np.take(table[subspace], codes[:, subspace])
+        return scores
+
+    def save(self, path: str):
+        """
+        Write the codebooks to an .npz file.
+
+        Args:
+            path (str): The file to write.
+        """
+        self._check_trained()
+        np.savez(path, codebooks=self.codebooks)
+
+    @classmethod
+    def load(cls, path: str) -> "ProductQuantizer":
+        """
+        Read codebooks written by ``save``.
+
+        Args:
+            path (str): The file to read.
+
+        Returns:
+            ProductQuantizer: The trained quantizer.
+        """
+        with np.load(path) as data:
+            codebooks = data["codebooks"]
+        num_subspaces, num_centroids, sub_dim = codebooks.shape
+        quantizer = cls(num_subspaces * sub_dim, num_subspaces=num_subspaces, num_centroids=num_centroids)
+        quantizer.codebooks = codebooks
+        return quantizer
+
+    def _check_trained(self):
+        if self.codebooks is None:
+            raise ValueError("The product quantizer has not been trained")
+
+
+def _kmeans(points: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroids(points, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.stack([np.bincount(assignment, weights=points[:, dim], minlength=k)
+                         for dim in range(points.shape[1])], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters with random training points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), size=len(empty), replace=False)]
+    return centroids
+
+
+def _nearest_centroids(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin ||x - c||^2 == argmin (||c||^2 - 2 x.c)
+    distances = (centroids * centroids).sum(axis=1) - 2 * points @ centroids.T
+    return np.argmin(distances, axis=1)